@@ -0,0 +1,497 @@
+import time
+
+# Measured from here, so the startup report covers the imports below
+script_start = time.perf_counter()
+
+import os
+from datetime import date, timedelta
+
+import streamlit as st
+
+from toolkit.monitoring import (
+    dataframe_size,
+    record_startup,
+    render_backend_panel,
+    render_query_profile_panel,
+    render_trace_panel,
+    start_run_trace,
+    trace_phase,
+)
+from toolkit.queries import (
+    dummy_get_download_access,
+    query_annual_cost,
+    query_annual_overview_by_year,
+    query_entity_distribution,
+    query_monthly_download_trends_by_year,
+    query_top_annotations_by_year,
+)
+from toolkit.utils import (
+    APPROXIMATE_DISTINCT_COUNTS,
+    WAREHOUSE_BACKEND,
+    collect_query_profiles,
+    get_backend,
+    get_batch_data_from_snowflake,
+    get_program_project_ids,
+    get_user_sketch_store,
+    prewarm_backend,
+    slice_year,
+    split_program_totals,
+    start_cache_warmer,
+    year_over_year_delta,
+)
+
+# Configure the layout of the Streamlit app page
+st.set_page_config(layout="wide",
+                   page_title="Program Analytics",
+                   page_icon=":bar_chart:",
+                   initial_sidebar_state="expanded")
+
+# Trace where the time in this run goes (shown in the sidebar when the debug panel is on)
+run_trace = start_run_trace()
+record_startup("imports", time.perf_counter() - script_start)
+
+# Connect to the warehouse in the background while the sidebar and README render
+prewarm_backend()
+
+# Choices for how many projects the unique-users chart shows; the warehouse returns the largest
+TOP_PROJECTS_OPTIONS = [5, 10, 25, 50, 100]
+
+
+def build_page_queries(program_id, years, approximate=False):
+    """Return the queries the dashboard runs for a program, keyed by the data they feed.
+
+    With ``approximate``, unique-user counts are estimated (see ``count_distinct``).
+    """
+    project_ids = get_program_project_ids(program_id)
+    return {
+        "annual_overview": query_annual_overview_by_year(
+            years, project_ids, approximate=approximate
+        ),
+        "annual_cost": query_annual_cost(project_ids),
+        "unique_users": query_monthly_download_trends_by_year(
+            years, project_ids, top_n=max(TOP_PROJECTS_OPTIONS), approximate=approximate
+        ),
+        "top_annotations": query_top_annotations_by_year(
+            years, project_ids, approximate=approximate
+        ),
+    }
+
+
+def approx_label(label, approximate):
+    """Mark ``label`` as showing an estimate when approximate counts are on."""
+    return f"{label} (approx.)" if approximate else label
+
+
+@st.cache_data
+def load_stylesheet(path):
+    with open(path) as f:
+        return f.read()
+
+
+# Custom CSS for styling
+st.markdown(f"<style>{load_stylesheet('style.css')}</style>", unsafe_allow_html=True)
+
+# Setting up the sidebar and interactive user interface
+with st.sidebar:
+    # Load the sage logo
+    logo_path = f"{os.path.dirname(__file__)}/resources/sage-bio-logo.png"
+
+    # Display the sage logo
+    st.sidebar.image(logo_path, use_column_width=True)
+    st.title("Sage Internal Data Catalog")
+
+    program_list = ["HTAN", "NF"]
+    program_ids = {"HTAN": 20446927, "NF": 16858331}
+    selected_program = st.selectbox("Select a program to view metrics for...", program_list)
+
+    year_list = [2024, 2023, 2022]
+    selected_year = st.selectbox("Select a year to view metrics for...", year_list)
+
+    # Unique users for any range of days within ``year_list``, merged locally from daily sketches
+    custom_range = None
+    # (sketches are built with Snowflake's HLL functions, which the local extracts backend lacks)
+    if st.toggle(
+        "Count unique users over a custom date range",
+        value=False,
+        disabled=WAREHOUSE_BACKEND != "snowflake",
+    ):
+        last_day = date(max(year_list), 12, 31)
+        picked_range = st.date_input(
+            "Date range",
+            value=(last_day - timedelta(days=89), last_day),
+            min_value=date(min(year_list), 1, 1),
+            max_value=last_day,
+        )
+        # The picker holds a single date until the end of the range is picked
+        if len(picked_range) == 2:
+            custom_range = tuple(picked_range)
+
+    # Unique-user counts are estimated with HyperLogLog by default for faster browsing; turn
+    # this off for exact counts
+    approximate = st.toggle(
+        "Approximate unique-user counts",
+        value=APPROXIMATE_DISTINCT_COUNTS,
+        help="Estimates unique users (within about 2%) at a fraction of the query cost. "
+        "Turn off to compute exact counts.",
+    )
+
+    program_id = program_ids[selected_program]
+    if selected_program == "HTAN":
+        program_description = "The Human Tumor Atlas Network ([HTAN](https://humantumoratlas.org/)) is a National Cancer Institute (NCI)-funded Cancer MoonshotSM initiative to construct 3-dimensional atlases of the dynamic cellular, morphological, and molecular features of human cancers as they evolve from precancerous lesions to advanced disease."
+    elif selected_program == "NF":
+        program_description = "The [NF Data Portal](https://nf.synapse.org/) was created to help openly explore and share NF datasets, analysis tools, resources, and publications related to neurofibromatosis and schwannomatosis. Anyone can join the NF Open Science Initiative (NF-OSI) to contribute!"
+
+    st.write("For questions or comments, please contact jenny.medina@sagebase.org.")
+
+    # Warm the query caches for every program in the background (each page covers all years),
+    # in the default counting mode
+    cache_warmer = start_cache_warmer(
+        build_page_queries,
+        tuple(
+            (program_ids[program], tuple(year_list), APPROXIMATE_DISTINCT_COUNTS)
+            for program in program_list
+        ),
+    )
+    warmup = cache_warmer.progress()
+    if warmup["last_refresh"] is None:
+        st.progress(
+            warmup["completed"] / max(warmup["total"], 1),
+            text=f"Warming up caches ({warmup['completed']}/{warmup['total']} queries)...",
+        )
+    else:
+        st.caption(
+            f"Caches last refreshed at {time.strftime('%Y-%m-%d %H:%M', time.localtime(warmup['last_refresh']))}"
+            + (f" ({warmup['failed']} queries failed)" if warmup["failed"] else "")
+        )
+
+    show_trace_panel = st.toggle("Show performance debug panel", value=False)
+
+record_startup("first paint", time.perf_counter() - script_start)
+
+
+@st.experimental_fragment
+def overview_section(page_data, selected_year, approximate=False):
+    """The overview cards for the selected year, with the change since the year before."""
+    st.markdown("## Overview")
+
+    # Data transformation (the selected year is sliced locally, the year before it gives the deltas):
+    with trace_phase("Overview", "transformation") as phase:
+        overview_df = page_data["annual_overview"]
+        is_program_total = overview_df["IS_PROGRAM_TOTAL"].astype(bool)
+        annual_project_downloads_df, annual_totals = split_program_totals(
+            slice_year(overview_df, selected_year)
+        )
+        total_data_size = round(
+            sum(annual_project_downloads_df["TOTAL_PROJECT_SIZE_IN_TIB"]), 2
+        )
+        storage_delta = year_over_year_delta(
+            overview_df[~is_program_total], "TOTAL_PROJECT_SIZE_IN_TIB", selected_year
+        )
+        unique_users_delta = year_over_year_delta(
+            overview_df[is_program_total], "ANNUAL_UNIQUE_USERS", selected_year
+        )
+        downloads_delta = year_over_year_delta(
+            overview_df[is_program_total], "ANNUAL_DOWNLOADS_IN_TIB", selected_year
+        )
+        phase.update(dataframe_size(overview_df))
+
+    # Data visualization:
+    with trace_phase("Overview", "visualization"):
+        col1, col2, col3, col4, col5 = st.columns([1, 1, 1, 1, 1])
+        col1.metric(
+            "Total Storage Occupied",
+            f"{total_data_size} TiB",
+            delta=None if storage_delta is None else f"{storage_delta:+.2f} TiB",
+        )
+        col2.metric(
+            approx_label("Annual Unique Users", approximate),
+            f"{annual_totals['ANNUAL_UNIQUE_USERS']}",
+            delta=(
+                None if unique_users_delta is None else f"{int(unique_users_delta):+d}"
+            ),
+        )
+        col3.metric(
+            "Annual Downloads",
+            f"{round(annual_totals['ANNUAL_DOWNLOADS_IN_TIB'], 2)} TiB",
+            delta=None if downloads_delta is None else f"{downloads_delta:+.2f} TiB",
+        )
+        col4.metric("Citations (Dummy)", "1265")
+        col5.metric("Records (Dummy)", "7813")
+
+
+@st.experimental_fragment
+def usage_section(page_data, selected_year, approximate=False):
+    """Unique-user trends, top annotations and project sizes; the chart controls rerun only this section."""
+    # Plotly is only loaded once a section draws a chart
+    from toolkit.widgets import plot_download_sizes, plot_unique_users_trend
+
+    st.markdown("## Data Usage & Governance")
+
+    # ---------------- Row 3: Unique Users Trends -------------------------
+
+    row1_1, row1_2 = st.columns([1.7, 1])
+
+    with row1_1:
+        top_n = st.select_slider(
+            "Projects to show", options=TOP_PROJECTS_OPTIONS, value=10
+        )
+
+        # Data transformation:
+        with trace_phase("Usage & Governance", "transformation") as phase:
+            unique_users_df = slice_year(page_data["unique_users"], selected_year)
+            phase.update(dataframe_size(unique_users_df))
+
+        # Data visualization:
+        with trace_phase("Usage & Governance", "visualization"):
+            st.plotly_chart(
+                plot_unique_users_trend(
+                    unique_users_df, top_n=top_n, approximate=approximate
+                )
+            )
+    with row1_2:
+        # Data transformation:
+        with trace_phase("Usage & Governance", "transformation") as phase:
+            top_annotations_df = slice_year(page_data["top_annotations"], selected_year)
+            phase.update(dataframe_size(top_annotations_df))
+
+        # Data visualization:
+        with trace_phase("Usage & Governance", "visualization"):
+            st.dataframe(
+                top_annotations_df,
+                column_order=(
+                    "COMPONENT_NAME",
+                    "OCCURRENCES",
+                    "NUMBER_OF_UNIQUE_DOWNLOADS",
+                ),
+                hide_index=True,
+                width=None,
+                column_config={
+                    "COMPONENT_NAME": st.column_config.TextColumn(
+                        "Annotation Component",
+                    ),
+                    "OCCURRENCES": st.column_config.ProgressColumn(
+                        "Occurence",
+                        format="%f",
+                        min_value=0,
+                        max_value=int(max(top_annotations_df["OCCURRENCES"])),
+                    ),
+                    "NUMBER_OF_UNIQUE_DOWNLOADS": st.column_config.ProgressColumn(
+                        approx_label("Unique Downloads", approximate),
+                        format="%f",
+                        min_value=0,
+                        max_value=int(
+                            max(top_annotations_df["NUMBER_OF_UNIQUE_DOWNLOADS"])
+                        ),
+                    ),
+                },
+            )
+
+    # --------------- Row 2: Project Sizes and Downloads -----------------
+
+    annual_project_downloads_df, _ = split_program_totals(
+        slice_year(page_data["annual_overview"], selected_year)
+    )
+
+    row2_1, row2_2 = st.columns([1.7, 1])
+    with row2_1:
+        # Data visualization:
+        with trace_phase("Usage & Governance", "visualization"):
+            st.plotly_chart(plot_download_sizes(annual_project_downloads_df))
+
+    with row2_2:
+        # --------------- Row 2: Entity Distribution -------------------------
+        with trace_phase("Usage & Governance", "visualization"):
+            download_access_df = dummy_get_download_access(
+                annual_project_downloads_df["PROJECT_ID"],
+                annual_project_downloads_df["NAME"],
+            )
+
+            st.dataframe(
+                download_access_df,
+                hide_index=True,
+                width=600,
+                column_config={
+                    "PROJECT_ID": st.column_config.TextColumn(
+                        "Project ID",
+                    ),
+                    "NAME": st.column_config.TextColumn("Project Name"),
+                    "DOWNLOAD_ACCESS_COUNT": st.column_config.TextColumn(
+                        "Users with Download Access (Dummy)",
+                    ),
+                },
+            )
+
+
+def reach_section():
+    from toolkit.widgets import plot_map
+
+    st.markdown(
+        '<h3 class="section-title">Data Reach (Dummy)</h3>', unsafe_allow_html=True
+    )
+
+    # Plot the dummy data
+    with trace_phase("Reach", "visualization"):
+        st.plotly_chart(plot_map())
+
+
+def impact_section():
+    from toolkit.widgets import plot_citation_stats
+
+    st.markdown(
+        '<h3 class="section-title">Data Impact (Dummy)</h3>', unsafe_allow_html=True
+    )
+
+    # Plot the dummy data
+    with trace_phase("Impact", "visualization"):
+        st.plotly_chart(plot_citation_stats())
+
+
+def about_section():
+    from toolkit.widgets import plot_human_records
+
+    st.markdown(
+        '<h3 class="section-title">About the Data (Dummy)</h3>', unsafe_allow_html=True
+    )
+
+    # Plot the dummy data
+    with trace_phase("About", "visualization"):
+        st.plotly_chart(plot_human_records())
+
+
+@st.experimental_fragment
+def dummy_sections():
+    """The below-the-fold sections with dummy data, only rendered once they are asked for."""
+    if not st.toggle(
+        "Show the Data Reach, Impact and About sections (dummy data)", value=False
+    ):
+        return
+
+    data_reach_col, data_impact_col, about_the_data_col = st.columns([2, 1, 1])
+    with data_reach_col:
+        reach_section()
+    with data_impact_col:
+        impact_section()
+    with about_the_data_col:
+        about_section()
+
+
+@st.experimental_fragment
+def custom_range_section(page_data, program_id, year_list, custom_range):
+    """Unique users over a custom date range, estimated from the program's daily user sketches."""
+    start, end = custom_range
+    st.markdown(f"## Unique Users from {start:%b %d, %Y} to {end:%b %d, %Y}")
+
+    # Data retrieval (the sketches cover all of ``year_list`` and are fetched once):
+    with trace_phase("Custom Range", "data retrieval"):
+        sketch_store = get_user_sketch_store(
+            get_program_project_ids(program_id), tuple(year_list)
+        )
+
+    # Data transformation (the sketches of the selected days are merged locally):
+    with trace_phase("Custom Range", "transformation") as phase:
+        unique_users = sketch_store.unique_users(start, end)
+        project_names = (
+            page_data["annual_overview"]
+            .dropna(subset=["PROJECT_ID"])
+            .drop_duplicates("PROJECT_ID")
+        )
+        project_users_df = (
+            sketch_store.unique_users_by_project(start, end)
+            .rename_axis("PROJECT_ID")
+            .reset_index()
+            .merge(
+                project_names[["PROJECT_ID", "NAME"]].astype({"PROJECT_ID": "int64"}),
+                on="PROJECT_ID",
+                how="left",
+            )
+            .sort_values("UNIQUE_USERS", ascending=False)
+        )
+        phase.update(dataframe_size(project_users_df))
+
+    # Data visualization:
+    with trace_phase("Custom Range", "visualization"):
+        col1, col2 = st.columns([1, 4])
+        col1.metric("Unique Users (approx.)", f"{unique_users}")
+        col2.dataframe(
+            project_users_df,
+            column_order=("NAME", "PROJECT_ID", "UNIQUE_USERS"),
+            hide_index=True,
+            column_config={
+                "NAME": st.column_config.TextColumn("Project Name"),
+                "PROJECT_ID": st.column_config.TextColumn("Project ID"),
+                "UNIQUE_USERS": st.column_config.NumberColumn("Unique Users (approx.)"),
+            },
+        )
+
+
+def main(
+    selected_year,
+    year_list,
+    program_id,
+    program_description,
+    approximate=False,
+    custom_range=None,
+):
+
+    expander_1, expander_2 = st.columns(2)
+    with expander_1:
+        with st.expander("**README** :book:"):
+            st.write(
+                """
+            - This Streamlit app serves as a dashboard to provide insight on the overall impact and reach of Synapse-hosted data for a given DCC. It displays metrics showing data usage, governance statistics, number of citations, and number of human records
+        supporting the data over the course of a given year, allowing you to compare between years and explore the DCC's evolution on Synapse.
+        - Several of the widgets in this app were created with dummy data for the sake of demonstration. These widgets are:
+            - The download access dataframe in the **Data Usage & Governance** section
+            - The **Data Reach** section
+            - The **Data Impact** section
+            - The **About the Data** section
+            - The overview cards corresponding to the last two sections
+
+
+            The rest was pulled in from Snowflake and represents real-time data for the given DCC.
+        - This application is designed to be interactive to help with analysis. Here are some ways you can interact with the widgets:
+            - Use the dropdown menus on the sidebar to select a program and year.
+            - Turn on **Count unique users over a custom date range** in the sidebar to pick any range of days within the listed years.
+            - Hover over the charts to see tooltips and more information about the project.
+            - Click on the legend to filter the line chart.
+            - Click the columns in the dataframes to sort the rows according to your preference.
+            - Drag the edges of the columns in the dataframes to adjust their width.
+            - Use the slider above the line chart to choose how many projects it shows.
+            - Unique-user counts marked "(approx.)" are estimates; turn off **Approximate unique-user counts** in the sidebar for exact counts.
+            """
+            )
+    with expander_2:
+        with st.expander("**About The Program**"):
+            st.markdown(program_description)
+
+    # Data retrieval (the program scope is resolved once, then every query on the page is submitted at once;
+    # each query covers all of ``year_list`` so switching years doesn't go back to the warehouse):
+    with trace_phase("Overview", "data retrieval"):
+        page_data = get_batch_data_from_snowflake(
+            build_page_queries(program_id, tuple(year_list), approximate)
+        )
+    record_startup("first data", time.perf_counter() - script_start)
+
+    # Each section is a fragment, so interacting with a section's own widgets reruns only that section
+    overview_section(page_data, selected_year, approximate)
+    if custom_range is not None:
+        custom_range_section(page_data, program_id, year_list, custom_range)
+    usage_section(page_data, selected_year, approximate)
+    dummy_sections()
+
+
+if __name__ == "__main__":
+    main(
+        selected_year,
+        year_list,
+        program_id,
+        program_description,
+        approximate,
+        custom_range,
+    )
+
+    # Show the timings of this run once every section has rendered
+    if show_trace_panel:
+        render_trace_panel(run_trace)
+        render_query_profile_panel(collect_query_profiles())
+        render_backend_panel(get_backend().name, get_backend().stats())
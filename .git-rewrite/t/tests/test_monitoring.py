@@ -0,0 +1,75 @@
+"""Unit tests for the tracing and query profiling in ``toolkit/monitoring.py``."""
+
+import os
+import sys
+
+import pandas as pd
+
+# Ensure that the base directory is in PYTHONPATH so ``toolkit`` and other tools can be found
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from toolkit.monitoring import QueryProfileStore, start_run_trace, trace_phase
+
+
+def test_trace_phase_records_into_the_current_trace():
+    """Ensure phases are timed into the run's trace along with any attached fields."""
+
+    trace = start_run_trace()
+    with trace_phase("Overview", "transformation") as record:
+        record["rows"] = 3
+
+    assert trace.phases == [
+        {
+            "section": "Overview",
+            "phase": "transformation",
+            "rows": 3,
+            "seconds": trace.phases[0]["seconds"],
+        }
+    ]
+
+
+def _profile(query_id, elapsed_ms, scanned, total):
+    return {
+        "QUERY_ID": query_id,
+        "TOTAL_ELAPSED_TIME": elapsed_ms,
+        "COMPILATION_TIME": 100,
+        "EXECUTION_TIME": elapsed_ms - 100,
+        "QUEUED_TIME": 0,
+        "BYTES_SCANNED": 1024**3,
+        "PARTITIONS_SCANNED": scanned,
+        "PARTITIONS_TOTAL": total,
+    }
+
+
+def test_query_profile_store_summarises_per_family():
+    """Ensure looked-up statistics are attached to their family and summarised slowest first."""
+
+    store = QueryProfileStore(window=2)
+    store.add_pending("query_top_annotations", "a")
+    store.add_pending("query_top_annotations", "b")
+    store.add_pending("query_top_annotations", "c")
+    store.add_pending("query_annual_cost", "d")
+    store.add_profiles(
+        pd.DataFrame(
+            [
+                _profile("a", 9000, 10, 10),
+                _profile("b", 2000, 1, 10),
+                _profile("c", 4000, 3, 10),
+                _profile("d", 500, 5, 10),
+                _profile("unknown", 1, 1, 1),
+            ]
+        )
+    )
+
+    summary_df = store.summary()
+
+    assert store.pending() == ()
+    assert summary_df["FAMILY"].tolist() == [
+        "query_top_annotations",
+        "query_annual_cost",
+    ]
+    # Only the last two profiles of a family are kept
+    top_annotations = summary_df.iloc[0]
+    assert top_annotations["QUERIES"] == 2
+    assert top_annotations["MEAN_ELAPSED_S"] == 3.0
+    assert top_annotations["FRACTION_SCANNED"] == 0.2
@@ -0,0 +1,100 @@
+"""Unit tests for the query builders in ``toolkit/queries.py``."""
+
+import os
+import sys
+from datetime import date
+
+import pytest
+
+# Ensure that the base directory is in PYTHONPATH so ``toolkit`` and other tools can be found
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from toolkit.queries import (
+    Query,
+    bind,
+    count_distinct,
+    query_annual_overview_by_year,
+    query_top_annotations,
+    year_range,
+)
+
+
+def test_bind_compiles_named_placeholders_in_order():
+    """Ensure named placeholders become qmarks with their values in text order."""
+
+    query = bind("SELECT * FROM t WHERE a = :a AND b < :b", b=2, a=1)
+
+    assert query.sql == "SELECT * FROM t WHERE a = ? AND b < ?"
+    assert query.params == (1, 2)
+
+
+def test_bind_expands_sequences_into_in_lists():
+    """Ensure list values expand to one placeholder each, and empty lists bind NULL."""
+
+    assert bind("x in (:ids)", ids=(1, 2, 3)) == Query("x in (?, ?, ?)", (1, 2, 3))
+    assert bind("x in (:ids)", ids=()) == Query("x in (?)", (None,))
+
+
+def test_bind_leaves_variant_paths_and_casts_alone():
+    """Ensure Snowflake VARIANT paths and ``::`` casts are not mistaken for placeholders."""
+
+    sql = (
+        "SELECT annotations:annotations:Component:value[0], id::int FROM t WHERE y = :y"
+    )
+
+    query = bind(sql, y=1)
+
+    assert query.sql == sql.replace(":y", "?")
+    assert query.params == (1,)
+
+
+def test_bind_rejects_missing_values():
+    """Ensure a placeholder without a value fails loudly instead of binding nothing."""
+
+    with pytest.raises(KeyError):
+        bind("SELECT :missing")
+
+
+def test_builders_use_fixed_text_and_sargable_ranges():
+    """Ensure the SQL text doesn't change with the year and dates are half-open ranges."""
+
+    query_2023 = query_top_annotations(2023, (1, 2))
+    query_2024 = query_top_annotations(2024, (1, 2))
+
+    assert query_2023.sql == query_2024.sql
+    assert "filedownload.RECORD_DATE >= ?" in query_2024.sql
+    assert "filedownload.RECORD_DATE < ?" in query_2024.sql
+    assert date(2024, 1, 1) in query_2024.params
+    assert date(2025, 1, 1) in query_2024.params
+    assert year_range(2024) == {"start": date(2024, 1, 1), "end": date(2025, 1, 1)}
+
+
+def test_builders_tag_queries_with_their_family():
+    """Ensure each query is tagged with the name of the builder that produced it."""
+
+    assert query_top_annotations(2024, (1, 2)).family == "query_top_annotations"
+
+
+def test_by_year_builders_cover_every_year_in_one_range():
+    """Ensure the multi-year variants bind one range spanning all requested years."""
+
+    query = query_annual_overview_by_year([2024, 2022, 2023], (1, 2))
+
+    assert date(2022, 1, 1) in query.params
+    assert date(2025, 1, 1) in query.params
+    assert date(2023, 1, 1) not in query.params
+    assert query.family == "query_annual_overview_by_year"
+
+
+def test_approximate_mode_estimates_unique_users():
+    """Ensure ``approximate`` swaps the exact distinct counts of users for HyperLogLog estimates."""
+
+    exact = query_top_annotations(2024, [1])
+    approximate = query_top_annotations(2024, [1], approximate=True)
+
+    assert count_distinct("dd.user_id") in exact.sql
+    assert count_distinct("dd.user_id", approximate=True) in approximate.sql
+    assert "APPROX_COUNT_DISTINCT(dd.user_id)" in approximate.sql
+    # Only the user counts are estimated
+    assert "COUNT(DISTINCT node_latest.id)" in approximate.sql
+    assert approximate.params == exact.params
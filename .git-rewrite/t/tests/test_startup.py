@@ -0,0 +1,30 @@
+"""Guards for the cold-start path: the modules ``app.py`` imports up front must stay light."""
+
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Loaded lazily, only once a Snowflake session is created or a section draws a chart
+# (Streamlit itself already imports ``plotly.graph_objects``)
+DEFERRED_MODULES = ("snowflake.snowpark", "plotly.express", "duckdb")
+
+
+def test_app_imports_defer_heavy_modules():
+    """Ensure importing the toolkit modules used at startup doesn't load the deferred ones."""
+
+    script = (
+        "import sys\n"
+        "import toolkit.monitoring, toolkit.queries, toolkit.utils\n"
+        f"print([name for name in {DEFERRED_MODULES!r} if name in sys.modules])\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,457 @@
+"""Unit tests for the helpers in ``toolkit/utils.py`` that don't need a Snowflake connection."""
+
+import os
+import sys
+import threading
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+# Ensure that the base directory is in PYTHONPATH so ``toolkit`` and other tools can be found
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from toolkit import utils
+from toolkit.queries import (
+    RESULT_DTYPES,
+    Query,
+    query_annual_overview_by_year,
+    query_downloaded_files_by_year,
+    query_monthly_download_trends_by_year,
+    query_program_project_ids,
+    query_top_annotations_by_year,
+)
+from toolkit.utils import (
+    QUERY_FAMILY_TTLS,
+    MemoryResultCache,
+    ParquetResultCache,
+    SessionPool,
+    SnowflakeBackend,
+    annual_downloads_in_tib,
+    arrow_to_pandas,
+    incremental_ranges,
+    year_over_year_delta,
+)
+
+
+def test_result_cache_round_trip_and_counters(tmp_path):
+    """Ensure stored results are returned for equivalent queries and hits/misses are counted."""
+
+    cache = ParquetResultCache(str(tmp_path))
+    df = pd.DataFrame({"PROJECT_ID": [1, 2], "NAME": ["a", "b"]})
+
+    assert cache.get(Query("SELECT ?", (1,))) is None
+    cache.put(Query("SELECT ?", (1,)), df)
+
+    # Formatting-only differences in the SQL map to the same entry
+    pd.testing.assert_frame_equal(cache.get(Query("  SELECT\n ?", (1,))), df)
+    assert cache.get(Query("SELECT ?", (2,))) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_result_cache_expires_entries(tmp_path):
+    """Ensure entries past their TTL are treated as misses."""
+
+    cache = ParquetResultCache(str(tmp_path))
+    cache.put(Query("SELECT 1"), pd.DataFrame({"A": [1]}), ttl=-1)
+
+    assert cache.get(Query("SELECT 1")) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    """Ensure the least recently used entry is evicted once the size cap is exceeded."""
+
+    df = pd.DataFrame({"A": range(100)})
+    cache = ParquetResultCache(str(tmp_path))
+    cache.put(Query("SELECT 1"), df)
+    entry_size = cache.stats()["bytes"]
+
+    cache.max_bytes = entry_size * 2
+    os.utime(
+        os.path.join(str(tmp_path), f"{cache.key(Query('SELECT 1'))}.parquet"), (0, 0)
+    )
+    cache.put(Query("SELECT 2"), df)
+    cache.get(Query("SELECT 1"))
+    cache.put(Query("SELECT 3"), df)
+
+    assert cache.get(Query("SELECT 1")) is not None
+    assert cache.get(Query("SELECT 2")) is None
+    assert cache.get(Query("SELECT 3")) is not None
+
+
+def test_memory_cache_evicts_least_recently_used_over_budget():
+    """Ensure the memory cache stays within its byte budget by evicting the LRU entry."""
+
+    df = pd.DataFrame({"A": range(100)})
+    entry_size = int(df.memory_usage(deep=True).sum())
+    cache = MemoryResultCache(max_bytes=entry_size * 2)
+
+    cache.put(Query("SELECT 1"), df)
+    cache.put(Query("SELECT 2"), df)
+    cache.get(Query("SELECT 1"))
+    cache.put(Query("SELECT 3"), df)
+
+    assert cache.get(Query("SELECT 1")) is not None
+    assert cache.get(Query("SELECT 2")) is None
+    assert cache.get(Query("SELECT 3")) is not None
+    assert cache.stats()["bytes"] == entry_size * 2
+
+
+def test_memory_cache_expires_entries_by_family_ttl(monkeypatch):
+    """Ensure entries expire according to their query family's TTL."""
+
+    monkeypatch.setitem(QUERY_FAMILY_TTLS, "query_short_lived", -1)
+    cache = MemoryResultCache()
+    cache.put(Query("SELECT 1", family="query_short_lived"), pd.DataFrame({"A": [1]}))
+    cache.put(Query("SELECT 2"), pd.DataFrame({"A": [1]}))
+
+    assert cache.get(Query("SELECT 1", family="query_short_lived")) is None
+    assert cache.get(Query("SELECT 2")) is not None
+    assert cache.stats()["entries"] == 1
+
+
+def test_year_over_year_delta_needs_the_previous_year():
+    """Ensure deltas compare against the previous year and are omitted when it's missing."""
+
+    df = pd.DataFrame({"YEAR": [2022, 2023, 2023, 2024], "USERS": [1, 2, 3, 4]})
+
+    assert year_over_year_delta(df, "USERS", 2024) == -1
+    assert year_over_year_delta(df, "USERS", 2023) == 4
+    assert year_over_year_delta(df, "USERS", 2022) is None
+
+
+def test_cache_warmer_runs_shared_queries_once(monkeypatch):
+    """Ensure one warm-up pass fetches each distinct query once and records its progress."""
+
+    fetched = []
+    monkeypatch.setattr(utils, "get_data_from_snowflake", fetched.append)
+
+    def build_queries(program_id, years):
+        return {
+            "shared": Query("SELECT 1"),
+            "per_program": Query("SELECT ?", (program_id,)),
+        }
+
+    warmer = utils.CacheWarmer(build_queries, [(1, (2024,)), (2, (2024,))])
+    warmer.warm()
+
+    assert len(fetched) == 3
+    assert warmer.progress()["completed"] == 3
+    assert warmer.progress()["last_refresh"] is not None
+
+
+def test_arrow_to_pandas_compacts_mapped_columns():
+    """Ensure mapped columns are compacted and unmapped ones keep their Arrow types."""
+
+    table = pa.table(
+        {
+            "NAME": ["a", "b", "a"],
+            "DISTINCT_USER_COUNT": pa.array([1, None, 3], pa.int64()),
+            "TIB": [0.5, 1.5, 2.5],
+            "PROJECT_ID": pa.array([1, 2, 3], pa.int64()),
+        }
+    )
+
+    df = arrow_to_pandas(
+        table, {"NAME": "category", "DISTINCT_USER_COUNT": "Int32", "TIB": "float32"}
+    )
+
+    assert df.dtypes.to_dict() == {
+        "NAME": "category",
+        "DISTINCT_USER_COUNT": pd.Int32Dtype(),
+        "TIB": "float32",
+        "PROJECT_ID": "int64",
+    }
+    assert df["DISTINCT_USER_COUNT"].isna().tolist() == [False, True, False]
+
+
+def test_top_n_from_batches_groups_incrementally():
+    """Ensure groups split across batches are summed before the top N are picked."""
+
+    batches = [
+        pd.DataFrame({"PROJECT_ID": [1, 2], "DISTINCT_USER_COUNT": [5, 1]}),
+        pd.DataFrame({"PROJECT_ID": [2, 3], "DISTINCT_USER_COUNT": [6, 2]}),
+    ]
+
+    top = utils.top_n_from_batches(
+        iter(batches), "PROJECT_ID", "DISTINCT_USER_COUNT", n=2
+    )
+
+    assert top.to_dict() == {2: 7, 1: 5}
+
+
+def test_incremental_ranges_split_the_current_year_at_its_open_month():
+    """Ensure closed years are one range and the current year is split at the open month."""
+
+    assert incremental_ranges([2024, 2023, 2025], today=date(2024, 3, 15)) == [
+        (date(2023, 1, 1), date(2024, 1, 1), True),
+        (date(2024, 1, 1), date(2024, 3, 1), True),
+        (date(2024, 3, 1), date(2025, 1, 1), False),
+    ]
+    # Within the grace period the month before stays open for late downloads
+    assert incremental_ranges([2024], today=date(2024, 3, 1))[-1] == (
+        date(2024, 2, 1),
+        date(2025, 1, 1),
+        False,
+    )
+    assert incremental_ranges([2023], today=date(2024, 1, 1)) == [
+        (date(2023, 1, 1), date(2023, 12, 1), True),
+        (date(2023, 12, 1), date(2024, 1, 1), False),
+    ]
+
+
+class ExpiredSessionError(Exception):
+    errno = 390114
+
+
+class FakeCursor:
+    def __init__(self, session):
+        self.session = session
+        self.sfqid = None
+
+    def execute(self, sql, params=None):
+        if self.session.expired:
+            raise ExpiredSessionError("Authentication token has expired")
+        self.session.executed.append(sql)
+
+    def fetch_arrow_all(self, force_return_table=False):
+        return pa.table({"N": [len(self.session.executed)]})
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """Stands in for a Snowpark session: ``session.connection.cursor()`` and ``close()``."""
+
+    def __init__(self, expired=False):
+        self.expired = expired
+        self.executed = []
+        self.closed = False
+        self.connection = self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+def test_session_pool_bounds_sessions_and_records_waits():
+    """Ensure no more than ``size`` sessions are opened and blocked checkouts wait for a return."""
+
+    sessions = []
+    pool = SessionPool(lambda: sessions.append(FakeSession()) or sessions[-1], size=1)
+    checked_out = threading.Event()
+    release = threading.Event()
+
+    def hold_session():
+        with pool.checkout():
+            checked_out.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold_session)
+    holder.start()
+    checked_out.wait(5)
+    threading.Timer(0.05, release.set).start()
+    with pool.checkout() as session:
+        assert session is sessions[0]
+    holder.join()
+
+    stats = pool.stats()
+    assert len(sessions) == 1
+    assert stats["checkouts"] == 2 and stats["idle"] == 1
+    assert stats["max_wait_seconds"] > 0
+
+
+def test_snowflake_backend_reconnects_when_the_session_expires():
+    """Ensure an expired session is discarded and the query retried on a fresh one."""
+
+    sessions = [FakeSession(expired=True), FakeSession()]
+    pool = SessionPool(lambda: sessions[pool.stats()["reconnects"]], size=1)
+    backend = SnowflakeBackend(pool)
+
+    table = backend.fetch_arrow(Query("SELECT 1", family="query_annual_cost"))
+
+    assert table.column("N").to_pylist() == [1]
+    assert sessions[0].closed and not sessions[1].closed
+    assert pool.stats()["reconnects"] == 1 and pool.stats()["open"] == 1
+
+
+def test_session_pool_replaces_unhealthy_idle_sessions():
+    """Ensure sessions idle past the health-check interval are pinged and replaced if dead."""
+
+    sessions = [FakeSession(), FakeSession()]
+    pool = SessionPool(lambda: sessions.pop(0), size=1, health_check_interval=0)
+    with pool.checkout() as first:
+        pass
+    first.expired = True
+
+    with pool.checkout() as second:
+        assert second is not first
+    assert first.closed
+
+
+@pytest.fixture
+def duckdb_backend(tmp_path):
+    """A ``DuckDBBackend`` over tiny Parquet extracts of one program with two projects."""
+
+    pytest.importorskip("duckdb")
+    annotations = '{"annotations": {"Component": {"value": ["%s"]}}}'
+    extracts = {
+        "node_latest": pd.DataFrame(
+            {
+                "id": [100, 1, 2, 11, 12, 21],
+                "project_id": [None, 1, 2, 1, 1, 2],
+                "node_type": ["project", "project", "project", "file", "file", "file"],
+                "name": [
+                    "Program",
+                    "Project A",
+                    "Project B",
+                    "a.txt",
+                    "b.txt",
+                    "c.txt",
+                ],
+                "file_handle_id": [None, None, None, 11, 12, 21],
+                "scope_ids": ["[1, 2]", None, None, None, None, None],
+                "annotations": [
+                    None,
+                    None,
+                    None,
+                    annotations % "Bulk",
+                    annotations % "Bulk",
+                    None,
+                ],
+            }
+        ),
+        "filedownload": pd.DataFrame(
+            {
+                "project_id": [1, 1, 1, 2, 1],
+                "file_handle_id": [11, 11, 12, 21, 11],
+                "user_id": [7, 8, 7, 9, 7],
+                "record_date": pd.to_datetime(
+                    [
+                        "2024-01-05",
+                        "2024-02-10",
+                        "2024-02-11",
+                        "2024-03-01",
+                        "2023-06-01",
+                    ]
+                ).date,
+                "timestamp": pd.to_datetime(
+                    [
+                        "2024-01-05",
+                        "2024-02-10",
+                        "2024-02-11",
+                        "2024-03-01",
+                        "2023-06-01",
+                    ]
+                ),
+            }
+        ),
+        "file_latest": pd.DataFrame(
+            {
+                "id": [11, 12, 21],
+                "content_size": [1024**4, 2 * 1024**4, 4 * 1024**4],
+                "concrete_type": ["org.sagebionetworks.repo.model.file.S3FileHandle"]
+                * 3,
+                "created_on": pd.to_datetime(
+                    ["2022-01-01", "2023-01-01", "2024-01-01"]
+                ),
+            }
+        ),
+    }
+    for table, df in extracts.items():
+        os.makedirs(tmp_path / table)
+        df.to_parquet(tmp_path / table / "part-0.parquet", index=False)
+    return utils.DuckDBBackend(str(tmp_path))
+
+
+def run_on(backend, query):
+    return arrow_to_pandas(backend.fetch_arrow(query), RESULT_DTYPES.get(query.family))
+
+
+def test_duckdb_backend_resolves_program_scope(duckdb_backend):
+    """Ensure LATERAL FLATTEN over ``scope_ids`` is translated for DuckDB."""
+
+    project_ids = run_on(duckdb_backend, query_program_project_ids(100))
+
+    assert project_ids["PROJECT_ID"].tolist() == [1, 2]
+
+
+def test_duckdb_backend_runs_the_overview_query(duckdb_backend):
+    """Ensure the GROUPING SETS overview query returns per-project rows and program totals."""
+
+    overview = run_on(
+        duckdb_backend, query_annual_overview_by_year((2023, 2024), (1, 2))
+    )
+    totals = overview[overview["IS_PROGRAM_TOTAL"]].set_index("YEAR")
+    projects = overview[~overview["IS_PROGRAM_TOTAL"] & (overview["YEAR"] == 2024)]
+
+    assert totals.loc[2024, "ANNUAL_UNIQUE_USERS"] == 3
+    assert totals.loc[2024, "ANNUAL_DOWNLOADS_IN_TIB"] == 7
+    assert totals.loc[2023, "ANNUAL_DOWNLOADS_IN_TIB"] == 1
+    assert dict(zip(projects["NAME"], projects["TOTAL_PROJECT_SIZE_IN_TIB"])) == {
+        "Project A": 3,
+        "Project B": 4,
+    }
+
+
+def test_duckdb_backend_runs_the_approximate_overview(duckdb_backend):
+    """Ensure the approximate overview runs and estimates small counts exactly."""
+
+    overview = run_on(
+        duckdb_backend, query_annual_overview_by_year((2024,), (1, 2), approximate=True)
+    )
+
+    assert overview.loc[
+        overview["IS_PROGRAM_TOTAL"], "ANNUAL_UNIQUE_USERS"
+    ].tolist() == [3]
+
+
+def test_duckdb_backend_ranks_the_top_projects_in_sql(duckdb_backend):
+    """Ensure ``top_n`` trends keep only the top projects plus the median over all of them."""
+
+    trends = run_on(
+        duckdb_backend, query_monthly_download_trends_by_year((2024,), (1, 2), top_n=1)
+    )
+    is_median = trends["IS_MEDIAN"].astype(bool)
+
+    assert trends.loc[~is_median, "NAME"].unique().tolist() == ["Project A"]
+    assert trends.loc[~is_median, "DISTINCT_USER_COUNT"].tolist() == [1, 2]
+    assert trends.loc[~is_median, "PROJECT_RANK"].unique().tolist() == [1]
+    assert trends.loc[is_median, "DISTINCT_USER_COUNT"].tolist() == [1, 2, 1]
+
+
+def test_incremental_downloads_merge_ranges_without_double_counting(
+    duckdb_backend, monkeypatch
+):
+    """Ensure closed ranges are cached for good and files are counted once per year."""
+
+    ttls = []
+
+    def fake_get_data(query, ttl=None):
+        ttls.append(ttl)
+        return run_on(duckdb_backend, query)
+
+    monkeypatch.setattr(utils, "get_data_from_snowflake", fake_get_data)
+
+    files = utils.get_incremental_data_from_snowflake(
+        query_downloaded_files_by_year, (2023, 2024), (1, 2), today=date(2024, 2, 20)
+    )
+
+    assert ttls == [0, 0, None]
+    assert annual_downloads_in_tib(files).to_dict() == {2023: 1, 2024: 7}
+
+
+def test_duckdb_backend_reads_variant_paths(duckdb_backend):
+    """Ensure VARIANT paths in the annotation query are translated to JSON paths."""
+
+    annotations = run_on(duckdb_backend, query_top_annotations_by_year((2024,), (1, 2)))
+
+    assert annotations["COMPONENT_NAME"].tolist() == ["Bulk"]
+    assert annotations["OCCURRENCES"].tolist() == [2]
+    assert annotations["NUMBER_OF_UNIQUE_DOWNLOADS"].tolist() == [2]
@@ -0,0 +1 @@
+import toolkit
@@ -0,0 +1,255 @@
+"""Lightweight tracing of where the time goes in each run of the dashboard.
+
+Each run of ``app.py`` starts a ``RunTrace``. Sections of ``main()`` time their phases
+(data retrieval, transformation, visualization) with ``trace_phase``, and the query caches
+report hits and misses with ``record_cache_event``. Every event is also logged as a line
+of JSON, and ``render_trace_panel`` shows the current run's events in the sidebar.
+
+Queries that reach Snowflake also report their query ID with ``record_query_id``. Their
+execution statistics are looked up from the query history later and kept in a rolling
+window per query family (``get_query_profiles``), which shows which builders in
+``toolkit/queries.py`` cost the most warehouse time and whether partition pruning works.
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+# Number of profiled queries kept per query family for the rolling summary
+QUERY_PROFILE_WINDOW = 200
+
+# Milestones of the first run of the app in this process (see ``record_startup``)
+_startup_report = {}
+
+# The trace of the script run executing in the current context (and in the worker threads
+# it hands a copy of its context to)
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class RunTrace:
+    """The phase timings and cache events recorded during one run of the dashboard."""
+
+    def __init__(self):
+        self.run_id = uuid.uuid4().hex[:8]
+        self.started_at = time.time()
+        self.phases = []
+        self.cache_events = []
+        self._lock = threading.Lock()
+
+    def add_phase(self, record):
+        with self._lock:
+            self.phases.append(record)
+
+    def add_cache_event(self, record):
+        with self._lock:
+            self.cache_events.append(record)
+
+
+def start_run_trace():
+    """Start a new ``RunTrace`` for the current script run and return it."""
+    trace = RunTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    """Return the ``RunTrace`` of the current script run, if one was started."""
+    return _current_trace.get()
+
+
+def log_event(event, **fields):
+    """Emit a structured (JSON) log line for a tracing event."""
+    trace = current_trace()
+    run_id = trace.run_id if trace is not None else None
+    logger.info(json.dumps({"event": event, "run_id": run_id, **fields}, default=str))
+
+
+def dataframe_size(df):
+    """Return the number of rows and the deep memory footprint (in bytes) of ``df``."""
+    return {"rows": len(df), "bytes": int(df.memory_usage(deep=True).sum())}
+
+
+def record_startup(milestone, seconds):
+    """Record how long after the script started a cold-start milestone was reached.
+
+    Milestones are ``imports``, ``first paint`` and ``first data``. Only the first run of
+    the app in the process (the cold start) is recorded.
+    """
+    if milestone in _startup_report:
+        return
+    _startup_report[milestone] = round(seconds, 4)
+    log_event("startup", milestone=milestone, seconds=round(seconds, 4))
+
+
+def startup_report():
+    """Return the cold-start milestones recorded so far, in seconds since the script started."""
+    return dict(_startup_report)
+
+
+@contextmanager
+def trace_phase(section, phase):
+    """Time a phase of a dashboard section, e.g. ``trace_phase("Overview", "data retrieval")``.
+
+    The yielded dict is the record that gets stored, so the block can attach extra fields
+    to it (such as ``dataframe_size`` of the frame it produced).
+    """
+    record = {"section": section, "phase": phase}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 4)
+        trace = current_trace()
+        if trace is not None:
+            trace.add_phase(record)
+        log_event("phase", **record)
+
+
+def record_cache_event(query, source, seconds, df=None):
+    """Record where the result of ``query`` came from (``memory``, ``disk`` or ``warehouse``)."""
+    record = {
+        "family": query.family,
+        "source": source,
+        "hit": source != "warehouse",
+        "seconds": round(seconds, 4),
+        **(dataframe_size(df) if df is not None else {}),
+    }
+    trace = current_trace()
+    if trace is not None:
+        trace.add_cache_event(record)
+    log_event("query", **record)
+
+
+def render_trace_panel(trace):
+    """Show the timings and cache events of ``trace`` (the current run) in the sidebar."""
+    with st.sidebar.expander("**Performance (debug)**", expanded=True):
+        st.caption(f"Run `{trace.run_id}`: {time.time() - trace.started_at:.2f}s so far")
+        if _startup_report:
+            st.caption("Cold start: " + ", ".join(f"{milestone} {seconds:.2f}s" for milestone, seconds in _startup_report.items()))
+        if trace.phases:
+            st.dataframe(pd.DataFrame(trace.phases), hide_index=True)
+        if trace.cache_events:
+            cache_events_df = pd.DataFrame(trace.cache_events)
+            hits = int(cache_events_df["hit"].sum())
+            st.caption(f"Query cache: {hits} hits, {len(cache_events_df) - hits} misses")
+            st.dataframe(cache_events_df, hide_index=True)
+
+
+class QueryProfileStore:
+    """The execution statistics of the most recent warehouse queries, per query family.
+
+    Query IDs are queued with ``add_pending`` as queries run, and their statistics are
+    attached with ``add_profiles`` once looked up from the query history. Only the last
+    ``window`` profiles of each family are kept.
+    """
+
+    def __init__(self, window=QUERY_PROFILE_WINDOW):
+        self.window = window
+        self._pending = {}
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def add_pending(self, family, query_id):
+        with self._lock:
+            self._pending[query_id] = family
+            # Drop the oldest IDs if their statistics can't be looked up
+            while len(self._pending) > self.window * 5:
+                self._pending.pop(next(iter(self._pending)))
+
+    def pending(self):
+        """Return the query IDs still waiting for their statistics."""
+        with self._lock:
+            return tuple(self._pending)
+
+    def add_profiles(self, profiles_df):
+        """Attach the rows of a ``query_execution_stats`` result to their query families."""
+        with self._lock:
+            for profile in profiles_df.to_dict("records"):
+                family = self._pending.pop(profile["QUERY_ID"], None)
+                if family is None:
+                    continue
+                window = self._profiles.setdefault(family, deque(maxlen=self.window))
+                window.append(profile)
+                log_event("query_profile", family=family, **profile)
+
+    def summary(self):
+        """Return one row per query family summarising its recent profiles, slowest first."""
+        with self._lock:
+            rows = [
+                {"FAMILY": family, **profile}
+                for family, window in self._profiles.items()
+                for profile in window
+            ]
+        if not rows:
+            return pd.DataFrame()
+
+        profiles_df = pd.DataFrame(rows)
+        summary_df = profiles_df.groupby("FAMILY").agg(
+            QUERIES=("QUERY_ID", "count"),
+            MEAN_ELAPSED_S=("TOTAL_ELAPSED_TIME", "mean"),
+            P95_ELAPSED_S=("TOTAL_ELAPSED_TIME", lambda elapsed: elapsed.quantile(0.95)),
+            TOTAL_ELAPSED_S=("TOTAL_ELAPSED_TIME", "sum"),
+            MEAN_COMPILE_S=("COMPILATION_TIME", "mean"),
+            MEAN_QUEUED_S=("QUEUED_TIME", "mean"),
+            MEAN_GIB_SCANNED=("BYTES_SCANNED", "mean"),
+            PARTITIONS_SCANNED=("PARTITIONS_SCANNED", "sum"),
+            PARTITIONS_TOTAL=("PARTITIONS_TOTAL", "sum"),
+        )
+        # The query history reports milliseconds and bytes
+        seconds = ["MEAN_ELAPSED_S", "P95_ELAPSED_S", "TOTAL_ELAPSED_S", "MEAN_COMPILE_S", "MEAN_QUEUED_S"]
+        summary_df[seconds] = summary_df[seconds] / 1000
+        summary_df["MEAN_GIB_SCANNED"] = summary_df["MEAN_GIB_SCANNED"] / 1024**3
+        summary_df["FRACTION_SCANNED"] = (
+            summary_df["PARTITIONS_SCANNED"] / summary_df["PARTITIONS_TOTAL"].where(summary_df["PARTITIONS_TOTAL"] > 0)
+        )
+        return summary_df.sort_values("TOTAL_ELAPSED_S", ascending=False).reset_index()
+
+
+# Process-wide, so the summary covers every session and the background cache warmer
+_query_profiles = QueryProfileStore()
+
+
+def get_query_profiles():
+    """Return the process-wide ``QueryProfileStore``."""
+    return _query_profiles
+
+
+def record_query_id(query, query_id):
+    """Queue the warehouse query ID of ``query`` so its execution statistics can be looked up."""
+    # The statistics lookups themselves aren't profiled
+    if query_id and query.family != "query_execution_stats":
+        _query_profiles.add_pending(query.family, query_id)
+
+
+def render_query_profile_panel(summary_df):
+    """Show the rolling per-family summary of warehouse query statistics in the sidebar."""
+    with st.sidebar.expander("**Warehouse query profiles (debug)**", expanded=False):
+        if summary_df.empty:
+            st.caption("No warehouse queries profiled yet.")
+            return
+        st.dataframe(summary_df, hide_index=True,
+                     column_config={"FRACTION_SCANNED": st.column_config.NumberColumn(format="%.2f")})
+
+
+def render_backend_panel(name, stats):
+    """Show the warehouse backend's metrics (e.g. session pool queue waits) in the sidebar."""
+    if not stats:
+        return
+    with st.sidebar.expander(f"**Warehouse backend: {name} (debug)**", expanded=False):
+        st.dataframe(pd.Series(stats, name="value").to_frame(), width=None)
@@ -0,0 +1,800 @@
+import functools
+import re
+from datetime import date
+from typing import NamedTuple
+
+# Package imports are needed to generate the dummy dataframes
+import numpy as np
+import pandas as pd
+
+# ``:name`` placeholders; the lookbehind skips VARIANT paths (``annotations:Component``) and ``::`` casts
+_PLACEHOLDER = re.compile(r"(?<![\w:]):(\w+)")
+
+
+# Compact pandas dtypes for the result columns of each query family; names become
+# categoricals, counts nullable 32-bit integers and TiB values 32-bit floats
+_OVERVIEW_DTYPES = {
+    "NAME": "category",
+    "ANNUAL_UNIQUE_USERS": "Int32",
+    "ANNUAL_DOWNLOADS_IN_TIB": "float32",
+    "TOTAL_PROJECT_SIZE_IN_TIB": "float32",
+}
+_DOWNLOAD_TRENDS_DTYPES = {
+    "NAME": "category",
+    # Fractional when it holds the per-month median (``top_n`` results)
+    "DISTINCT_USER_COUNT": "float32",
+    "PROJECT_RANK": "Int32",
+}
+_TOP_ANNOTATIONS_DTYPES = {
+    "COMPONENT_NAME": "category",
+    "OCCURRENCES": "Int32",
+    "NUMBER_OF_UNIQUE_DOWNLOADS": "Int32",
+}
+RESULT_DTYPES = {
+    "query_annual_overview": _OVERVIEW_DTYPES,
+    "query_annual_overview_by_year": _OVERVIEW_DTYPES,
+    "query_monthly_download_trends": _DOWNLOAD_TRENDS_DTYPES,
+    "query_monthly_download_trends_by_year": _DOWNLOAD_TRENDS_DTYPES,
+    "query_top_annotations": _TOP_ANNOTATIONS_DTYPES,
+    "query_top_annotations_by_year": _TOP_ANNOTATIONS_DTYPES,
+    "query_annual_project_downloads": {
+        "NAME": "category",
+        "ANNUAL_DOWNLOADS_IN_TIB": "float32",
+        "TOTAL_PROJECT_SIZE_IN_TIB": "float32",
+    },
+    "query_annual_unique_users": {"ANNUAL_UNIQUE_USERS": "Int32"},
+    "query_annual_downloads": {"ANNUAL_DOWNLOADS_IN_TIB": "float32"},
+    "query_entity_distribution": {"NODE_TYPE": "category", "NUMBER_OF_FILES": "Int32"},
+}
+
+
+class Query(NamedTuple):
+    """SQL text with qmark (``?``) placeholders and the values bound to them, in order.
+
+    ``family`` names the builder that produced the query (e.g. ``query_top_annotations``)
+    so caching and monitoring can be configured and reported per builder.
+    """
+
+    sql: str
+    params: tuple = ()
+    family: str = ""
+
+
+def query_builder(builder):
+    """Tag the ``Query`` returned by ``builder`` with the builder's name as its family."""
+
+    @functools.wraps(builder)
+    def wrapper(*args, **kwargs):
+        return builder(*args, **kwargs)._replace(family=builder.__name__)
+
+    return wrapper
+
+
+def bind(sql, **params):
+    """Compile the ``:name`` placeholders in ``sql`` into a ``Query`` with bound values.
+
+    The SQL text stays fixed across selections so Snowflake can reuse compiled plans and
+    cached results, and user-controlled values never end up in the text. A list or tuple
+    expands to one placeholder per item (for ``IN`` lists); an empty one binds a single
+    ``NULL`` so the list still parses and matches nothing.
+    """
+    values = []
+
+    def substitute(match):
+        name = match.group(1)
+        if name not in params:
+            raise KeyError(f"No value bound for placeholder ':{name}'")
+        value = params[name]
+        if isinstance(value, (list, tuple)):
+            items = list(value) or [None]
+            values.extend(items)
+            return ", ".join("?" * len(items))
+        values.append(value)
+        return "?"
+
+    return Query(_PLACEHOLDER.sub(substitute, sql), tuple(values))
+
+
+def year_range(year):
+    """Return the half-open ``[start, end)`` date range covering a calendar year.
+
+    Comparing the raw date column against these bounds (instead of ``YEAR(column) = year``)
+    keeps the predicate sargable, so Snowflake can prune micro-partitions on it.
+    """
+    return {"start": date(int(year), 1, 1), "end": date(int(year) + 1, 1, 1)}
+
+
+def years_range(years, since=None, until=None):
+    """Return the half-open ``[start, end)`` date range covering every year in ``years``.
+
+    ``since`` and ``until`` narrow the range, e.g. to the part of a year whose data can
+    still change (see ``get_incremental_data_from_snowflake``).
+    """
+    start, end = year_range(min(years))["start"], year_range(max(years))["end"]
+    return {"start": max(start, since or start), "end": min(end, until or end)}
+
+
+def count_distinct(column, approximate=False):
+    """Return the SQL counting the distinct values of ``column``.
+
+    With ``approximate``, the count is estimated with ``APPROX_COUNT_DISTINCT`` (HyperLogLog,
+    within about 2% of the exact count), which is much cheaper over ``filedownload``.
+    """
+    return f"APPROX_COUNT_DISTINCT({column})" if approximate else f"COUNT(DISTINCT {column})"
+
+
+@query_builder
+def query_program_project_ids(program_id):
+    """Return the ids of the projects in the scope of a given program."""
+
+    sql = """
+    SELECT
+        DISTINCT cast(scopes.value as integer) as project_id
+    FROM
+        synapse_data_warehouse.synapse.node_latest,
+        LATERAL flatten(input => node_latest.scope_ids) scopes
+    WHERE
+        id = :program_id
+    ORDER BY
+        project_id;
+    """
+
+    return bind(sql, program_id=program_id)
+
+
+@query_builder
+def query_annual_unique_users(year, project_ids, approximate=False):
+    """Return the number of unique users for a given year (estimated if ``approximate``)."""
+
+    sql = f"""
+    SELECT
+        {count_distinct("user_id", approximate)} as annual_unique_users
+    FROM
+        synapse_data_warehouse.synapse.filedownload
+    WHERE
+        project_id in (:project_ids)
+    AND
+        record_date >= :start
+    AND
+        record_date < :end;
+    """
+
+    return bind(sql, project_ids=project_ids, **year_range(year))
+
+
+@query_builder
+def query_annual_downloads(year, project_ids):
+    """Return the annual downloads (in TiB) for a given year."""
+
+    sql = """
+    WITH
+    file_handle_ids AS (
+
+        SELECT
+            DISTINCT file_handle_id
+        FROM
+            synapse_data_warehouse.synapse.filedownload
+        WHERE
+            project_id in (:project_ids)
+        AND
+            record_date >= :start
+        AND
+            record_date < :end
+    )
+    SELECT
+        SUM(content_size) / POWER(1024, 4) as annual_downloads_in_tib
+    FROM
+        synapse_data_warehouse.synapse.file_latest
+    WHERE
+        id in (SELECT file_handle_id FROM file_handle_ids);
+    """
+
+    return bind(sql, project_ids=project_ids, **year_range(year))
+
+
+@query_builder
+def query_downloaded_files_by_year(years, project_ids, since=None, until=None):
+    """Return the distinct files downloaded in each year of ``years``, with their size in bytes.
+
+    Unlike ``query_annual_downloads``, the rows of two date ranges can be merged (and
+    de-duplicated) locally, which lets the annual downloads of the current year be
+    refreshed incrementally. ``since`` and ``until`` narrow the date range.
+    """
+
+    sql = """
+    WITH
+    file_handle_ids AS (
+
+        SELECT
+            DISTINCT
+            YEAR(record_date) AS year,
+            file_handle_id
+        FROM
+            synapse_data_warehouse.synapse.filedownload
+        WHERE
+            project_id in (:project_ids)
+        AND
+            record_date >= :start
+        AND
+            record_date < :end
+    )
+    SELECT
+        fh.year,
+        fh.file_handle_id,
+        fl.content_size
+    FROM
+        file_handle_ids fh
+    JOIN
+        synapse_data_warehouse.synapse.file_latest fl
+    ON
+        fl.id = fh.file_handle_id;
+    """
+
+    return bind(sql, project_ids=project_ids, **years_range(years, since, until))
+
+
+@query_builder
+def query_daily_user_sketches(years, project_ids):
+    """Return a HyperLogLog sketch of the users who downloaded from each project on each day.
+
+    The exported sketches (``USERS_SKETCH``) can be merged locally for any range of days and
+    set of projects (see ``toolkit/sketches.py``), so custom date ranges don't need another scan.
+    """
+
+    sql = """
+    SELECT
+        project_id,
+        record_date AS day,
+        HLL_EXPORT(HLL_ACCUMULATE(user_id)) AS users_sketch
+    FROM
+        synapse_data_warehouse.synapse.filedownload
+    WHERE
+        project_id in (:project_ids)
+    AND
+        record_date >= :start
+    AND
+        record_date < :end
+    GROUP BY
+        project_id,
+        record_date;
+    """
+
+    return bind(sql, project_ids=project_ids, **years_range(years))
+
+
+@query_builder
+def query_annual_cost(project_ids):
+    """Return the annual cost for a given year."""
+
+    sql = """
+    WITH price_per_year AS (
+        SELECT
+            CASE
+                WHEN FILE_LATEST.CONCRETE_TYPE = 'org.sagebionetworks.repo.model.file.GoogleCloudFileHandle'
+                THEN FILE_LATEST.CONTENT_SIZE / power(2, 30) * 0.026 * 12
+                ELSE FILE_LATEST.CONTENT_SIZE / power(2, 30) * 0.023 * 12
+            END AS price_per_file_annually
+        FROM
+            synapse_data_warehouse.synapse.node_latest
+        LEFT JOIN
+            synapse_data_warehouse.synapse.file_latest FILE_LATEST
+        ON
+            node_latest.FILE_HANDLE_ID = FILE_LATEST.ID
+        WHERE
+            node_latest.project_id in (:project_ids)
+        AND
+            node_latest.node_type != 'folder'
+    )
+    SELECT
+        SUM(price_per_file_annually) AS annual_cost
+    FROM
+        price_per_year;
+    """
+
+    return bind(sql, project_ids=project_ids)
+
+
+@query_builder
+def query_monthly_download_trends(year, project_ids, top_n=None, approximate=False):
+    """Return the monthly download trends for a given year."""
+
+    return query_monthly_download_trends_by_year([year], project_ids, top_n=top_n, approximate=approximate)
+
+
+@query_builder
+def query_monthly_download_trends_by_year(years, project_ids, top_n=None, since=None, until=None, approximate=False):
+    """Return the monthly download trends for every year in ``years``, tagged with their year.
+
+    With ``top_n``, only the ``top_n`` projects with the most unique users in each year are
+    returned (ranked by ``PROJECT_RANK``), followed by one ``IS_MEDIAN`` row per month holding
+    the median over all of the program's projects, so the result size doesn't grow with the
+    size of the program. ``since`` and ``until`` (month starts) narrow the date range, and
+    ``approximate`` estimates the unique users (see ``count_distinct``).
+    """
+
+    ctes = """
+    WITH project_files AS (
+        SELECT
+            nl.id AS node_id,
+            nl.project_id
+        FROM
+            synapse_data_warehouse.synapse.node_latest nl
+        WHERE
+            nl.project_id in (:project_ids)
+    ),
+    file_access AS (
+        SELECT
+            pf.project_id,
+            filedownload.user_id,
+            DATE_TRUNC('month', filedownload.TIMESTAMP) AS access_month
+        FROM
+            project_files pf
+        JOIN
+            synapse_data_warehouse.synapse.filedownload filedownload
+        ON
+            pf.node_id = filedownload.file_handle_id
+        WHERE
+            filedownload.TIMESTAMP >= :start
+        AND
+            filedownload.TIMESTAMP < :end
+    ),
+    project_names AS (
+        SELECT
+            name,
+            project_id
+        FROM
+            synapse_data_warehouse.synapse.node_latest
+        WHERE
+            project_id in (:project_ids)
+        AND
+            node_type = 'project'
+    )
+    """
+
+    monthly_counts = f"""
+    SELECT
+        YEAR(access_month) AS year,
+        file_access.project_id,
+        name,
+        access_month,
+        {count_distinct("user_id", approximate)} AS distinct_user_count
+    FROM
+        file_access
+    JOIN
+        project_names pn
+    ON
+        file_access.project_id = pn.project_id
+    GROUP BY
+        file_access.project_id,
+        name,
+        access_month
+    """
+
+    if top_n is None:
+        sql = ctes + monthly_counts + """
+    ORDER BY
+        file_access.project_id,
+        access_month;
+    """
+        return bind(sql, project_ids=project_ids, **years_range(years, since, until))
+
+    sql = ctes + """,
+    monthly_counts AS (""" + monthly_counts + """),
+    project_ranks AS (
+        SELECT
+            year,
+            project_id,
+            ROW_NUMBER() OVER (
+                PARTITION BY year ORDER BY SUM(distinct_user_count) DESC, project_id
+            ) AS project_rank
+        FROM
+            monthly_counts
+        GROUP BY
+            year,
+            project_id
+    )
+    SELECT
+        mc.year,
+        mc.project_id,
+        mc.name,
+        mc.access_month,
+        mc.distinct_user_count,
+        pr.project_rank,
+        FALSE AS is_median
+    FROM
+        monthly_counts mc
+    JOIN
+        project_ranks pr
+    ON
+        mc.year = pr.year
+    AND
+        mc.project_id = pr.project_id
+    WHERE
+        pr.project_rank <= :top_n
+    UNION ALL
+    SELECT
+        year,
+        NULL AS project_id,
+        NULL AS name,
+        access_month,
+        MEDIAN(distinct_user_count) AS distinct_user_count,
+        NULL AS project_rank,
+        TRUE AS is_median
+    FROM
+        monthly_counts
+    GROUP BY
+        year,
+        access_month
+    ORDER BY
+        is_median,
+        project_rank,
+        access_month;
+    """
+
+    return bind(sql, project_ids=project_ids, top_n=top_n, **years_range(years, since, until))
+
+
+@query_builder
+def query_annual_project_downloads(year, project_ids):
+    """Return the annual project downloads for a given year."""
+
+    sql = """
+    WITH
+    file_handle_ids AS (
+        SELECT
+            DISTINCT file_handle_id,
+            project_id
+        FROM
+            synapse_data_warehouse.synapse.filedownload
+        WHERE
+            project_id in (:project_ids)
+        AND
+            record_date >= :start
+        AND
+            record_date < :end
+    ),
+    total_download_size AS (
+        SELECT
+            fh.project_id,
+            SUM(fl.content_size) / POWER(1024, 4) as annual_downloads_in_tib
+        FROM
+            file_handle_ids fh
+        JOIN
+            synapse_data_warehouse.synapse.file_latest fl
+        ON
+            fh.file_handle_id = fl.id
+        GROUP BY
+            fh.project_id
+    ),
+    total_project_size AS (
+        SELECT
+            nl.project_id,
+            SUM(fl.content_size) / POWER(1024, 4) as total_project_size_in_tib
+        FROM
+            synapse_data_warehouse.synapse.node_latest nl
+        JOIN
+            synapse_data_warehouse.synapse.file_latest fl
+        ON
+            nl.file_handle_id = fl.id
+        WHERE
+            nl.project_id in (:project_ids)
+        AND
+            fl.created_on < :end
+        GROUP BY
+            nl.project_id
+    ),
+    project_names AS (
+        SELECT
+            name,
+            project_id
+        FROM
+            synapse_data_warehouse.synapse.node_latest
+        WHERE
+            project_id in (:project_ids)
+        AND
+            node_type = 'project'
+    )
+    SELECT
+        tps.project_id,
+        pn.name,
+        tds.annual_downloads_in_tib,
+        tps.total_project_size_in_tib
+    FROM
+        total_download_size tds
+    JOIN
+        total_project_size tps
+    ON
+        tds.project_id = tps.project_id
+    JOIN
+        project_names pn
+    ON
+        tds.project_id = pn.project_id
+    ORDER BY
+        tds.annual_downloads_in_tib DESC;
+    """
+
+    return bind(sql, project_ids=project_ids, **year_range(year))
+
+
+@query_builder
+def query_annual_overview(year, project_ids, approximate=False):
+    """Return the per-project and program-level download totals for a given year."""
+
+    return query_annual_overview_by_year([year], project_ids, approximate=approximate)
+
+
+@query_builder
+def query_annual_overview_by_year(years, project_ids, approximate=False):
+    """Return the per-project and program-level download totals for every year in ``years``.
+
+    ``filedownload`` is scanned once and aggregated with ``GROUPING SETS``: for each year,
+    rows with ``is_program_total`` set carry the program's unique users and TiB downloaded,
+    the rest carry the same metrics (plus name and total size to date) for each project.
+    ``approximate`` estimates the unique users (see ``count_distinct``).
+    """
+
+    sql = f"""
+    WITH
+    downloads AS (
+        SELECT
+            DISTINCT YEAR(record_date) AS year,
+            project_id,
+            file_handle_id,
+            user_id
+        FROM
+            synapse_data_warehouse.synapse.filedownload
+        WHERE
+            project_id in (:project_ids)
+        AND
+            record_date >= :start
+        AND
+            record_date < :end
+    ),
+    ranked_downloads AS (
+        // Flag one row per file and year so sizes are only summed once at each grouping level
+        SELECT
+            d.year,
+            d.project_id,
+            d.user_id,
+            fl.content_size,
+            ROW_NUMBER() OVER (
+                PARTITION BY d.year, d.project_id, d.file_handle_id ORDER BY d.user_id
+            ) = 1 AS first_in_project,
+            ROW_NUMBER() OVER (
+                PARTITION BY d.year, d.file_handle_id ORDER BY d.project_id, d.user_id
+            ) = 1 AS first_in_program
+        FROM
+            downloads d
+        LEFT JOIN
+            synapse_data_warehouse.synapse.file_latest fl
+        ON
+            d.file_handle_id = fl.id
+    ),
+    download_totals AS (
+        SELECT
+            year,
+            GROUPING(project_id) = 1 AS is_program_total,
+            project_id,
+            {count_distinct("user_id", approximate)} AS annual_unique_users,
+            CASE
+                WHEN GROUPING(project_id) = 1
+                THEN SUM(IFF(first_in_program, content_size, 0))
+                ELSE SUM(IFF(first_in_project, content_size, 0))
+            END / POWER(1024, 4) AS annual_downloads_in_tib
+        FROM
+            ranked_downloads
+        GROUP BY
+            GROUPING SETS ((year, project_id), (year))
+    ),
+    project_size_by_created_year AS (
+        SELECT
+            nl.project_id,
+            YEAR(fl.created_on) AS created_year,
+            SUM(fl.content_size) AS content_size
+        FROM
+            synapse_data_warehouse.synapse.node_latest nl
+        JOIN
+            synapse_data_warehouse.synapse.file_latest fl
+        ON
+            nl.file_handle_id = fl.id
+        WHERE
+            nl.project_id in (:project_ids)
+        AND
+            fl.created_on < :end
+        GROUP BY
+            nl.project_id,
+            created_year
+    ),
+    total_project_size AS (
+        // Everything created up to the end of each year counts towards that year's size
+        SELECT
+            y.year,
+            ps.project_id,
+            SUM(ps.content_size) / POWER(1024, 4) as total_project_size_in_tib
+        FROM
+            (SELECT DISTINCT year FROM download_totals) y
+        JOIN
+            project_size_by_created_year ps
+        ON
+            ps.created_year <= y.year
+        GROUP BY
+            y.year,
+            ps.project_id
+    ),
+    project_names AS (
+        SELECT
+            name,
+            project_id
+        FROM
+            synapse_data_warehouse.synapse.node_latest
+        WHERE
+            project_id in (:project_ids)
+        AND
+            node_type = 'project'
+    )
+    SELECT
+        dt.year,
+        dt.is_program_total,
+        dt.project_id,
+        pn.name,
+        dt.annual_unique_users,
+        dt.annual_downloads_in_tib,
+        tps.total_project_size_in_tib
+    FROM
+        download_totals dt
+    LEFT JOIN
+        total_project_size tps
+    ON
+        dt.year = tps.year
+    AND
+        dt.project_id = tps.project_id
+    LEFT JOIN
+        project_names pn
+    ON
+        dt.project_id = pn.project_id
+    WHERE
+        dt.is_program_total
+    OR
+        (tps.project_id IS NOT NULL AND pn.project_id IS NOT NULL)
+    ORDER BY
+        dt.year,
+        dt.is_program_total DESC,
+        dt.annual_downloads_in_tib DESC;
+    """
+
+    return bind(sql, project_ids=project_ids, **years_range(years))
+
+
+@query_builder
+def query_top_annotations(year, project_ids, approximate=False):
+    """Return the top annotations for HTAN for a given year."""
+
+    return query_top_annotations_by_year([year], project_ids, approximate=approximate)
+
+
+@query_builder
+def query_top_annotations_by_year(years, project_ids, approximate=False):
+    """Return the top annotations for every year in ``years``, tagged with their year.
+
+    ``approximate`` estimates the unique downloads (see ``count_distinct``).
+    """
+
+    sql = f"""
+    WITH dedup_downloads AS (
+        SELECT
+            DISTINCT YEAR(filedownload.RECORD_DATE) AS year,
+            filedownload.user_id, 
+            filedownload.file_handle_id, 
+            filedownload.RECORD_DATE, 
+            node_latest.annotations:annotations:Component:value[0] AS component
+        FROM
+            synapse_data_warehouse.synapse.filedownload
+        INNER JOIN
+            synapse_data_warehouse.synapse.node_latest
+            ON filedownload.file_handle_id = node_latest.file_handle_id
+        WHERE
+            filedownload.project_id in (:project_ids)
+        AND
+            node_latest.annotations:annotations:Component:value[0] IS NOT NULL
+        AND
+            filedownload.RECORD_DATE >= :start
+        AND
+            filedownload.RECORD_DATE < :end
+    ), component_popularity AS (
+        SELECT
+            node_latest.annotations:annotations:Component:value[0] as component,
+            COUNT(DISTINCT node_latest.id) AS occurrences
+        FROM
+            synapse_data_warehouse.synapse.node_latest node_latest
+        WHERE
+            node_latest.project_id in (:project_ids)
+        AND
+            node_latest.annotations:annotations:Component:value[0] IS NOT NULL
+        GROUP BY
+            component
+    )
+    SELECT
+        dd.year,
+        dd.component AS component_name,
+        cp.occurrences,
+        {count_distinct("dd.user_id", approximate)} AS number_of_unique_downloads
+    FROM
+        dedup_downloads dd
+    JOIN
+        component_popularity cp
+    ON
+        dd.component = cp.component
+    GROUP BY
+        dd.year, dd.component, cp.occurrences
+    ORDER BY
+        dd.year,
+        number_of_unique_downloads DESC;
+    """
+
+    return bind(sql, project_ids=project_ids, **years_range(years))
+
+
+@query_builder
+def query_entity_distribution(project_ids):
+    """Returns the number of files for a given project (synapse_id)."""
+
+    sql = """
+    SELECT
+        node_type,
+        count(*) as number_of_files,
+        count(*) * 100.0 / SUM(COUNT(*)) OVER () AS percentage_of_total
+    FROM
+        SYNAPSE_DATA_WAREHOUSE.SYNAPSE.NODE_LATEST
+    WHERE
+        NODE_LATEST.project_id in (:project_ids)
+    group by
+        node_type
+    order by
+        number_of_files DESC;
+    """
+
+    return bind(sql, project_ids=project_ids)
+
+@query_builder
+def query_execution_stats(query_ids):
+    """Look up the execution statistics of recent queries by their query IDs.
+
+    Times are in milliseconds. ``PARTITIONS_SCANNED`` against ``PARTITIONS_TOTAL`` shows how
+    well the date and project filters prune micro-partitions.
+    """
+    sql = """
+    SELECT
+        query_id,
+        total_elapsed_time,
+        compilation_time,
+        execution_time,
+        queued_provisioning_time + queued_repair_time + queued_overload_time AS queued_time,
+        bytes_scanned,
+        partitions_scanned,
+        partitions_total
+    FROM
+        TABLE(synapse_data_warehouse.information_schema.query_history(result_limit => 10000))
+    WHERE
+        query_id IN (:query_ids)
+        AND execution_status = 'SUCCESS';
+    """
+
+    return bind(sql, query_ids=query_ids)
+
+def dummy_get_download_access(program_ids, program_names):
+    # def truncate_name(name, max_length=20):
+    #     return name if len(name) <= max_length else name[:max_length] + "..."
+    # program_names = program_names.apply(truncate_name)
+
+    # Generate arbitrary random download access counts for each program id
+    download_access_count = np.random.randint(1, 1000, size=len(program_ids))
+    
+    # Create a new dataframe with the original program_ids and the new column
+    new_df = pd.DataFrame({
+        'PROJECT_ID': program_ids,
+        'NAME': program_names,
+        'DOWNLOAD_ACCESS_COUNT': download_access_count
+    })
+    
+    return new_df
+
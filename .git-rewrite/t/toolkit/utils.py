@@ -0,0 +1,904 @@
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from toolkit.monitoring import get_query_profiles, record_cache_event, record_query_id
+from toolkit.queries import (
+    RESULT_DTYPES,
+    query_daily_user_sketches,
+    query_execution_stats,
+    query_program_project_ids,
+)
+from toolkit.sketches import UserSketchStore
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the number of queries a single page submits to Snowflake at once
+MAX_CONCURRENT_QUERIES = 6
+
+# Snowpark sessions kept open for queries; each query checks one out for as long as it runs.
+# Sessions idle for longer than the health-check interval (in seconds) are pinged before reuse.
+SESSION_POOL_SIZE = int(os.environ.get("DCC_SESSION_POOL_SIZE", MAX_CONCURRENT_QUERIES))
+SESSION_HEALTH_CHECK_INTERVAL = int(os.environ.get("DCC_SESSION_HEALTH_CHECK_INTERVAL", 60 * 5))
+
+# Connector error numbers meaning the session is gone (expired or invalid tokens, closed
+# connection); the query is retried once on a fresh session
+SESSION_EXPIRED_ERRNOS = {250002, 390111, 390112, 390113, 390114, 390115}
+
+# Whether unique-user counts are estimated (``APPROX_COUNT_DISTINCT``) unless the user asks
+# for exact ones in the sidebar
+APPROXIMATE_DISTINCT_COUNTS = os.environ.get("DCC_APPROXIMATE_DISTINCT_COUNTS", "true").lower() in ("1", "true", "yes")
+
+# Downloads can land in ``filedownload`` a little late, so a month (or year) is only treated
+# as closed, and its results cached for good, this many days after it ends
+INCREMENTAL_GRACE_DAYS = 2
+
+# How long (in seconds) a program's resolved project scope is reused before re-expanding it
+PROGRAM_SCOPE_TTL = 60 * 60 * 24
+
+# The cache warmer re-runs its queries once this fraction of their shortest TTL has passed
+CACHE_REWARM_FRACTION = 0.8
+
+# In-process query cache: a memory budget (in bytes) shared by every cached result, and how
+# long (in seconds) results stay valid, by query family with a default for the rest
+QUERY_CACHE_MAX_BYTES = int(os.environ.get("DCC_QUERY_CACHE_MAX_BYTES", 512 * 1024**2))
+QUERY_CACHE_TTL = int(os.environ.get("DCC_QUERY_CACHE_TTL", 60 * 60 * 6))
+QUERY_FAMILY_TTLS = {
+    "query_annual_cost": 60 * 60 * 24,
+    "query_entity_distribution": 60 * 60 * 24,
+}
+
+# Which warehouse backend runs the queries: ``snowflake`` (live) or ``duckdb`` (local Parquet
+# extracts of ``node_latest``, ``filedownload`` and ``file_latest`` under the extracts directory)
+WAREHOUSE_BACKEND = os.environ.get("DCC_WAREHOUSE_BACKEND", "snowflake")
+DUCKDB_EXTRACTS_DIR = os.environ.get(
+    "DCC_DUCKDB_EXTRACTS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "extracts"),
+)
+
+# On-disk result cache, checked before Snowflake so restarts and redeploys don't start cold.
+# Point ``DCC_RESULT_CACHE_DIR`` at a persistent volume when running in a container.
+RESULT_CACHE_DIR = os.environ.get(
+    "DCC_RESULT_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "results"),
+)
+RESULT_CACHE_TTL = int(os.environ.get("DCC_RESULT_CACHE_TTL", 60 * 60 * 24))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("DCC_RESULT_CACHE_MAX_BYTES", 2 * 1024**3))
+
+
+def query_cache_key(query):
+    """Hash a ``Query`` so formatting-only differences in its SQL map to the same cache key."""
+    normalized_sql = " ".join(query.sql.split())
+    payload = json.dumps([normalized_sql, list(query.params)], default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def query_ttl(query):
+    """Return how long (in seconds) the result of ``query`` stays valid."""
+    return QUERY_FAMILY_TTLS.get(query.family, QUERY_CACHE_TTL)
+
+
+class MemoryResultCache:
+    """An in-process LRU cache of query results bounded by their total memory footprint.
+
+    Each entry is sized with ``DataFrame.memory_usage(deep=True)``. Entries expire at the
+    time given when they are stored, and the least recently used ones are evicted once the
+    total size goes past ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes=QUERY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, query):
+        """Return the cached DataFrame for ``query``, or ``None`` if missing or expired."""
+        key = query_cache_key(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < time.time():
+                self._pop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        # A shallow copy lets callers add columns without touching the cached frame
+        return entry[0].copy(deep=False)
+
+    def put(self, query, df, expires_at=None):
+        """Store ``df`` for ``query`` until ``expires_at`` (by default, the query's TTL from now)."""
+        if expires_at is None:
+            expires_at = time.time() + query_ttl(query)
+        key = query_cache_key(query)
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+            # A result larger than the whole budget would only flush everything else
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (df, size, expires_at)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def stats(self):
+        """Return the hit/miss counters and the current number and size of entries."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _pop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+
+class ParquetResultCache:
+    """A disk-backed cache of query results stored as Parquet files.
+
+    Entries are keyed by a hash of the normalized SQL text and its bound values. Each entry
+    has its own TTL, and the least recently used entries are evicted once the cache grows
+    past ``max_bytes``. Hits and misses are counted for monitoring.
+    """
+
+    key = staticmethod(query_cache_key)
+
+    def __init__(self, directory, ttl=RESULT_CACHE_TTL, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return f"{base}.parquet", f"{base}.json"
+
+    def get(self, query):
+        """Return the cached DataFrame for ``query``, or ``None`` if missing or expired."""
+        entry = self.get_entry(query)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, query):
+        """Return ``(DataFrame, expires_at)`` for ``query``, or ``None`` if missing or expired."""
+        data_path, meta_path = self._paths(self.key(query))
+        with self._lock:
+            try:
+                with open(meta_path) as f:
+                    expires_at = json.load(f)["expires_at"]
+                if expires_at is not None and expires_at < time.time():
+                    self._remove(data_path, meta_path)
+                    raise FileNotFoundError(data_path)
+                df = pd.read_parquet(data_path)
+            except (OSError, ValueError, KeyError):
+                self.misses += 1
+                return None
+
+            # Bump the modification time so eviction sees this entry as recently used
+            os.utime(data_path)
+            self.hits += 1
+            return df, expires_at
+
+    def put(self, query, df, ttl=None):
+        """Store ``df`` for ``query`` for ``ttl`` seconds (``self.ttl`` by default, 0 for no expiry)."""
+        ttl = self.ttl if ttl is None else ttl
+        data_path, meta_path = self._paths(self.key(query))
+        with self._lock:
+            # Write to temporary files first so readers never see a partial entry
+            df.to_parquet(f"{data_path}.tmp", index=False)
+            with open(f"{meta_path}.tmp", "w") as f:
+                json.dump({"expires_at": time.time() + ttl if ttl else None}, f)
+            os.replace(f"{data_path}.tmp", data_path)
+            os.replace(f"{meta_path}.tmp", meta_path)
+            self._evict()
+
+    def stats(self):
+        """Return the hit/miss counters and the current number and size of entries."""
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".parquet"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((name[: -len(".parquet")], stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total_bytes = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove(*self._paths(key))
+            total_bytes -= size
+
+    @staticmethod
+    def _remove(*paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def connect_to_snowflake():
+    """Create a new Snowpark session from the ``snowflake`` secrets."""
+    # Snowpark is slow to import, so it's only loaded when a session is actually created
+    from snowflake.snowpark import Session
+
+    # Keep-alive stops idle pooled sessions from expiring between queries
+    session = Session.builder.configs({"client_session_keep_alive": True, **st.secrets.snowflake}).create()
+    return session
+
+
+def is_session_expired(error):
+    """Whether ``error`` (raised by the connector) means the session has to be recreated."""
+    return getattr(error, "errno", None) in SESSION_EXPIRED_ERRNOS
+
+
+class SessionPool:
+    """A bounded pool of warehouse sessions, checked out for one query at a time.
+
+    Sessions are created lazily with ``connect`` up to ``size``; once all of them are in use,
+    ``checkout`` blocks until one is returned, and the time spent waiting is recorded so the
+    pool can be sized under load. Sessions idle for longer than ``health_check_interval`` are
+    pinged before reuse and replaced if the ping fails.
+    """
+
+    def __init__(self, connect, size=SESSION_POOL_SIZE, health_check_interval=SESSION_HEALTH_CHECK_INTERVAL):
+        self.connect = connect
+        self.size = size
+        self.health_check_interval = health_check_interval
+        # Most recently returned first, so the warmest sessions are reused and the rest can idle
+        self._idle = queue.LifoQueue()
+        self._open = 0
+        self._lock = threading.Lock()
+        self._checkouts = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._reconnects = 0
+
+    @contextmanager
+    def checkout(self):
+        """Lend a healthy session for the duration of the ``with`` block."""
+        start = time.perf_counter()
+        session = self._acquire()
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._checkouts += 1
+            self._wait_seconds += waited
+            self._max_wait_seconds = max(self._max_wait_seconds, waited)
+
+        expired = False
+        try:
+            yield session
+        except Exception as error:
+            expired = is_session_expired(error)
+            raise
+        finally:
+            # Sessions also go back to the pool when a stream is abandoned part-way
+            if expired:
+                self.discard(session)
+            else:
+                self._release(session)
+
+    def discard(self, session):
+        """Close a session that is no longer usable and free its slot in the pool."""
+        with self._lock:
+            self._open -= 1
+            self._reconnects += 1
+        try:
+            session.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "mean_wait_seconds": self._wait_seconds / self._checkouts if self._checkouts else 0.0,
+                "max_wait_seconds": self._max_wait_seconds,
+                "reconnects": self._reconnects,
+            }
+
+    def _acquire(self):
+        while True:
+            try:
+                session, returned_at = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._open < self.size
+                    if can_open:
+                        self._open += 1
+                if can_open:
+                    try:
+                        return self.connect()
+                    except Exception:
+                        with self._lock:
+                            self._open -= 1
+                        raise
+                session, returned_at = self._idle.get()
+
+            if time.monotonic() - returned_at < self.health_check_interval or self._is_healthy(session):
+                return session
+            logger.warning("Replacing an unhealthy warehouse session")
+            self.discard(session)
+
+    def _release(self, session):
+        self._idle.put((session, time.monotonic()))
+
+    @staticmethod
+    def _is_healthy(session):
+        try:
+            cursor = session.connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+
+# Arrow-side casts for the compact dtypes a ``RESULT_DTYPES`` map can ask for
+_ARROW_CASTS = {
+    "category": pa.string(),
+    "Int32": pa.int32(),
+    "float32": pa.float32(),
+}
+
+
+def arrow_to_pandas(table, dtypes=None):
+    """Convert an Arrow table to pandas, compacting the columns named in ``dtypes`` first.
+
+    Casting on the Arrow side means repeated strings arrive as categoricals and counts as
+    nullable ``Int32`` without ever being materialized as Python objects or wide types.
+    """
+    dtypes = dtypes or {}
+    columns = []
+    for name, column in zip(table.column_names, table.columns):
+        dtype = dtypes.get(name)
+        if dtype in _ARROW_CASTS:
+            column = column.cast(_ARROW_CASTS[dtype])
+        if dtype == "category":
+            column = column.dictionary_encode()
+        columns.append(column)
+    table = pa.Table.from_arrays(columns, names=table.column_names)
+    return table.to_pandas(types_mapper={pa.int32(): pd.Int32Dtype()}.get)
+
+
+class WarehouseBackend:
+    """Runs ``Query`` objects against a data warehouse and returns Arrow tables.
+
+    Column names in the results are upper case, as Snowflake returns them.
+    """
+
+    name = ""
+
+    def fetch_arrow(self, query):
+        """Return the whole result of ``query`` as an Arrow table."""
+        raise NotImplementedError
+
+    def iter_arrow_batches(self, query):
+        """Yield the result of ``query`` as a stream of Arrow tables."""
+        yield self.fetch_arrow(query)
+
+    def warm_up(self):
+        """Open the connection ahead of the first query."""
+
+    def stats(self):
+        """Return backend metrics for the debug panel."""
+        return {}
+
+
+class SnowflakeBackend(WarehouseBackend):
+    """Runs queries on Snowflake through the connector cursors of a ``SessionPool``.
+
+    A query whose session turns out to have expired is retried once on a fresh session.
+    """
+
+    name = "snowflake"
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    @staticmethod
+    def _execute(cursor, query):
+        cursor.execute(query.sql, list(query.params) or None)
+        # Keep the query ID so the query's execution statistics can be profiled
+        record_query_id(query, cursor.sfqid)
+
+    def fetch_arrow(self, query):
+        try:
+            return self._fetch_arrow(query)
+        except Exception as error:
+            if not is_session_expired(error):
+                raise
+            logger.warning("Warehouse session expired, retrying %s on a new session", query.family)
+            return self._fetch_arrow(query)
+
+    def _fetch_arrow(self, query):
+        with self.pool.checkout() as session:
+            cursor = session.connection.cursor()
+            try:
+                self._execute(cursor, query)
+                return cursor.fetch_arrow_all(force_return_table=True)
+            finally:
+                cursor.close()
+
+    def warm_up(self):
+        with self.pool.checkout():
+            pass
+
+    def stats(self):
+        return self.pool.stats()
+
+    def iter_arrow_batches(self, query):
+        # Batches are already being consumed when an error surfaces, so streams aren't retried
+        with self.pool.checkout() as session:
+            cursor = session.connection.cursor()
+            try:
+                self._execute(cursor, query)
+                yield from cursor.fetch_arrow_batches()
+            finally:
+                cursor.close()
+
+
+# Rewrites applied by ``to_duckdb_sql``, in order
+_DUCKDB_REWRITES = [
+    # The extracts are registered as plain views rather than fully qualified tables
+    (re.compile(r"synapse_data_warehouse\.synapse\.", re.IGNORECASE), ""),
+    # Snowflake's ``//`` line comments
+    (re.compile(r"//"), "--"),
+    # LATERAL FLATTEN over a JSON array becomes a lateral UNNEST exposing the same ``value``
+    (
+        re.compile(r"LATERAL\s+flatten\s*\(\s*input\s*=>\s*([\w.]+)\s*\)\s+(\w+)", re.IGNORECASE),
+        r"""LATERAL (SELECT unnest(from_json(\1, '["VARCHAR"]')) AS value) \2""",
+    ),
+    # VARIANT paths (``annotations:annotations:Component:value[0]``) become JSON paths
+    (
+        re.compile(r"\b([\w.]+)((?::[A-Za-z_]\w*)+)((?:\[\d+\])*)"),
+        lambda match: "json_extract_string({}, '${}{}')".format(
+            match.group(1), match.group(2).replace(":", "."), match.group(3)
+        ),
+    ),
+    (re.compile(r"\bIFF\s*\(", re.IGNORECASE), "IF("),
+]
+
+
+def to_duckdb_sql(sql):
+    """Translate the Snowflake SQL produced by ``toolkit/queries.py`` into DuckDB SQL."""
+    for pattern, replacement in _DUCKDB_REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class DuckDBBackend(WarehouseBackend):
+    """Runs queries in-process with DuckDB against local Parquet extracts.
+
+    ``extracts_dir`` holds one directory of Parquet files per table (``node_latest``,
+    ``filedownload`` and ``file_latest``), e.g. from a nightly unload, with VARIANT and
+    ARRAY columns stored as JSON text. The Snowflake SQL is translated by ``to_duckdb_sql``.
+    """
+
+    name = "duckdb"
+    tables = ("node_latest", "filedownload", "file_latest")
+
+    def __init__(self, extracts_dir):
+        # DuckDB is only needed when serving from local extracts
+        import duckdb
+
+        self.extracts_dir = extracts_dir
+        self._connection = duckdb.connect()
+        for table in self.tables:
+            path = os.path.join(extracts_dir, table, "*.parquet").replace("'", "''")
+            self._connection.execute(
+                f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{path}', union_by_name = true)"
+            )
+
+    def _execute(self, query):
+        # Each thread gets its own cursor, since a DuckDB connection isn't safe to share
+        cursor = self._connection.cursor()
+        return cursor.execute(to_duckdb_sql(query.sql), list(query.params))
+
+    @staticmethod
+    def _upper_case_columns(table):
+        return table.rename_columns([name.upper() for name in table.column_names])
+
+    def fetch_arrow(self, query):
+        return self._upper_case_columns(self._execute(query).fetch_arrow_table())
+
+    def iter_arrow_batches(self, query):
+        for batch in self._execute(query).fetch_record_batch():
+            yield self._upper_case_columns(pa.Table.from_batches([batch]))
+
+
+@st.cache_resource
+def get_backend():
+    """Return the process-wide ``WarehouseBackend`` selected by ``DCC_WAREHOUSE_BACKEND``."""
+    if WAREHOUSE_BACKEND == DuckDBBackend.name:
+        return DuckDBBackend(DUCKDB_EXTRACTS_DIR)
+    return SnowflakeBackend(SessionPool(connect_to_snowflake, SESSION_POOL_SIZE))
+
+
+@st.cache_resource
+def prewarm_backend():
+    """Create the warehouse backend and its first session on a background thread.
+
+    Called as soon as the app starts, so the connection is made while the sidebar and
+    README render. Queries that need the backend earlier wait for it in ``get_backend``.
+    """
+    thread = threading.Thread(target=lambda: get_backend().warm_up(), name="backend-prewarm", daemon=True)
+    add_script_run_ctx(thread, get_script_run_ctx())
+    thread.start()
+    return thread
+
+
+def run_query(query):
+    """Run a ``Query`` on the configured backend with its values bound, bypassing the caches.
+
+    Results are fetched as Arrow and compacted with the query family's ``RESULT_DTYPES`` map.
+    """
+    return arrow_to_pandas(get_backend().fetch_arrow(query), RESULT_DTYPES.get(query.family))
+
+
+def iter_batches_from_snowflake(query):
+    """Yield the result of ``query`` as a stream of compacted DataFrame batches.
+
+    Only one batch is held in memory at a time, so callers that consume or reduce the
+    stream chunk by chunk keep peak memory bounded by the batch size rather than the result
+    size. Streamed results bypass the query caches.
+    """
+    for table in get_backend().iter_arrow_batches(query):
+        yield arrow_to_pandas(table, RESULT_DTYPES.get(query.family))
+
+
+def reduce_batches_from_snowflake(query, reducer, initial=None):
+    """Fold the streamed batches of ``query`` into a single value with ``reducer(acc, batch)``."""
+    accumulator = initial
+    for batch in iter_batches_from_snowflake(query):
+        accumulator = reducer(accumulator, batch)
+    return accumulator
+
+
+def top_n_from_batches(batches, by, value, n=10):
+    """Return the ``n`` groups of ``by`` with the largest total ``value`` across ``batches``.
+
+    Totals are grouped incrementally, one batch at a time, so only the running total per
+    group is kept (e.g. the top projects by ``DISTINCT_USER_COUNT`` from a streamed
+    ``query_monthly_download_trends``).
+    """
+    totals = pd.Series(dtype="float64")
+    for batch in batches:
+        partial = batch.groupby(by, observed=True)[value].sum()
+        totals = totals.add(partial, fill_value=0)
+    return totals.nlargest(n)
+
+
+@st.cache_resource
+def get_query_cache():
+    return MemoryResultCache(QUERY_CACHE_MAX_BYTES)
+
+
+@st.cache_resource
+def get_result_cache():
+    # Results from different backends (live vs. local extracts) are kept apart
+    return ParquetResultCache(os.path.join(RESULT_CACHE_DIR, WAREHOUSE_BACKEND))
+
+
+def get_data_from_snowflake(query, ttl=None):
+    """Return the result of ``query``, served from the memory or disk cache while still valid.
+
+    ``ttl`` overrides how long (in seconds) a fresh result stays valid, 0 meaning for good.
+    """
+    start = time.perf_counter()
+    query_cache = get_query_cache()
+    node_latest = query_cache.get(query)
+    if node_latest is not None:
+        record_cache_event(query, "memory", time.perf_counter() - start, node_latest)
+        return node_latest
+
+    # Results evicted from memory but still valid on disk are reloaded instead of re-queried
+    entry = get_result_cache().get_entry(query)
+    if entry is None:
+        return refresh_data_from_snowflake(query, ttl=ttl)
+
+    node_latest, expires_at = entry
+    # Entries without an expiry on disk are kept in memory for good too
+    query_cache.put(query, node_latest, expires_at=float("inf") if expires_at is None else expires_at)
+    record_cache_event(query, "disk", time.perf_counter() - start, node_latest)
+    return node_latest.copy(deep=False)
+
+
+def refresh_data_from_snowflake(query, ttl=None):
+    """Run ``query`` on the warehouse regardless of what is cached and store the fresh result."""
+    ttl = query_ttl(query) if ttl is None else ttl
+    start = time.perf_counter()
+    node_latest = run_query(query)
+    record_cache_event(query, "warehouse", time.perf_counter() - start, node_latest)
+    get_result_cache().put(query, node_latest, ttl=ttl)
+    get_query_cache().put(query, node_latest, expires_at=time.time() + ttl if ttl else float("inf"))
+    return node_latest.copy(deep=False)
+
+
+def incremental_ranges(years, today=None):
+    """Split ``years`` into the ``(since, until, closed)`` date ranges fetched by incremental queries.
+
+    Every year that ended more than ``INCREMENTAL_GRACE_DAYS`` ago is one closed range. The
+    year in progress is split at the start of its open month: the closed months before it
+    form one range, which only changes once a month, and the open month onwards another.
+    Years that haven't started are skipped.
+    """
+    today = today or date.today()
+    settled = today - timedelta(days=INCREMENTAL_GRACE_DAYS)
+    open_month = date(settled.year, settled.month, 1)
+    ranges = []
+    for year in sorted(years):
+        start, end = date(year, 1, 1), date(year + 1, 1, 1)
+        if end <= settled:
+            ranges.append((start, end, True))
+        elif start <= today:
+            if start < open_month:
+                ranges.append((start, open_month, True))
+            ranges.append((max(start, open_month), end, False))
+    return ranges
+
+
+def get_incremental_data_from_snowflake(builder, years, project_ids, today=None):
+    """Return ``builder(years, project_ids)``'s result, refreshing only the data that can still change.
+
+    ``builder`` must accept ``since`` and ``until`` and return rows that can be combined
+    across date ranges (e.g. ``query_monthly_download_trends_by_year``, whose rows are per
+    month, or ``query_downloaded_files_by_year``). Each of the ``incremental_ranges`` is
+    queried and cached on its own: closed ranges for good, so after the first load only
+    the open month of the current year goes back to the warehouse, with the usual TTL.
+    """
+    queries = [
+        (builder(years, project_ids, since=since, until=until), closed)
+        for since, until, closed in incremental_ranges(years, today)
+    ]
+    if not queries:
+        return pd.DataFrame()
+
+    df = pd.concat(
+        [get_data_from_snowflake(query, ttl=0 if closed else None) for query, closed in queries], ignore_index=True
+    )
+
+    # Each range comes with its own categories, so the combined name columns are re-compacted
+    dtypes = RESULT_DTYPES.get(queries[0][0].family, {})
+    return df.astype({column: "category" for column, dtype in dtypes.items() if dtype == "category" and column in df})
+
+
+def annual_downloads_in_tib(downloaded_files_df):
+    """Return the downloads (in TiB) per ``YEAR`` of a ``query_downloaded_files_by_year`` result.
+
+    A file downloaded in several date ranges of the same year is only counted once.
+    """
+    files_df = downloaded_files_df.drop_duplicates(["YEAR", "FILE_HANDLE_ID"])
+    return files_df.groupby("YEAR")["CONTENT_SIZE"].sum() / 1024**4
+
+
+def collect_query_profiles():
+    """Look up the statistics of the profiled warehouse queries and return the per-family summary.
+
+    Only Snowflake reports query IDs, so with other backends the summary stays empty.
+    """
+    profiles = get_query_profiles()
+    query_ids = profiles.pending()
+    if query_ids:
+        try:
+            profiles.add_profiles(run_query(query_execution_stats(list(query_ids))))
+        except Exception:
+            # Profiling is best effort, e.g. the role may not see the query history
+            logger.warning("Could not look up query statistics", exc_info=True)
+    return profiles.summary()
+
+
+@st.cache_data(ttl=PROGRAM_SCOPE_TTL)
+def get_program_project_ids(program_id):
+    """Expand a program id into the ids of the projects in its scope.
+
+    The scope is flattened from ``node_latest.scope_ids`` once per ``PROGRAM_SCOPE_TTL`` and
+    the resolved ids are handed to the query builders as a literal ``IN`` list.
+    """
+    # Bypass ``get_data_from_snowflake`` so the scope is refreshed when the TTL expires
+    project_ids_df = run_query(query_program_project_ids(program_id))
+    return tuple(int(project_id) for project_id in project_ids_df["PROJECT_ID"])
+
+
+@st.cache_resource(ttl=QUERY_CACHE_TTL)
+def get_user_sketch_store(project_ids, years):
+    """Return the ``UserSketchStore`` of the daily user sketches of ``project_ids`` over ``years``.
+
+    The sketches are fetched (and cached like any other result) once; unique users for
+    custom date ranges are then merged from them locally.
+    """
+    return UserSketchStore(get_data_from_snowflake(query_daily_user_sketches(years, project_ids)))
+
+
+def iter_data_from_snowflake(queries, max_workers=MAX_CONCURRENT_QUERIES):
+    """Submit all ``queries`` at once and yield ``(key, DataFrame)`` pairs as they finish.
+
+    ``queries`` maps a caller-chosen key (e.g. the metric name) to a ``Query``. Each query
+    runs through ``get_data_from_snowflake`` on a bounded thread pool, so results are still
+    cached and the wall-clock cost is roughly that of the slowest query.
+    """
+    if not queries:
+        return
+
+    # Open the shared backend up front so the worker threads don't race to create it
+    get_backend()
+
+    # Attach the current script run context so the ``st.cache_*`` helpers work inside the workers
+    ctx = get_script_run_ctx()
+
+    def attach_context():
+        add_script_run_ctx(threading.current_thread(), ctx)
+
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(queries)), initializer=attach_context
+    ) as executor:
+        # Each worker gets a copy of the caller's context so its cache events reach the run's trace
+        futures = {
+            executor.submit(contextvars.copy_context().run, get_data_from_snowflake, query): key
+            for key, query in queries.items()
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def get_batch_data_from_snowflake(queries, max_workers=MAX_CONCURRENT_QUERIES):
+    """Run all ``queries`` concurrently and return a dict of DataFrames with the same keys."""
+    return dict(iter_data_from_snowflake(queries, max_workers=max_workers))
+
+
+def split_program_totals(overview_df):
+    """Split a ``query_annual_overview`` result into its per-project rows and its totals row."""
+    is_program_total = overview_df["IS_PROGRAM_TOTAL"].astype(bool)
+    project_df = overview_df[~is_program_total].reset_index(drop=True)
+
+    # The totals row has no project id, which widens the column to float on the way in
+    project_df["PROJECT_ID"] = project_df["PROJECT_ID"].astype("int64")
+
+    # A year without any downloads has no totals row at all
+    if is_program_total.any():
+        program_totals = overview_df[is_program_total].iloc[0]
+    else:
+        program_totals = pd.Series({"ANNUAL_UNIQUE_USERS": 0, "ANNUAL_DOWNLOADS_IN_TIB": 0.0})
+    return project_df, program_totals
+
+
+def slice_year(df, year):
+    """Return the rows of a multi-year (``*_by_year``) result that belong to ``year``."""
+    return df[df["YEAR"] == year].reset_index(drop=True)
+
+
+def year_over_year_delta(df, column, year):
+    """Return the change in the total of ``column`` from the year before ``year`` to ``year``.
+
+    ``df`` is a multi-year result; ``None`` is returned when it has no rows for the previous
+    year, so ``st.metric`` shows no delta instead of a misleading one.
+    """
+    totals_by_year = df.groupby("YEAR")[column].sum()
+    if year - 1 not in totals_by_year.index:
+        return None
+    return totals_by_year.get(year, 0) - totals_by_year[year - 1]
+
+
+class CacheWarmer:
+    """Keeps the query caches warm for every combination of page inputs on a background thread.
+
+    ``build_queries(*combination)`` returns the dict of queries a page runs for one
+    combination of inputs (e.g. a program). Queries shared between combinations are only
+    run once per pass. The first pass fills the caches (reusing valid results on disk), and
+    later passes refresh every query before the shortest of their TTLs runs out.
+    """
+
+    def __init__(self, build_queries, combinations, max_workers=MAX_CONCURRENT_QUERIES):
+        self.build_queries = build_queries
+        self.combinations = combinations
+        self.max_workers = max_workers
+        self.total = 0
+        self.completed = 0
+        self.failed = 0
+        self.last_refresh = None
+        self._ctx = get_script_run_ctx()
+        self._thread = threading.Thread(target=self._run, name="cache-warmer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def progress(self):
+        """Return how far the current pass has got and when the last one finished."""
+        return {
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "last_refresh": self.last_refresh,
+        }
+
+    def warm(self, refresh=False):
+        """Run one pass over every combination; return the shortest TTL among its queries."""
+        queries = {}
+        for combination in self.combinations:
+            for query in self.build_queries(*combination).values():
+                queries[query_cache_key(query)] = query
+
+        self.total, self.completed, self.failed = len(queries), 0, 0
+        fetch = refresh_data_from_snowflake if refresh else get_data_from_snowflake
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, initializer=self._attach_context
+        ) as executor:
+            futures = {executor.submit(fetch, query): query for query in queries.values()}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception:
+                    self.failed += 1
+                    logger.exception("Cache warm-up failed for %s", futures[future].family)
+                self.completed += 1
+
+        self.last_refresh = time.time()
+        return min((query_ttl(query) for query in queries.values()), default=QUERY_CACHE_TTL)
+
+    def _attach_context(self):
+        add_script_run_ctx(threading.current_thread(), self._ctx)
+
+    def _run(self):
+        self._attach_context()
+        refresh = False
+        while True:
+            try:
+                shortest_ttl = self.warm(refresh=refresh)
+            except Exception:
+                logger.exception("Cache warm-up pass failed")
+                shortest_ttl = QUERY_CACHE_TTL
+            refresh = True
+            time.sleep(shortest_ttl * CACHE_REWARM_FRACTION)
+
+
+@st.cache_resource
+def start_cache_warmer(_build_queries, combinations):
+    """Start one ``CacheWarmer`` per process over ``combinations`` of page inputs."""
+    return CacheWarmer(_build_queries, combinations).start()
@@ -0,0 +1,347 @@
+import functools
+import hashlib
+import random
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+
+# Number of built figures kept (as JSON) by ``cached_figure``, least recently used first out
+FIGURE_CACHE_MAX_ENTRIES = 64
+
+
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+
+
+def _fingerprint(value):
+    """Return a cheap content hash of a plot argument (frames are hashed row by row)."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest = hashlib.sha1(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        shape = (tuple(value.columns), tuple(map(str, value.dtypes))) if isinstance(value, pd.DataFrame) else value.name
+        digest.update(repr(shape).encode())
+        return digest.hexdigest()
+    return repr(value)
+
+
+def cached_figure(plot):
+    """Memoize a figure builder on the content of its arguments.
+
+    Figures are stored as JSON and a fresh ``go.Figure`` is returned on every call, so the
+    caller can update it without touching the cached copy. Builders must not modify their
+    input frames.
+    """
+
+    @functools.wraps(plot)
+    def wrapper(*args, **kwargs):
+        key = (
+            plot.__name__,
+            tuple(_fingerprint(arg) for arg in args),
+            tuple(sorted((name, _fingerprint(arg)) for name, arg in kwargs.items())),
+        )
+        with _figure_cache_lock:
+            figure_json = _figure_cache.get(key)
+            if figure_json is not None:
+                _figure_cache.move_to_end(key)
+        if figure_json is None:
+            figure_json = plot(*args, **kwargs).to_json()
+            with _figure_cache_lock:
+                _figure_cache[key] = figure_json
+                while len(_figure_cache) > FIGURE_CACHE_MAX_ENTRIES:
+                    _figure_cache.popitem(last=False)
+        return pio.from_json(figure_json)
+
+    return wrapper
+
+
+# Above this many points the trend lines are drawn with WebGL (``go.Scattergl``)
+WEBGL_POINT_THRESHOLD = 1000
+
+
+@cached_figure
+def plot_unique_users_trend(unique_users_data, width=2000, height=400, top_n=10, approximate=False):
+    """Plot the monthly unique users of the ``top_n`` projects with the most, plus the monthly median.
+
+    The months are converted once and the top projects are split out in a single groupby,
+    so the cost grows with the number of rows rather than with rows times projects. Results
+    of ``query_monthly_download_trends(..., top_n=...)`` are already ranked in the warehouse
+    and carry the median as ``IS_MEDIAN`` rows, which are used as they are. ``approximate``
+    labels the counts as estimates.
+    """
+    # Convert the months once and sort them so each project's line is drawn in order
+    trends_df = unique_users_data.assign(
+        ACCESS_MONTH=pd.to_datetime(unique_users_data["ACCESS_MONTH"]),
+        DISTINCT_USER_COUNT=unique_users_data["DISTINCT_USER_COUNT"].astype("float64"),
+    ).sort_values("ACCESS_MONTH", kind="stable")
+
+    if "IS_MEDIAN" in trends_df.columns:
+        is_median = trends_df["IS_MEDIAN"].astype(bool)
+        median_monthly_counts = trends_df[is_median].set_index("ACCESS_MONTH")["DISTINCT_USER_COUNT"]
+        trends_df = trends_df[~is_median].astype({"PROJECT_ID": "int64"})
+    else:
+        # Calculate the median DISTINCT_USER_COUNT for each month
+        median_monthly_counts = trends_df.groupby("ACCESS_MONTH")["DISTINCT_USER_COUNT"].median()
+
+    # The top projects by their total DISTINCT_USER_COUNT, largest first
+    top_projects = trends_df.groupby("PROJECT_ID")["DISTINCT_USER_COUNT"].sum().nlargest(top_n).index
+    top_projects_df = trends_df[trends_df["PROJECT_ID"].isin(top_projects)]
+    projects = dict(iter(top_projects_df.groupby("PROJECT_ID", sort=False)))
+
+    # Large programs are drawn with WebGL so the chart stays interactive
+    n_points = len(top_projects_df) + len(median_monthly_counts)
+    scatter = go.Scattergl if n_points > WEBGL_POINT_THRESHOLD else go.Scatter
+
+    fig = go.Figure()
+    for project in top_projects:
+        project_df = projects[project]
+        project_name = str(project_df["NAME"].iloc[0])  # Assuming NAME is the same for each project
+
+        # Scatter plot for the current project
+        fig.add_trace(
+            scatter(
+                x=project_df["ACCESS_MONTH"],
+                y=project_df["DISTINCT_USER_COUNT"],
+                mode="lines+markers",
+                name=project,
+                line=dict(width=2),
+                opacity=0.6,
+                hoverinfo="x+y+name",
+                hovertemplate="<b>Project Name</b>: " + project_name + "<br>"
+                + "<b>Project ID</b>: " + str(project) + "<br>"
+                + "<b>Date</b>: %{x}<br>"
+                + "<b>Unique User Downloads</b>: %{y}<extra></extra>",
+                showlegend=True,
+                visible=True,
+            )
+        )
+
+    fig.add_trace(
+        scatter(
+            x=median_monthly_counts.index,
+            y=median_monthly_counts.to_numpy(),
+            mode="lines+markers",
+            name="Median",
+            line=dict(color="black", width=4),
+            hoverinfo="x+y+name",
+            hovertemplate="<b>Date</b>: %{x}<br><b>Users</b>: %{y}<extra></extra>",
+            visible=True,
+        )
+    )
+    approx = " (approx.)" if approximate else ""
+    fig.update_layout(
+        xaxis_title="Month",
+        yaxis_title=f"Unique User Downloads{approx}",
+        title=f"Top {top_n} Projects by Unique User Downloads{approx}",
+        width=width,
+        height=height,
+    )
+    return fig
+
+
+@cached_figure
+def plot_download_sizes(df, width=2000):
+    # Sort by total downloads for ordered display (``df`` itself is left untouched, it may be cached)
+    df = df.assign(
+        PROJECT_SIZE_IN_GIB=df["TOTAL_PROJECT_SIZE_IN_TIB"],
+        TOTAL_DOWNLOADS_GIB=df["ANNUAL_DOWNLOADS_IN_TIB"],
+    ).sort_values(by="TOTAL_DOWNLOADS_GIB")
+
+    def truncate_name(name, max_length=20):
+        return name if len(name) <= max_length else name[:max_length] + "..."
+
+    # Create the bar chart using Plotly
+    fig = go.Figure(
+        data=[
+            go.Bar(
+                x=df["NAME"].apply(truncate_name),
+                y=df["TOTAL_DOWNLOADS_GIB"],
+                marker=dict(
+                    color=df["PROJECT_SIZE_IN_GIB"],
+                    colorscale="emrld",
+                    colorbar=dict(title="Project Size (TiB)"),
+                ),
+                hovertemplate="<b>Project Name:</b> %{x}<br>"
+                + "<b>Project ID:</b> %{customdata[0]}<br>"
+                + "<b>Usage (Downloads):</b> %{y:.2f} TiB<br>"
+                + "<b>Project Size:</b> %{marker.color:.2f} TiB<extra></extra>",
+                customdata=df[["PROJECT_ID"]],
+            )
+        ]
+    )
+
+    # Update the layout of the plot
+    fig.update_layout(
+        xaxis_title="Project Name",
+        yaxis_title="Usage (Downloads in TiB)",
+        title="Project Size vs. Download Volumes (in TiB)",
+        width=width,
+    )
+    
+    return fig
+
+
+def plot_popular_entities(popular_entities):
+    popular_entities_df = pd.DataFrame(
+        list(popular_entities.items()), columns=["Entity Type", "Details"]
+    )
+    popular_entities_df["Entity Name"] = popular_entities_df["Details"].apply(
+        lambda x: x[0]
+    )
+    popular_entities_df["Unique Users"] = popular_entities_df["Details"].apply(
+        lambda x: x[1]
+    )
+    popular_entities_df = popular_entities_df.drop(columns=["Details"])
+    return popular_entities_df
+
+
+def plot_entity_distribution(entity_distribution):
+    entity_df = pd.DataFrame(
+        list(entity_distribution.items()), columns=["Entity Type", "Count"]
+    )
+    fig = px.pie(
+        entity_df, names="Entity Type", values="Count", title="Entity Distribution"
+    )
+    fig.update_layout(
+        margin=dict(t=0, b=0, l=0, r=0), title=dict(text="Entity Distribution", x=0.5)
+    )
+    return fig
+
+
+def plot_user_downloads_map(locations, width=10000):
+    locations_df = pd.DataFrame.from_dict(locations, orient="index")
+    locations_df.reset_index(inplace=True)
+    locations_df.columns = ["Region", "Latitude", "Longitude", "Most Popular Project"]
+    fig = px.scatter_geo(
+        locations_df,
+        lat="Latitude",
+        lon="Longitude",
+        text="Region",
+        hover_name="Region",
+        hover_data={
+            "Latitude": False,
+            "Longitude": False,
+            "Most Popular Project": True,
+        },
+        size_max=10,
+        color=locations_df["Most Popular Project"],
+        color_continuous_scale=px.colors.sequential.Plasma,
+    )
+    fig.update_geos(
+        showland=True,
+        landcolor="rgb(217, 217, 217)",
+        showocean=True,
+        oceancolor="LightBlue",
+        showcountries=True,
+        countrycolor="Black",
+        showcoastlines=True,
+        coastlinecolor="Black",
+    )
+    fig.update_layout(
+        title="User Downloads by Region",
+        geo=dict(
+            scope="world", projection=go.layout.geo.Projection(type="natural earth")
+        ),
+        width=width,
+        margin={"r": 0, "t": 0, "l": 0, "b": 0},
+    )
+    return fig
+
+@cached_figure
+def plot_citation_stats():
+
+    data = {
+    "Year": ["2022", "2023", "2024"],
+    "Citations": [300, 360, 420]  # Adjusted citation numbers
+    }
+
+    # Create a DataFrame
+    df = pd.DataFrame(data)
+
+    # Convert Year column to string to avoid commas in axis labels
+    df['Year'] = df['Year'].astype(str)
+
+    # Plot the bar chart using Plotly
+    fig = px.bar(df, x="Year", y="Citations", 
+                labels={"Citations": "Number of Citations", "Year": "Year"},
+                title=" ",
+                color_discrete_sequence=["#0f5a5e"])
+
+    # Update x-axis to remove commas
+    fig.update_xaxes(tickformat='d')
+
+    # Customize the chart (optional)
+    fig.update_layout(
+        xaxis_title="Year",
+        yaxis_title="Number of Citations",
+        title_x=0.5  # Center the title
+    )
+
+
+    return fig
+
+@cached_figure
+def plot_human_records():
+    # Create a dummy dataset
+    data = {
+        'Year': [2022, 2023, 2024],
+        'Number of Records': [500, 750, 900]
+    }
+
+    df = pd.DataFrame(data)
+
+    # Convert Year column to string to avoid commas in axis labels
+    df['Year'] = df['Year'].astype(str)
+
+    # Create a bar chart
+    fig = px.bar(df,
+                 x="Year",
+                 y="Number of Records",
+                 title=" ",
+                 color_discrete_sequence=["#0f5a5e"])
+    
+    # Update x-axis to remove commas
+    fig.update_xaxes(tickformat='d')
+
+    return fig
+
+@cached_figure
+def plot_map():
+    # Dummy data: Replace with your actual download data
+    # Load a list of all countries using Plotly's built-in data
+    country_list = px.data.gapminder()['country'].unique()
+
+    # Generate random download numbers for each country
+    data = {
+        'Country': country_list,
+        'Downloads': [random.randint(100, 5000) for _ in country_list]
+    }
+
+    df = pd.DataFrame(data)
+
+    # Create a world map using Plotly
+    fig = px.choropleth(
+        df,
+        locations="Country",
+        locationmode="country names",
+        color="Downloads",
+        hover_name="Country",
+        color_continuous_scale="emrld",
+        title=" "
+    )
+    # Update layout to reduce the space between title and chart
+    fig.update_layout(
+        title_x=0.5,
+        title_y=1.,  # Bring the title closer to the chart
+        margin={"r":0,"t":100,"l":0,"b":0},  # Adjust margins to tighten layout
+        coloraxis_colorbar={
+            'title': 'Downloads',
+            'lenmode': 'fraction',
+            'len': 1.,  # Make the color bar 80% of the map's height
+        }
+    )
+
+    return fig
+
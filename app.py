@@ -1,38 +1,214 @@
-import os
+import time
+
+# Measured from here, so the startup report covers the imports below
+script_start = time.perf_counter()
 
-import pandas as pd
-import plotly.express as px
+import logging
+import os
+from datetime import date, timedelta
 
-import numpy as np
 import streamlit as st
+
+from toolkit.annotations import DEFAULT_ANNOTATION_KEY, annotation_keys, top_annotations
+from toolkit.costs import (
+    DEFAULT_STORAGE_TIER,
+    STORAGE_PRICE_TIERS,
+    monthly_storage_cost,
+    storage_cost_by_project,
+)
+from toolkit.monitoring import (
+    dataframe_size,
+    get_query_profiles,
+    record_startup,
+    render_backend_panel,
+    render_cache_panel,
+    render_query_profile_panel,
+    render_trace_panel,
+    start_run_trace,
+    trace_phase,
+    traced_fragment,
+)
 from toolkit.queries import (
-    query_annual_project_downloads,
-    query_annual_unique_users,
-    query_annual_downloads,
-    query_annual_cost,
-    query_monthly_download_trends,
-    query_top_annotations,
-    query_entity_distribution,
     dummy_get_download_access,
+    query_annotation_index,
+    query_annual_overview_by_year,
+    query_downloaded_files_by_year,
+    query_entity_distribution,
+    query_file_downloaders_by_year,
+    query_monthly_download_trends_by_year,
+    query_programs_monthly_download_trends_by_year,
+    query_programs_overview_by_year,
+    query_storage_volume,
 )
-from toolkit.utils import get_data_from_snowflake
-from toolkit.widgets import (
-    plot_download_sizes,
-    plot_unique_users_trend,
-    plot_citation_stats,
-    plot_human_records,
-    plot_map
+from toolkit.utils import (
+    APPROXIMATE_DISTINCT_COUNTS,
+    WAREHOUSE_BACKEND,
+    annual_downloads_in_tib,
+    collect_query_profiles,
+    get_backend,
+    get_batch_data_from_snowflake,
+    get_combined_data_from_snowflake,
+    get_program_project_ids,
+    get_program_project_pairs,
+    get_query_cache,
+    get_result_cache,
+    get_user_sketch_store,
+    incremental_queries,
+    prewarm_backend,
+    slice_year,
+    split_by_program,
+    split_program_totals,
+    start_cache_warmer,
+    year_over_year_delta,
+    yearly_queries,
+    years_settled,
 )
 
 # Configure the layout of the Streamlit app page
-st.set_page_config(layout="wide",
-                   page_title="Program Analytics",
-                   page_icon=":bar_chart:",
-                   initial_sidebar_state="expanded")
+st.set_page_config(
+    layout="wide",
+    page_title="Program Analytics",
+    page_icon=":bar_chart:",
+    initial_sidebar_state="expanded",
+)
+
+# Log the toolkit's structured events (see ``toolkit/monitoring.py``); the format only applies
+# if the host hasn't configured logging already
+logging.basicConfig(format="%(message)s")
+logging.getLogger("toolkit").setLevel(logging.INFO)
+
+# Trace where the time in this run goes (shown in the sidebar when the debug panel is on)
+run_trace = start_run_trace()
+record_startup("imports", time.perf_counter() - script_start)
+
+# Connect to the warehouse in the background while the sidebar and README render
+prewarm_backend()
+
+# Choices for how many projects the unique-users chart shows; the warehouse returns the largest
+TOP_PROJECTS_OPTIONS = [5, 10, 25, 50, 100]
+
+
+def build_page_queries(program_id, years, approximate=False):
+    """Return the queries the dashboard runs for a program, keyed by the data they feed.
+
+    With ``approximate``, unique-user counts are estimated (see ``count_distinct``). Once
+    every year in ``years`` is settled, the results over them can't change and are cached
+    for good; while a year is in progress, the queries over it are left out and fetched
+    in parts instead (see ``build_incremental_queries``).
+    """
+    project_ids = get_program_project_ids(program_id)
+    queries = {
+        "annual_overview": query_annual_overview_by_year(
+            years, project_ids, approximate=approximate
+        ),
+        # Doesn't depend on ``years``; the storage cost is computed from it locally
+        "storage_volume": query_storage_volume(project_ids),
+        "unique_users": query_monthly_download_trends_by_year(
+            years, project_ids, top_n=max(TOP_PROJECTS_OPTIONS), approximate=approximate
+        ),
+        # Rankings for any annotation key are computed locally from these two
+        "annotation_index": query_annotation_index(project_ids),
+        "file_downloaders": query_file_downloaders_by_year(years, project_ids),
+    }
+    if not years_settled(years):
+        for name in ("annual_overview", "unique_users", "file_downloaders"):
+            del queries[name]
+        return queries
+
+    for name in ("annual_overview", "unique_users", "file_downloaders"):
+        queries[name] = queries[name]._replace(ttl=0)
+    return queries
+
+
+def build_incremental_queries(program_id, years, approximate=False):
+    """Return the queries of the page data that changes while a year is in progress, in parts.
+
+    The download trends and downloaded files are split by month, so only the open month of
+    the year in progress is re-queried (see ``incremental_queries``). The distinct counts of
+    the overview and file downloaders can't be combined within a year, so they are split by
+    year: the closed years are cached for good and only the year in progress is re-aggregated
+    (see ``yearly_queries``).
+    """
+    project_ids = get_program_project_ids(program_id)
+    return {
+        "unique_users": incremental_queries(
+            query_monthly_download_trends_by_year,
+            years,
+            project_ids,
+            approximate=approximate,
+        ),
+        "downloaded_files": incremental_queries(
+            query_downloaded_files_by_year, years, project_ids
+        ),
+        "annual_overview": yearly_queries(
+            query_annual_overview_by_year, years, project_ids, approximate=approximate
+        ),
+        "file_downloaders": yearly_queries(
+            query_file_downloaders_by_year, years, project_ids
+        ),
+    }
+
+
+def build_warm_queries(program_id, years, approximate=False):
+    """Return every query the dashboard runs for a program, including each part of the incremental ones."""
+    queries = build_page_queries(program_id, years, approximate)
+    if not years_settled(years):
+        queries.update(
+            (f"{name}_{i}", query)
+            for name, parts in build_incremental_queries(
+                program_id, years, approximate
+            ).items()
+            for i, query in enumerate(parts)
+        )
+    return queries
+
+
+def get_incremental_page_data(program_id, years, approximate=False):
+    """Return the page data that changes while a year is in progress, fetching its parts in one batch.
+
+    The download trends come without ``top_n``, so their top projects and median are
+    computed locally.
+    """
+    page_data = get_combined_data_from_snowflake(
+        build_incremental_queries(program_id, years, approximate)
+    )
+    page_data["annual_downloads"] = annual_downloads_in_tib(
+        page_data.pop("downloaded_files")
+    )
+    return page_data
+
+
+def build_comparison_queries(program_ids, years, approximate=False):
+    """Return the queries of the comparison page; each covers every program in one scan.
+
+    Returns no queries when none of the programs has a project.
+    """
+    program_projects = get_program_project_pairs(program_ids)
+    if not program_projects:
+        return {}
+    return {
+        "overview": query_programs_overview_by_year(
+            years, program_projects, approximate=approximate
+        ),
+        "unique_users": query_programs_monthly_download_trends_by_year(
+            years, program_projects, approximate=approximate
+        ),
+    }
+
+
+def approx_label(label, approximate):
+    """Mark ``label`` as showing an estimate when approximate counts are on."""
+    return f"{label} (approx.)" if approximate else label
+
+
+@st.cache_data
+def load_stylesheet(path):
+    with open(path) as f:
+        return f.read()
+
 
 # Custom CSS for styling
-with open("style.css") as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+st.markdown(f"<style>{load_stylesheet('style.css')}</style>", unsafe_allow_html=True)
 
 # Setting up the sidebar and interactive user interface
 with st.sidebar:
@@ -42,170 +218,598 @@ with st.sidebar:
     # Display the sage logo
     st.sidebar.image(logo_path, use_column_width=True)
     st.title("Sage Internal Data Catalog")
-    
+
+    view = st.radio(
+        "View", ["Program dashboard", "Program comparison"], horizontal=True
+    )
+
     program_list = ["HTAN", "NF"]
-    selected_program = st.selectbox("Select a program to view metrics for...", program_list)
+    program_ids = {"HTAN": 20446927, "NF": 16858331}
+    selected_program = st.selectbox(
+        "Select a program to view metrics for...",
+        program_list,
+        disabled=view == "Program comparison",
+    )
 
     year_list = [2024, 2023, 2022]
     selected_year = st.selectbox("Select a year to view metrics for...", year_list)
 
+    # Unique users for any range of days within ``year_list``, merged locally from daily sketches
+    custom_range = None
+    # (sketches are built with Snowflake's HLL functions, which the local extracts backend lacks)
+    if st.toggle(
+        "Count unique users over a custom date range",
+        value=False,
+        disabled=WAREHOUSE_BACKEND != "snowflake",
+    ):
+        last_day = date(max(year_list), 12, 31)
+        picked_range = st.date_input(
+            "Date range",
+            value=(last_day - timedelta(days=89), last_day),
+            min_value=date(min(year_list), 1, 1),
+            max_value=last_day,
+        )
+        # The picker holds a single date until the end of the range is picked
+        if len(picked_range) == 2:
+            custom_range = tuple(picked_range)
+
+    # Unique-user counts are estimated with HyperLogLog by default for faster browsing; turn
+    # this off for exact counts
+    approximate = st.toggle(
+        "Approximate unique-user counts",
+        value=APPROXIMATE_DISTINCT_COUNTS,
+        help="Estimates unique users (within about 2%) at a fraction of the query cost. "
+        "Turn off to compute exact counts.",
+    )
+
+    program_id = program_ids[selected_program]
     if selected_program == "HTAN":
-        program_id = 20446927
         program_description = "The Human Tumor Atlas Network ([HTAN](https://humantumoratlas.org/)) is a National Cancer Institute (NCI)-funded Cancer MoonshotSM initiative to construct 3-dimensional atlases of the dynamic cellular, morphological, and molecular features of human cancers as they evolve from precancerous lesions to advanced disease."
     elif selected_program == "NF":
-        program_id = 16858331
         program_description = "The [NF Data Portal](https://nf.synapse.org/) was created to help openly explore and share NF datasets, analysis tools, resources, and publications related to neurofibromatosis and schwannomatosis. Anyone can join the NF Open Science Initiative (NF-OSI) to contribute!"
 
     st.write("For questions or comments, please contact jenny.medina@sagebase.org.")
 
-def main(selected_year, program_id, program_description):
-
-    expander_1, expander_2 = st.columns(2)
-    with expander_1:
-        with st.expander("**README** :book:"):
-            st.write("""
-            - This Streamlit app serves as a dashboard to provide insight on the overall impact and reach of Synapse-hosted data for a given DCC. It displays metrics showing data usage, governance statistics, number of citations, and number of human records
-        supporting the data over the course of a given year, allowing you to compare between years and explore the DCC's evolution on Synapse.
-        - Several of the widgets in this app were created with dummy data for the sake of demonstration. These widgets are:
-            - The download access dataframe in the **Data Usage & Governance** section
-            - The **Data Reach** section
-            - The **Data Impact** section
-            - The **About the Data** section
-            - The overview cards corresponding to the last two sections
-
-
-            The rest was pulled in from Snowflake and represents real-time data for the given DCC.
-        - This application is designed to be interactive to help with analysis. Here are some ways you can interact with the widgets:
-            - Use the dropdown menus on the sidebar to select a program and year.
-            - Hover over the charts to see tooltips and more information about the project.
-            - Click on the legend to filter the line chart.
-            - Click the columns in the dataframes to sort the rows according to your preference.
-            - Drag the edges of the columns in the dataframes to adjust their width.
-            """)
-    with expander_2:
-        with st.expander("**About The Program**"):
-            st.markdown(program_description)
-
-    # with center_col:
-    # --------------- Row 1: Overview Cards -------------------------
-
+    # Warm the query caches for every program in the background (each page covers all years),
+    # in the default counting mode
+    cache_warmer = start_cache_warmer(
+        build_warm_queries,
+        tuple(
+            (program_ids[program], tuple(year_list), APPROXIMATE_DISTINCT_COUNTS)
+            for program in program_list
+        ),
+    )
+    warmup = cache_warmer.progress()
+    if warmup["last_refresh"] is None:
+        st.progress(
+            warmup["completed"] / max(warmup["total"], 1),
+            text=f"Warming up caches ({warmup['completed']}/{warmup['total']} queries)...",
+        )
+    else:
+        st.caption(
+            f"Caches last refreshed at {time.strftime('%Y-%m-%d %H:%M', time.localtime(warmup['last_refresh']))}"
+            + (f" ({warmup['failed']} queries failed)" if warmup["failed"] else "")
+        )
+
+    show_trace_panel = st.toggle("Show performance debug panel", value=False)
+
+record_startup("first paint", time.perf_counter() - script_start)
+
+
+def overview_section(page_data, selected_year, approximate=False):
+    """The overview cards for the selected year, with the change since the year before."""
     st.markdown("## Overview")
 
-    # Data retrieval:
-    annual_project_downloads_df = get_data_from_snowflake(query_annual_project_downloads(selected_year, program_id))
-    annual_unique_users_df = get_data_from_snowflake(query_annual_unique_users(selected_year, program_id))
-    annual_downloads_df = get_data_from_snowflake(query_annual_downloads(selected_year, program_id))
-    annual_cost_df = get_data_from_snowflake(query_annual_cost(program_id))
-
-    # Data transformation:
-    total_data_size = round(sum(annual_project_downloads_df['TOTAL_PROJECT_SIZE_IN_TIB']), 2)
+    # Data transformation (the selected year is sliced locally, the year before it gives the deltas):
+    with trace_phase("Overview", "transformation") as phase:
+        overview_df = page_data["annual_overview"]
+        is_program_total = overview_df["IS_PROGRAM_TOTAL"].astype(bool)
+        annual_project_downloads_df, annual_totals = split_program_totals(
+            slice_year(overview_df, selected_year)
+        )
+        total_data_size = round(
+            sum(annual_project_downloads_df["TOTAL_PROJECT_SIZE_IN_TIB"]), 2
+        )
+        storage_delta = year_over_year_delta(
+            overview_df[~is_program_total], "TOTAL_PROJECT_SIZE_IN_TIB", selected_year
+        )
+        unique_users_delta = year_over_year_delta(
+            overview_df[is_program_total], "ANNUAL_UNIQUE_USERS", selected_year
+        )
+        if "annual_downloads" in page_data:
+            # Refreshed incrementally while the year is in progress
+            annual_downloads = page_data["annual_downloads"]
+            downloads = annual_downloads.get(selected_year, 0.0)
+            downloads_delta = (
+                downloads - annual_downloads[selected_year - 1]
+                if selected_year - 1 in annual_downloads.index
+                else None
+            )
+        else:
+            downloads = annual_totals["ANNUAL_DOWNLOADS_IN_TIB"]
+            downloads_delta = year_over_year_delta(
+                overview_df[is_program_total], "ANNUAL_DOWNLOADS_IN_TIB", selected_year
+            )
+        phase.update(dataframe_size(overview_df))
 
     # Data visualization:
-    col1, col2, col3, col4, col5 = st.columns([1, 1, 1, 1, 1])
-    col1.metric("Total Storage Occupied", f"{total_data_size} TiB")
-    col2.metric("Annual Unique Users", f"{annual_unique_users_df['ANNUAL_UNIQUE_USERS'][0]}")
-    col3.metric("Annual Downloads", f"{round(annual_downloads_df['ANNUAL_DOWNLOADS_IN_TIB'][0], 2)} TiB")
-    col4.metric("Citations (Dummy)", "1265")
-    col5.metric("Records (Dummy)", "7813")
+    with trace_phase("Overview", "visualization"):
+        col1, col2, col3, col4, col5 = st.columns([1, 1, 1, 1, 1])
+        col1.metric(
+            "Total Storage Occupied",
+            f"{total_data_size} TiB",
+            delta=None if storage_delta is None else f"{storage_delta:+.2f} TiB",
+            help="Size of the projects with downloads in the selected year",
+        )
+        col2.metric(
+            approx_label("Annual Unique Users", approximate),
+            f"{annual_totals['ANNUAL_UNIQUE_USERS']}",
+            delta=(
+                None if unique_users_delta is None else f"{int(unique_users_delta):+d}"
+            ),
+        )
+        col3.metric(
+            "Annual Downloads",
+            f"{round(downloads, 2)} TiB",
+            delta=None if downloads_delta is None else f"{downloads_delta:+.2f} TiB",
+        )
+        col4.metric("Citations (Dummy)", "1265")
+        col5.metric("Records (Dummy)", "7813")
+
+
+@traced_fragment
+def usage_section(page_data, selected_year, approximate=False):
+    """Unique-user trends, top annotations and project sizes; the chart controls rerun only this section."""
+    # Plotly is only loaded once a section draws a chart
+    from toolkit.widgets import plot_download_sizes, plot_unique_users_trend
 
-    # ---------------- Row 3: Unique Users Trends -------------------------
-    
     st.markdown("## Data Usage & Governance")
-    
-    row1_1, row1_2 = st.columns([1.7,1])
+
+    # ---------------- Row 3: Unique Users Trends -------------------------
+
+    row1_1, row1_2 = st.columns([1.7, 1])
 
     with row1_1:
-        # Data retrieval:
-        unique_users_df = get_data_from_snowflake(query_monthly_download_trends(selected_year, program_id))
-        
+        top_n = st.select_slider(
+            "Projects to show", options=TOP_PROJECTS_OPTIONS, value=10
+        )
+
+        # Data transformation:
+        with trace_phase("Usage & Governance", "transformation") as phase:
+            unique_users_df = slice_year(page_data["unique_users"], selected_year)
+            phase.update(dataframe_size(unique_users_df))
+
         # Data visualization:
-        st.plotly_chart(plot_unique_users_trend(unique_users_df))
+        with trace_phase("Usage & Governance", "visualization"):
+            st.plotly_chart(
+                plot_unique_users_trend(
+                    unique_users_df, top_n=top_n, approximate=approximate
+                )
+            )
     with row1_2:
-        # Data retrieval:
-        top_annotations_df = get_data_from_snowflake(query_top_annotations(selected_year, program_id))
+        keys = annotation_keys(page_data["annotation_index"])
+        annotation_key = st.selectbox(
+            "Annotation",
+            keys,
+            index=(
+                keys.index(DEFAULT_ANNOTATION_KEY)
+                if DEFAULT_ANNOTATION_KEY in keys
+                else 0
+            ),
+        )
+
+        # Data transformation (the cached annotation index is joined with the year's downloads locally):
+        with trace_phase("Usage & Governance", "transformation") as phase:
+            top_annotations_df = top_annotations(
+                page_data["annotation_index"],
+                slice_year(page_data["file_downloaders"], selected_year),
+                annotation_key,
+            )
+            phase.update(dataframe_size(top_annotations_df))
 
         # Data visualization:
-        st.dataframe(top_annotations_df,
-                 column_order=("COMPONENT_NAME", "OCCURRENCES", "NUMBER_OF_UNIQUE_DOWNLOADS"),
-                 hide_index=True,
-                 width=None,
-                 column_config={
-                    "COMPONENT_NAME": st.column_config.TextColumn(
-                        "Annotation Component",
+        with trace_phase("Usage & Governance", "visualization"):
+            st.dataframe(
+                top_annotations_df,
+                column_order=(
+                    "ANNOTATION_VALUE",
+                    "OCCURRENCES",
+                    "NUMBER_OF_UNIQUE_DOWNLOADS",
+                ),
+                hide_index=True,
+                width=None,
+                column_config={
+                    "ANNOTATION_VALUE": st.column_config.TextColumn(
+                        annotation_key,
                     ),
                     "OCCURRENCES": st.column_config.ProgressColumn(
                         "Occurence",
                         format="%f",
                         min_value=0,
-                        max_value=max(top_annotations_df["OCCURRENCES"]),
-                     ),
+                        max_value=int(
+                            max(top_annotations_df["OCCURRENCES"], default=0)
+                        ),
+                    ),
                     "NUMBER_OF_UNIQUE_DOWNLOADS": st.column_config.ProgressColumn(
                         "Unique Downloads",
                         format="%f",
                         min_value=0,
-                        max_value=max(top_annotations_df["NUMBER_OF_UNIQUE_DOWNLOADS"]),
-                     )}
-                 )
+                        max_value=int(
+                            max(
+                                top_annotations_df["NUMBER_OF_UNIQUE_DOWNLOADS"],
+                                default=0,
+                            )
+                        ),
+                    ),
+                },
+            )
 
     # --------------- Row 2: Project Sizes and Downloads -----------------
 
-    row2_1, row2_2 = st.columns([1.7,1])
+    annual_project_downloads_df, _ = split_program_totals(
+        slice_year(page_data["annual_overview"], selected_year)
+    )
+
+    row2_1, row2_2 = st.columns([1.7, 1])
     with row2_1:
         # Data visualization:
-        st.plotly_chart(plot_download_sizes(annual_project_downloads_df))
+        with trace_phase("Usage & Governance", "visualization"):
+            st.plotly_chart(plot_download_sizes(annual_project_downloads_df))
 
-        
     with row2_2:
         # --------------- Row 2: Entity Distribution -------------------------
-        print(annual_project_downloads_df)
-        download_access_df = dummy_get_download_access(annual_project_downloads_df["PROJECT_ID"], annual_project_downloads_df["NAME"])
-
-        st.dataframe(download_access_df,
-                     hide_index=True,
-                     width=600,
-                     column_config={
-                        "PROJECT_ID": st.column_config.TextColumn(
-                            "Project ID",
-                        ),
-                        "NAME": st.column_config.TextColumn(
-                            "Project Name"
-                        ),
-                        "DOWNLOAD_ACCESS_COUNT": st.column_config.TextColumn(
-                            "Users with Download Access (Dummy)",
-                        ),}
-                     )
-        
-    data_reach_col, data_impact_col, about_the_data_col = st.columns([2, 1, 1])
+        with trace_phase("Usage & Governance", "visualization"):
+            download_access_df = dummy_get_download_access(
+                annual_project_downloads_df["PROJECT_ID"],
+                annual_project_downloads_df["NAME"],
+            )
+
+            st.dataframe(
+                download_access_df,
+                hide_index=True,
+                width=600,
+                column_config={
+                    "PROJECT_ID": st.column_config.TextColumn(
+                        "Project ID",
+                    ),
+                    "NAME": st.column_config.TextColumn("Project Name"),
+                    "DOWNLOAD_ACCESS_COUNT": st.column_config.TextColumn(
+                        "Users with Download Access (Dummy)",
+                    ),
+                },
+            )
+
+
+@traced_fragment
+def storage_cost_section(page_data, selected_year, year_list):
+    """Storage cost by project and over time; changing the tier or prices reruns only this section."""
+    from toolkit.widgets import plot_storage_cost
+
+    st.markdown("## Storage Cost")
+
+    tier_col, *price_cols = st.columns([2, 1, 1])
+    tier = tier_col.selectbox(
+        "Storage tier",
+        list(STORAGE_PRICE_TIERS),
+        index=list(STORAGE_PRICE_TIERS).index(DEFAULT_STORAGE_TIER),
+    )
+    # Keyed by tier, so picking another tier resets the prices to its list prices
+    prices = {
+        provider: column.number_input(
+            f"{provider} (USD per GiB-month)",
+            min_value=0.0,
+            value=price,
+            step=0.001,
+            format="%.4f",
+            key=f"storage-price-{tier}-{provider}",
+        )
+        for column, (provider, price) in zip(
+            price_cols, STORAGE_PRICE_TIERS[tier].items()
+        )
+    }
+
+    # Data transformation (the cost of every month is computed locally from the cached storage volume):
+    with trace_phase("Storage Cost", "transformation") as phase:
+        cost_df = monthly_storage_cost(
+            page_data["storage_volume"], prices, end=f"{max(year_list)}-12"
+        )
+        project_cost_df = storage_cost_by_project(cost_df, selected_year)
+        previous_cost = storage_cost_by_project(cost_df, selected_year - 1)[
+            "COST"
+        ].sum()
+        phase.update(dataframe_size(cost_df))
 
+    # Data visualization:
+    with trace_phase("Storage Cost", "visualization"):
+        annual_cost = project_cost_df["COST"].sum()
+        col1, col2 = st.columns([1, 4])
+        col1.metric(
+            "Annual Cost",
+            f"${annual_cost:,.2f}",
+            delta=f"{annual_cost - previous_cost:+,.2f} USD" if previous_cost else None,
+            delta_color="inverse",
+        )
+        col2.dataframe(
+            project_cost_df,
+            column_order=("NAME", "PROJECT_ID", "SIZE_IN_GIB", "COST"),
+            hide_index=True,
+            column_config={
+                "NAME": st.column_config.TextColumn("Project Name"),
+                "PROJECT_ID": st.column_config.TextColumn("Project ID"),
+                "SIZE_IN_GIB": st.column_config.NumberColumn(
+                    "Stored at Year End (GiB)", format="%.1f"
+                ),
+                "COST": st.column_config.NumberColumn(
+                    f"Cost in {selected_year} (USD)", format="$%.2f"
+                ),
+            },
+        )
+        st.plotly_chart(plot_storage_cost(cost_df))
+
+
+def reach_section():
+    from toolkit.widgets import plot_map
+
+    st.markdown(
+        '<h3 class="section-title">Data Reach (Dummy)</h3>', unsafe_allow_html=True
+    )
+
+    # Plot the dummy data
+    with trace_phase("Reach", "visualization"):
+        st.plotly_chart(plot_map())
+
+
+def impact_section():
+    from toolkit.widgets import plot_citation_stats
+
+    st.markdown(
+        '<h3 class="section-title">Data Impact (Dummy)</h3>', unsafe_allow_html=True
+    )
+
+    # Plot the dummy data
+    with trace_phase("Impact", "visualization"):
+        st.plotly_chart(plot_citation_stats())
+
+
+def about_section():
+    from toolkit.widgets import plot_human_records
+
+    st.markdown(
+        '<h3 class="section-title">About the Data (Dummy)</h3>', unsafe_allow_html=True
+    )
+
+    # Plot the dummy data
+    with trace_phase("About", "visualization"):
+        st.plotly_chart(plot_human_records())
+
+
+def dummy_sections():
+    """The below-the-fold sections with dummy data.
+
+    They run on every full script run, after every section with real data, so the real
+    metrics reach the page first. Their figures come from the figure cache after the first
+    run; nothing here waits for the user to scroll to or open the sections.
+    """
+    data_reach_col, data_impact_col, about_the_data_col = st.columns([2, 1, 1])
     with data_reach_col:
-        st.markdown('<h3 class="section-title">Data Reach (Dummy)</h3>', unsafe_allow_html=True)
-        
-        # Plot the dummy data
-        fig = plot_map()
+        reach_section()
+    with data_impact_col:
+        impact_section()
+    with about_the_data_col:
+        about_section()
+
+
+def custom_range_section(page_data, program_id, year_list, custom_range):
+    """Unique users over a custom date range, estimated from the program's daily user sketches."""
+    start, end = custom_range
+    st.markdown(f"## Unique Users from {start:%b %d, %Y} to {end:%b %d, %Y}")
+
+    # Data retrieval (the sketches cover all of ``year_list`` and are fetched once):
+    with trace_phase("Custom Range", "data retrieval"):
+        sketch_store = get_user_sketch_store(
+            get_program_project_ids(program_id), tuple(year_list)
+        )
+
+    # Data transformation (the sketches of the selected days are merged locally):
+    with trace_phase("Custom Range", "transformation") as phase:
+        unique_users = sketch_store.unique_users(start, end)
+        project_names = (
+            page_data["annual_overview"]
+            .dropna(subset=["PROJECT_ID"])
+            .drop_duplicates("PROJECT_ID")
+        )
+        project_users_df = (
+            sketch_store.unique_users_by_project(start, end)
+            .rename_axis("PROJECT_ID")
+            .reset_index()
+            .merge(
+                project_names[["PROJECT_ID", "NAME"]].astype({"PROJECT_ID": "int64"}),
+                on="PROJECT_ID",
+                how="left",
+            )
+            .sort_values("UNIQUE_USERS", ascending=False)
+        )
+        phase.update(dataframe_size(project_users_df))
 
-        # Display the chart
-        st.plotly_chart(fig)
+    # Data visualization:
+    with trace_phase("Custom Range", "visualization"):
+        col1, col2 = st.columns([1, 4])
+        col1.metric("Unique Users (approx.)", f"{unique_users}")
+        col2.dataframe(
+            project_users_df,
+            column_order=("NAME", "PROJECT_ID", "UNIQUE_USERS"),
+            hide_index=True,
+            column_config={
+                "NAME": st.column_config.TextColumn("Project Name"),
+                "PROJECT_ID": st.column_config.TextColumn("Project ID"),
+                "UNIQUE_USERS": st.column_config.NumberColumn("Unique Users (approx.)"),
+            },
+        )
+
+
+def comparison_page(selected_year, year_list, program_ids, approximate=False):
+    """The overview metrics and download trends of every program side by side."""
+    from toolkit.widgets import plot_program_trends
+
+    st.markdown("## Program Comparison")
+    program_names = {program_id: program for program, program_id in program_ids.items()}
+
+    # Data retrieval (one query per metric covers every program):
+    with trace_phase("Comparison", "data retrieval"):
+        comparison_data = get_batch_data_from_snowflake(
+            build_comparison_queries(
+                tuple(program_ids.values()), tuple(year_list), approximate
+            )
+        )
+    if not comparison_data:
+        st.info("None of the programs has any projects to compare.")
+        return
 
-    with data_impact_col:
-        st.markdown('<h3 class="section-title">Data Impact (Dummy)</h3>', unsafe_allow_html=True)
-        
-        # Plot the dummy data
-        fig = plot_citation_stats()
+    # Data transformation:
+    with trace_phase("Comparison", "transformation") as phase:
+        overview_by_program = split_by_program(comparison_data["overview"])
+        unique_users_df = slice_year(comparison_data["unique_users"], selected_year)
+        phase.update(dataframe_size(comparison_data["overview"]))
 
-        # Display the chart
-        st.plotly_chart(fig)
+    # Data visualization:
+    with trace_phase("Comparison", "visualization"):
+        for column, (program, program_id) in zip(
+            st.columns(len(program_ids)), program_ids.items()
+        ):
+            program_overview_df = overview_by_program.get(
+                program_id, comparison_data["overview"].iloc[0:0]
+            )
+            program_year_df = slice_year(program_overview_df, selected_year)
+            with column:
+                st.markdown(f"### {program}")
+                for label, metric, unit, help in [
+                    (
+                        approx_label("Annual Unique Users", approximate),
+                        "ANNUAL_UNIQUE_USERS",
+                        "",
+                        None,
+                    ),
+                    ("Annual Downloads", "ANNUAL_DOWNLOADS_IN_TIB", " TiB", None),
+                    # Unlike the dashboard's "Total Storage Occupied", this counts every project
+                    (
+                        "Total Program Storage",
+                        "TOTAL_PROGRAM_SIZE_IN_TIB",
+                        " TiB",
+                        "Size of all the program's files created by the end of the year",
+                    ),
+                ]:
+                    value = program_year_df[metric].sum()
+                    delta = year_over_year_delta(
+                        program_overview_df, metric, selected_year
+                    )
+                    if unit:
+                        st.metric(
+                            label,
+                            f"{round(float(value), 2)}{unit}",
+                            delta=None if delta is None else f"{delta:+.2f}{unit}",
+                            help=help,
+                        )
+                    else:
+                        st.metric(
+                            label,
+                            f"{int(value)}",
+                            delta=None if delta is None else f"{int(delta):+d}",
+                            help=help,
+                        )
+
+        st.plotly_chart(
+            plot_program_trends(unique_users_df, program_names, approximate=approximate)
+        )
+
+
+def main(
+    selected_year,
+    year_list,
+    program_id,
+    program_description,
+    approximate=False,
+    custom_range=None,
+):
+
+    expander_1, expander_2 = st.columns(2)
+    with expander_1:
+        with st.expander("**README** :book:"):
+            st.write(
+                """
+            - This Streamlit app serves as a dashboard to provide insight on the overall impact and reach of Synapse-hosted data for a given DCC. It displays metrics showing data usage, governance statistics, number of citations, and number of human records
+        supporting the data over the course of a given year, allowing you to compare between years and explore the DCC's evolution on Synapse.
+        - Several of the widgets in this app were created with dummy data for the sake of demonstration. These widgets are:
+            - The download access dataframe in the **Data Usage & Governance** section
+            - The **Data Reach** section
+            - The **Data Impact** section
+            - The **About the Data** section
+            - The overview cards corresponding to the last two sections
 
-    with about_the_data_col:
-        st.markdown('<h3 class="section-title">About the Data (Dummy)</h3>', unsafe_allow_html=True)
 
-        # Plot the dummy data
-        fig = plot_human_records()
+            The rest was pulled in from Snowflake and represents real-time data for the given DCC.
+        - This application is designed to be interactive to help with analysis. Here are some ways you can interact with the widgets:
+            - Use the dropdown menus on the sidebar to select a program and year.
+            - Switch the sidebar's **View** to **Program comparison** to see every program side by side.
+            - Turn on **Count unique users over a custom date range** in the sidebar to pick any range of days within the listed years.
+            - Hover over the charts to see tooltips and more information about the project.
+            - Click on the legend to filter the line chart.
+            - Click the columns in the dataframes to sort the rows according to your preference.
+            - Drag the edges of the columns in the dataframes to adjust their width.
+            - Use the slider above the line chart to choose how many projects it shows.
+            - Pick an **Annotation** above the annotations table to rank the values of any annotation key.
+            - Pick a storage tier or edit the prices in the **Storage Cost** section to see what the program's storage would cost.
+            - Unique-user counts marked "(approx.)" are estimates; turn off **Approximate unique-user counts** in the sidebar for exact counts.
+            """
+            )
+    with expander_2:
+        with st.expander("**About The Program**"):
+            st.markdown(program_description)
 
-        # Display the chart
-        st.plotly_chart(fig)
-        
+    # Data retrieval (the program scope is resolved once, then every query on the page is submitted at once;
+    # each query covers all of ``year_list`` so switching years doesn't go back to the warehouse; while a year
+    # is in progress the queries over it are fetched in parts, so closed years and months aren't re-queried):
+    with trace_phase("Overview", "data retrieval"):
+        page_data = get_batch_data_from_snowflake(
+            build_page_queries(program_id, tuple(year_list), approximate)
+        )
+        if not years_settled(year_list):
+            page_data.update(
+                get_incremental_page_data(program_id, tuple(year_list), approximate)
+            )
+    record_startup("first data", time.perf_counter() - script_start)
+
+    # Sections with widgets of their own are fragments, so interacting with them reruns only that section
+    overview_section(page_data, selected_year, approximate)
+    if custom_range is not None:
+        custom_range_section(page_data, program_id, year_list, custom_range)
+    usage_section(page_data, selected_year, approximate)
+    storage_cost_section(page_data, selected_year, year_list)
+    dummy_sections()
 
 
 if __name__ == "__main__":
-    main(selected_year, program_id, program_description)
-
+    if view == "Program comparison":
+        comparison_page(selected_year, year_list, program_ids, approximate)
+    else:
+        main(
+            selected_year,
+            year_list,
+            program_id,
+            program_description,
+            approximate,
+            custom_range,
+        )
+
+    # Show the timings of this run once every section has rendered
+    if show_trace_panel:
+        render_trace_panel(run_trace)
+        query_profiles_df = collect_query_profiles()
+        render_query_profile_panel(
+            query_profiles_df,
+            len(get_query_profiles().pending()),
+            get_query_profiles().last_error,
+        )
+        render_backend_panel(get_backend().name, get_backend().stats())
+        render_cache_panel(
+            {"memory": get_query_cache().stats(), "disk": get_result_cache().stats()}
+        )
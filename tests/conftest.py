@@ -0,0 +1,111 @@
+"""Fixtures shared by the test modules."""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Ensure that the base directory is in PYTHONPATH so ``toolkit`` and other tools can be found
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# The program ids of the dashboard's programs, so the app can run against the extracts
+HTAN_PROGRAM_ID = 20446927
+
+
+@pytest.fixture
+def warehouse_extracts(tmp_path):
+    """Tiny Parquet extracts of one program with two projects, in the ``DuckDBBackend`` layout.
+
+    The program is in the extracts twice, as ``100`` and under the dashboard's HTAN id.
+    """
+
+    annotations = '{"annotations": {"Component": {"value": ["%s"]}}}'
+    extracts = {
+        "node_latest": pd.DataFrame(
+            {
+                "id": [100, HTAN_PROGRAM_ID, 1, 2, 11, 12, 21],
+                "project_id": [None, None, 1, 2, 1, 1, 2],
+                "node_type": [
+                    "project",
+                    "project",
+                    "project",
+                    "project",
+                    "file",
+                    "file",
+                    "file",
+                ],
+                "name": [
+                    "Program",
+                    "HTAN",
+                    "Project A",
+                    "Project B",
+                    "a.txt",
+                    "b.txt",
+                    "c.txt",
+                ],
+                "file_handle_id": [None, None, None, None, 11, 12, 21],
+                "scope_ids": ["[1, 2]", "[1, 2]", None, None, None, None, None],
+                "annotations": [
+                    None,
+                    None,
+                    None,
+                    None,
+                    annotations % "Bulk",
+                    annotations % "Bulk",
+                    '{"annotations": {"assay": {"type": "STRING", "value": ["RNA-seq", "WGS"]}}}',
+                ],
+            }
+        ),
+        "filedownload": pd.DataFrame(
+            {
+                "project_id": [1, 1, 1, 2, 1],
+                "file_handle_id": [11, 11, 12, 21, 11],
+                "user_id": [7, 8, 7, 9, 7],
+                "record_date": pd.to_datetime(
+                    [
+                        "2024-01-05",
+                        "2024-02-10",
+                        "2024-02-11",
+                        "2024-03-01",
+                        "2023-06-01",
+                    ]
+                ).date,
+                "timestamp": pd.to_datetime(
+                    [
+                        "2024-01-05",
+                        "2024-02-10",
+                        "2024-02-11",
+                        "2024-03-01",
+                        "2023-06-01",
+                    ]
+                ),
+            }
+        ),
+        "file_latest": pd.DataFrame(
+            {
+                "id": [11, 12, 21],
+                "content_size": [1024**4, 2 * 1024**4, 4 * 1024**4],
+                "concrete_type": ["org.sagebionetworks.repo.model.file.S3FileHandle"]
+                * 3,
+                "created_on": pd.to_datetime(
+                    ["2022-01-01", "2023-01-01", "2024-01-01"]
+                ),
+            }
+        ),
+    }
+    extracts_dir = tmp_path / "extracts"
+    for table, df in extracts.items():
+        os.makedirs(extracts_dir / table)
+        df.to_parquet(extracts_dir / table / "part-0.parquet", index=False)
+    return str(extracts_dir)
+
+
+@pytest.fixture
+def duckdb_backend(warehouse_extracts):
+    """A ``DuckDBBackend`` over ``warehouse_extracts``."""
+
+    pytest.importorskip("duckdb")
+    from toolkit.utils import DuckDBBackend
+
+    return DuckDBBackend(warehouse_extracts)
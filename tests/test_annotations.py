@@ -0,0 +1,50 @@
+"""Unit tests for the local annotation rankings in ``toolkit/annotations.py``."""
+
+import os
+import sys
+
+import pandas as pd
+
+# Ensure that the base directory is in PYTHONPATH so ``toolkit`` and other tools can be found
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from toolkit.annotations import annotation_keys, top_annotations
+
+ANNOTATION_INDEX = pd.DataFrame(
+    {
+        "NODE_ID": [1, 2, 2, 3, 3, 4],
+        "FILE_HANDLE_ID": [11, 12, 12, 13, 13, 14],
+        "ANNOTATION_KEY": pd.Categorical(
+            ["Component", "Component", "assay", "assay", "assay", "Component"]
+        ),
+        "ANNOTATION_VALUE": pd.Categorical(
+            ["Bulk", "Bulk", "WGS", "WGS", "RNA-seq", "Imaging"]
+        ),
+    }
+)
+
+FILE_DOWNLOADERS = pd.DataFrame(
+    {"FILE_HANDLE_ID": [11, 12, 12, 13], "USER_ID": [7, 7, 8, 9]}
+)
+
+
+def test_annotation_keys_rank_the_most_used_keys_first():
+    """Ensure keys are ordered by the number of nodes carrying them."""
+
+    assert annotation_keys(ANNOTATION_INDEX) == ["Component", "assay"]
+
+
+def test_top_annotations_ranks_any_key_from_the_cached_index():
+    """Ensure values are ranked by unique downloaders, counting each user once per value."""
+
+    component = top_annotations(ANNOTATION_INDEX, FILE_DOWNLOADERS, "Component")
+    assay = top_annotations(ANNOTATION_INDEX, FILE_DOWNLOADERS, "assay")
+
+    # ``Imaging`` was never downloaded
+    assert component.astype({"ANNOTATION_VALUE": str}).values.tolist() == [
+        ["Bulk", 2, 2]
+    ]
+    assert assay.astype({"ANNOTATION_VALUE": str}).values.tolist() == [
+        ["WGS", 2, 3],
+        ["RNA-seq", 1, 1],
+    ]
@@ -14,6 +14,7 @@ A few considerations:
 
 import os
 import sys
+import time
 
 import pytest
 from streamlit.testing.v1 import AppTest
@@ -21,15 +22,86 @@ from streamlit.testing.v1 import AppTest
 # Ensure that the base directory is in PYTHONPATH so ``toolkit`` and other tools can be found
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+from toolkit import utils
+
 # The timeout limit to wait for the app to load before shutdown ( in seconds )
 DEFAULT_TIMEOUT = 30
 
 
 @pytest.fixture(scope="module")
 def app():
-    return AppTest.from_file(
-        "app.py", default_timeout=DEFAULT_TIMEOUT
-    ).run()
+    return AppTest.from_file("app.py", default_timeout=DEFAULT_TIMEOUT).run()
+
+
+class IdleCacheWarmer:
+    """Stands in for the background cache warmer, so tests don't leave threads running."""
+
+    def progress(self):
+        return {"total": 0, "completed": 0, "failed": 0, "last_refresh": time.time()}
+
+
+@pytest.fixture
+def duckdb_app(warehouse_extracts, tmp_path, monkeypatch):
+    """The app served by the ``duckdb`` backend from the test extracts, with fresh caches."""
+
+    monkeypatch.setattr(utils, "WAREHOUSE_BACKEND", "duckdb")
+    monkeypatch.setattr(utils, "DUCKDB_EXTRACTS_DIR", warehouse_extracts)
+    monkeypatch.setattr(utils, "RESULT_CACHE_DIR", str(tmp_path / "results"))
+    monkeypatch.setattr(utils, "start_cache_warmer", lambda *args: IdleCacheWarmer())
+    for cached in (
+        utils.get_backend,
+        utils.get_result_cache,
+        utils.get_query_cache,
+        utils.get_program_project_ids,
+    ):
+        cached.clear()
+    yield AppTest.from_file("app.py", default_timeout=DEFAULT_TIMEOUT).run()
+    for cached in (
+        utils.get_backend,
+        utils.get_result_cache,
+        utils.get_query_cache,
+        utils.get_program_project_ids,
+    ):
+        cached.clear()
+
+
+def test_dummy_sections_render_after_the_real_ones(duckdb_app):
+    """Ensure the Reach, Impact and About sections are shown without asking, below the real data."""
+
+    markdown = [element.value for element in duckdb_app.markdown]
+    titles = [
+        "## Overview",
+        "## Data Usage & Governance",
+        "## Storage Cost",
+        ">Data Reach (Dummy)<",
+        ">Data Impact (Dummy)<",
+        ">About the Data (Dummy)<",
+    ]
+    positions = [
+        next(i for i, value in enumerate(markdown) if title in value)
+        for title in titles
+    ]
+
+    assert not duckdb_app.exception
+    assert positions == sorted(positions)
+    # Unique users, download sizes and storage cost, then the three dummy charts
+    assert len(duckdb_app.get("plotly_chart")) == 6
+
+
+def test_year_without_downloads_shows_zero_unique_users(duckdb_app):
+    """Ensure a year without any downloads shows a user count of 0, not a float."""
+
+    duckdb_app.sidebar.selectbox[1].select(2022).run()
+    metrics = {metric.label: metric.value for metric in duckdb_app.metric}
+
+    assert not duckdb_app.exception
+    # Labelled "(approx.)" while approximate counts are on
+    unique_users = next(
+        value
+        for label, value in metrics.items()
+        if label.startswith("Annual Unique Users")
+    )
+    assert unique_users == "0"
 
 
 def test_monthly_overview(app):
@@ -0,0 +1,106 @@
+"""Unit tests for the local storage-cost computation in ``toolkit/costs.py``."""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Ensure that the base directory is in PYTHONPATH so ``toolkit`` and other tools can be found
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from toolkit.costs import (
+    STORAGE_PRICE_TIERS,
+    monthly_storage_cost,
+    storage_cost_by_project,
+)
+
+S3 = "org.sagebionetworks.repo.model.file.S3FileHandle"
+GOOGLE_CLOUD = "org.sagebionetworks.repo.model.file.GoogleCloudFileHandle"
+
+STORAGE_VOLUME = pd.DataFrame(
+    {
+        "PROJECT_ID": [1, 1, 2, 2],
+        "NAME": pd.Categorical(["Project A", "Project A", "Project B", "Project B"]),
+        "CONCRETE_TYPE": pd.Categorical(
+            [
+                S3,
+                GOOGLE_CLOUD,
+                "org.sagebionetworks.repo.model.file.ExternalFileHandle",
+                S3,
+            ]
+        ),
+        "CREATED_MONTH": pd.to_datetime(
+            ["2023-01-01", "2023-07-01", "2024-03-01", "2025-01-01"]
+        ),
+        "NUMBER_OF_FILES": [1, 1, 1, 1],
+        "SIZE_IN_GIB": [100.0, 10.0, 50.0, 1000.0],
+    }
+)
+
+
+def test_storage_accumulates_from_the_month_files_are_created():
+    """Ensure files are charged every month from their creation month, by provider, up to ``end``."""
+
+    cost_df = monthly_storage_cost(
+        STORAGE_VOLUME, {"Amazon S3": 0.02, "Google Cloud": 0.03}, end="2024-12"
+    )
+    project_a = cost_df[cost_df["PROJECT_ID"] == 1].set_index(["PROVIDER", "MONTH"])[
+        "COST"
+    ]
+
+    assert cost_df["MONTH"].max() == pd.Period("2024-12", freq="M")
+    assert project_a[("Amazon S3", pd.Period("2023-01", freq="M"))] == 2.0
+    assert project_a[("Google Cloud", pd.Period("2023-06", freq="M"))] == 0
+    assert project_a[("Google Cloud", pd.Period("2024-06", freq="M"))] == pytest.approx(
+        0.3
+    )
+    # Files created after ``end`` aren't charged, other file handle types are priced as S3
+    assert cost_df.loc[cost_df["PROJECT_ID"] == 2, "SIZE_IN_GIB"].max() == 50
+
+
+def test_storage_cost_by_project_sums_the_year_for_any_price_table():
+    """Ensure switching prices re-prices the same storage volume without refetching it."""
+
+    for tier, prices in STORAGE_PRICE_TIERS.items():
+        by_project = storage_cost_by_project(
+            monthly_storage_cost(STORAGE_VOLUME, prices, end="2024-12"), 2024
+        )
+        costs = dict(zip(by_project["NAME"], by_project["COST"]))
+
+        assert costs["Project A"] == pytest.approx(
+            12 * (100 * prices["Amazon S3"] + 10 * prices["Google Cloud"])
+        ), tier
+        assert costs["Project B"] == pytest.approx(10 * 50 * prices["Amazon S3"]), tier
+        assert dict(zip(by_project["NAME"], by_project["SIZE_IN_GIB"])) == {
+            "Project A": 110,
+            "Project B": 50,
+        }
+
+
+def test_storage_cost_by_project_keeps_projects_without_a_name():
+    """Ensure a project whose name is missing is still charged and counted in the total."""
+
+    storage_volume = STORAGE_VOLUME.assign(
+        NAME=pd.Categorical(["Project A", "Project A", None, None])
+    )
+    by_project = storage_cost_by_project(
+        monthly_storage_cost(storage_volume, {"Amazon S3": 0.02}, end="2024-12"), 2024
+    )
+
+    assert by_project["PROJECT_ID"].tolist() == [1, 2]
+    assert by_project["NAME"].isna().tolist() == [False, True]
+    assert by_project["COST"].sum() == pytest.approx(12 * 100 * 0.02 + 10 * 50 * 0.02)
+
+
+def test_storage_cost_of_a_program_without_files_is_empty():
+    """Ensure an empty storage volume gives typed empty results instead of failing."""
+
+    cost_df = monthly_storage_cost(
+        STORAGE_VOLUME.iloc[0:0], {"Amazon S3": 0.02}, end="2024-12"
+    )
+    by_project = storage_cost_by_project(cost_df, 2024)
+
+    assert cost_df.empty and cost_df["MONTH"].dtype == "period[M]"
+    assert by_project.empty
+    assert by_project["COST"].sum() == 0
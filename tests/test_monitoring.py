@@ -0,0 +1,150 @@
+"""Unit tests for the tracing and query profiling in ``toolkit/monitoring.py``."""
+
+import json
+import logging
+import os
+import sys
+from types import SimpleNamespace
+
+import pandas as pd
+
+# Ensure that the base directory is in PYTHONPATH so ``toolkit`` and other tools can be found
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from toolkit import monitoring
+from toolkit.monitoring import (
+    QueryProfileStore,
+    record_cache_event,
+    start_fragment_trace,
+    start_run_trace,
+    trace_phase,
+)
+from toolkit.queries import Query
+
+
+def test_trace_phase_records_into_the_current_trace():
+    """Ensure phases are timed into the run's trace along with any attached fields."""
+
+    trace = start_run_trace()
+    with trace_phase("Overview", "transformation") as record:
+        record["rows"] = 3
+
+    assert trace.phases == [
+        {
+            "section": "Overview",
+            "phase": "transformation",
+            "rows": 3,
+            "seconds": trace.phases[0]["seconds"],
+        }
+    ]
+
+
+def test_cache_events_are_recorded_into_the_trace_and_logged(caplog):
+    """Ensure cache events land in the run's trace and reach the host's logging as JSON lines."""
+
+    trace = start_run_trace()
+    with caplog.at_level(logging.INFO, logger="toolkit"):
+        record_cache_event(
+            Query("SELECT 1", family="query_storage_volume"),
+            "disk",
+            0.5,
+            pd.DataFrame({"A": [1]}),
+        )
+
+    assert trace.cache_events == [
+        {
+            "family": "query_storage_volume",
+            "source": "disk",
+            "hit": True,
+            "seconds": 0.5,
+            "rows": 1,
+            "bytes": trace.cache_events[0]["bytes"],
+        }
+    ]
+    event = json.loads(caplog.records[-1].getMessage())
+    assert (event["event"], event["run_id"], event["family"]) == (
+        "query",
+        trace.run_id,
+        "query_storage_volume",
+    )
+
+
+def test_fragment_reruns_record_into_a_trace_of_their_own(monkeypatch):
+    """Ensure a fragment-only rerun starts a new trace tagged with the fragment, and full runs keep theirs."""
+
+    run_trace = start_run_trace()
+    ctx = SimpleNamespace(fragment_ids_this_run=None)
+    monkeypatch.setattr(
+        monitoring, "get_script_run_ctx", lambda suppress_warning=False: ctx
+    )
+
+    assert start_fragment_trace("usage_section") is run_trace
+
+    ctx.fragment_ids_this_run = {"fragment-id"}
+    fragment_trace = start_fragment_trace("usage_section")
+    with trace_phase("Usage & Governance", "visualization"):
+        pass
+
+    assert (
+        fragment_trace is not run_trace and fragment_trace.fragment == "usage_section"
+    )
+    assert len(fragment_trace.phases) == 1 and run_trace.phases == []
+
+
+def _profile(query_id, elapsed_ms, scanned, total):
+    return {
+        "QUERY_ID": query_id,
+        "TOTAL_ELAPSED_TIME": elapsed_ms,
+        "COMPILATION_TIME": 100,
+        "EXECUTION_TIME": elapsed_ms - 100,
+        "QUEUED_TIME": 0,
+        "BYTES_SCANNED": 1024**3,
+        "PARTITIONS_SCANNED": scanned,
+        "PARTITIONS_TOTAL": total,
+    }
+
+
+def test_query_profile_store_summarises_per_family():
+    """Ensure looked-up statistics are attached to their family and summarised slowest first."""
+
+    store = QueryProfileStore(window=2)
+    store.add_pending("query_annual_overview_by_year", "a")
+    store.add_pending("query_annual_overview_by_year", "b")
+    store.add_pending("query_annual_overview_by_year", "c")
+    store.add_pending("query_storage_volume", "d")
+    store.add_profiles(
+        pd.DataFrame(
+            [
+                _profile("a", 9000, 10, 10),
+                _profile("b", 2000, 1, 10),
+                _profile("c", 4000, 3, 10),
+                _profile("d", 500, 5, 10),
+                _profile("unknown", 1, 1, 1),
+            ]
+        )
+    )
+
+    summary_df = store.summary()
+
+    assert store.pending() == ()
+    assert summary_df["FAMILY"].tolist() == [
+        "query_annual_overview_by_year",
+        "query_storage_volume",
+    ]
+    # Only the last two profiles of a family are kept
+    overview = summary_df.iloc[0]
+    assert overview["QUERIES"] == 2
+    assert overview["MEAN_ELAPSED_S"] == 3.0
+    assert overview["FRACTION_SCANNED"] == 0.2
+
+
+def test_query_profile_lookups_are_claimed_once_per_interval():
+    """Ensure a lookup is only due with queries pending and once per interval across callers."""
+
+    store = QueryProfileStore(lookup_interval=300)
+
+    assert not store.claim_lookup(now=1000)
+    store.add_pending("query_storage_volume", "a")
+    assert store.claim_lookup(now=1000)
+    assert not store.claim_lookup(now=1299)
+    assert store.claim_lookup(now=1300)
@@ -0,0 +1,107 @@
+"""Unit tests for the HyperLogLog sketch merging in ``toolkit/sketches.py``."""
+
+import json
+import os
+import sys
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Ensure that the base directory is in PYTHONPATH so ``toolkit`` and other tools can be found
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from toolkit.sketches import UserSketchStore, sketch_registers
+
+PRECISION = 12
+
+
+def export_sketch(user_ids, dense=False):
+    """Build an ``HLL_EXPORT``-style sketch of ``user_ids`` (hashed with a fixed 64-bit mix)."""
+    registers = np.zeros(2**PRECISION, dtype=np.uint8)
+    for user_id in user_ids:
+        hashed = (user_id * 0x9E3779B97F4A7C15 + 0x632BE59BD9B4E019) % 2**64
+        hashed ^= hashed >> 31
+        hashed = (hashed * 0xBF58476D1CE4E5B9) % 2**64
+        hashed ^= hashed >> 29
+        index = hashed >> (64 - PRECISION)
+        rest = hashed & (2 ** (64 - PRECISION) - 1)
+        rank = (64 - PRECISION) - rest.bit_length() + 1
+        registers[index] = max(registers[index], rank)
+    if dense:
+        return json.dumps(
+            {"version": 4, "precision": PRECISION, "dense": registers.tolist()}
+        )
+    indices = np.flatnonzero(registers)
+    return json.dumps(
+        {
+            "version": 4,
+            "precision": PRECISION,
+            "sparse": {
+                "indices": indices.tolist(),
+                "maxLzCounts": registers[indices].tolist(),
+            },
+        }
+    )
+
+
+def test_sparse_and_dense_exports_hold_the_same_registers():
+    """Ensure both export formats parse into the same non-empty registers."""
+
+    _, sparse_indices, sparse_values = sketch_registers(export_sketch(range(500)))
+    _, dense_indices, dense_values = sketch_registers(
+        export_sketch(range(500), dense=True)
+    )
+
+    assert sparse_indices.tolist() == dense_indices.tolist()
+    assert sparse_values.tolist() == dense_values.tolist()
+
+
+def test_store_merges_overlapping_days_and_projects():
+    """Ensure users seen on several days or in several projects are counted once."""
+
+    store = UserSketchStore(
+        pd.DataFrame(
+            {
+                "PROJECT_ID": [1, 1, 2],
+                "DAY": [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 2)],
+                "USERS_SKETCH": [
+                    export_sketch(range(0, 30000)),
+                    export_sketch(range(20000, 50000), dense=True),
+                    export_sketch(range(45000, 60000)),
+                ],
+            }
+        )
+    )
+
+    def assert_close(estimate, exact):
+        assert abs(estimate - exact) / exact < 0.05
+
+    assert_close(store.unique_users(date(2024, 1, 1), date(2024, 1, 2)), 60000)
+    assert_close(
+        store.unique_users(date(2024, 1, 1), date(2024, 1, 2), project_ids=[1]), 50000
+    )
+    assert_close(store.unique_users(date(2024, 1, 2), date(2024, 1, 2)), 40000)
+    by_project = store.unique_users_by_project(date(2024, 1, 1), date(2024, 1, 2))
+    assert_close(by_project[1], 50000)
+    assert_close(by_project[2], 15000)
+    assert store.unique_users(date(2024, 2, 1), date(2024, 2, 28)) == 0
+
+
+def test_store_counts_small_ranges_with_linear_counting():
+    """Ensure small cardinalities are estimated almost exactly."""
+
+    store = UserSketchStore(
+        pd.DataFrame(
+            {
+                "PROJECT_ID": [1, 2],
+                "DAY": [date(2024, 1, 1), date(2024, 1, 1)],
+                "USERS_SKETCH": [
+                    export_sketch(range(40)),
+                    export_sketch(range(30, 50)),
+                ],
+            }
+        )
+    )
+
+    assert abs(store.unique_users(date(2024, 1, 1), date(2024, 1, 1)) - 50) <= 1
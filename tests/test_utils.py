@@ -0,0 +1,851 @@
+"""Unit tests for the helpers in ``toolkit/utils.py`` that don't need a Snowflake connection."""
+
+import os
+import sys
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+from streamlit.testing.v1 import AppTest
+
+# Ensure that the base directory is in PYTHONPATH so ``toolkit`` and other tools can be found
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from toolkit import utils
+from toolkit.monitoring import QueryProfileStore, start_run_trace
+from toolkit.queries import (
+    RESULT_DTYPES,
+    Query,
+    query_annotation_index,
+    query_annual_overview_by_year,
+    query_downloaded_files_by_year,
+    query_file_downloaders_by_year,
+    query_monthly_download_trends_by_year,
+    query_program_project_ids,
+    query_programs_monthly_download_trends_by_year,
+    query_programs_overview_by_year,
+    query_storage_volume,
+)
+from toolkit.utils import (
+    QUERY_FAMILY_TTLS,
+    MemoryResultCache,
+    ParquetResultCache,
+    SessionPool,
+    SnowflakeBackend,
+    annual_downloads_in_tib,
+    arrow_to_pandas,
+    incremental_queries,
+    incremental_ranges,
+    year_over_year_delta,
+    years_settled,
+)
+
+
+def test_result_cache_round_trip_and_counters(tmp_path):
+    """Ensure stored results are returned for equivalent queries and hits/misses are counted."""
+
+    cache = ParquetResultCache(str(tmp_path))
+    df = pd.DataFrame({"PROJECT_ID": [1, 2], "NAME": ["a", "b"]})
+
+    assert cache.get(Query("SELECT ?", (1,))) is None
+    cache.put(Query("SELECT ?", (1,)), df)
+
+    # Formatting-only differences in the SQL map to the same entry
+    pd.testing.assert_frame_equal(cache.get(Query("  SELECT\n ?", (1,))), df)
+    assert cache.get(Query("SELECT ?", (2,))) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_result_cache_expires_entries(tmp_path):
+    """Ensure entries past their TTL are treated as misses."""
+
+    cache = ParquetResultCache(str(tmp_path))
+    cache.put(Query("SELECT 1"), pd.DataFrame({"A": [1]}), ttl=-1)
+
+    assert cache.get(Query("SELECT 1")) is None
+    assert cache.stats()["entries"] == 0
+    # The expired file no longer counts towards the size cap
+    assert cache._bytes == 0
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    """Ensure the least recently used entry is evicted once the size cap is exceeded."""
+
+    df = pd.DataFrame({"A": range(100)})
+    cache = ParquetResultCache(str(tmp_path))
+    cache.put(Query("SELECT 1"), df)
+    entry_size = cache.stats()["bytes"]
+
+    cache.max_bytes = entry_size * 2
+    os.utime(
+        os.path.join(str(tmp_path), f"{cache.key(Query('SELECT 1'))}.parquet"), (0, 0)
+    )
+    cache.put(Query("SELECT 2"), df)
+    cache.get(Query("SELECT 1"))
+    cache.put(Query("SELECT 3"), df)
+
+    assert cache.get(Query("SELECT 1")) is not None
+    assert cache.get(Query("SELECT 2")) is None
+    assert cache.get(Query("SELECT 3")) is not None
+
+
+def test_result_cache_replicas_write_the_same_entry_concurrently(tmp_path):
+    """Ensure caches sharing a directory can store the same entry at once without clobbering temp files."""
+
+    replicas = [ParquetResultCache(str(tmp_path)) for _ in range(2)]
+    errors = []
+
+    def store(cache, value):
+        try:
+            for _ in range(20):
+                cache.put(Query("SELECT 1"), pd.DataFrame({"A": [value] * 100}))
+                assert cache.get(Query("SELECT 1")) is not None
+        except Exception as error:
+            errors.append(error)
+
+    threads = [
+        threading.Thread(target=store, args=(cache, i))
+        for i, cache in enumerate(replicas * 2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(os.listdir(tmp_path)) == [
+        f"{replicas[0].key(Query('SELECT 1'))}.{ext}" for ext in ("json", "parquet")
+    ]
+
+
+def test_memory_cache_evicts_least_recently_used_over_budget():
+    """Ensure the memory cache stays within its byte budget by evicting the LRU entry."""
+
+    df = pd.DataFrame({"A": range(100)})
+    entry_size = int(df.memory_usage(deep=True).sum())
+    cache = MemoryResultCache(max_bytes=entry_size * 2)
+
+    cache.put(Query("SELECT 1"), df)
+    cache.put(Query("SELECT 2"), df)
+    cache.get(Query("SELECT 1"))
+    cache.put(Query("SELECT 3"), df)
+
+    assert cache.get(Query("SELECT 1")) is not None
+    assert cache.get(Query("SELECT 2")) is None
+    assert cache.get(Query("SELECT 3")) is not None
+    assert cache.stats()["bytes"] == entry_size * 2
+
+
+def test_memory_cache_logs_results_larger_than_its_budget(monkeypatch):
+    """Ensure a result that can't fit the whole budget isn't kept, and the skip is logged and counted."""
+
+    events = []
+    monkeypatch.setattr(
+        utils, "log_event", lambda event, **fields: events.append((event, fields))
+    )
+    cache = MemoryResultCache(max_bytes=10)
+
+    cache.put(
+        Query("SELECT 1", family="query_annotation_index"),
+        pd.DataFrame({"A": range(100)}),
+    )
+
+    assert cache.get(Query("SELECT 1")) is None
+    assert cache.stats()["skipped"] == 1
+    assert [(event, fields["family"]) for event, fields in events] == [
+        ("query_cache_skip", "query_annotation_index")
+    ]
+
+
+def test_memory_cache_expires_entries_by_family_ttl(monkeypatch):
+    """Ensure entries expire according to their query family's TTL."""
+
+    monkeypatch.setitem(QUERY_FAMILY_TTLS, "query_short_lived", -1)
+    cache = MemoryResultCache()
+    cache.put(Query("SELECT 1", family="query_short_lived"), pd.DataFrame({"A": [1]}))
+    cache.put(Query("SELECT 2"), pd.DataFrame({"A": [1]}))
+
+    assert cache.get(Query("SELECT 1", family="query_short_lived")) is None
+    assert cache.get(Query("SELECT 2")) is not None
+    assert cache.stats()["entries"] == 1
+
+
+def test_year_over_year_delta_needs_the_previous_year():
+    """Ensure deltas compare against the previous year and are omitted when it's missing."""
+
+    df = pd.DataFrame({"YEAR": [2022, 2023, 2023, 2024], "USERS": [1, 2, 3, 4]})
+
+    assert year_over_year_delta(df, "USERS", 2024) == -1
+    assert year_over_year_delta(df, "USERS", 2023) == 4
+    assert year_over_year_delta(df, "USERS", 2022) is None
+
+
+def test_split_program_totals_separates_the_totals_row():
+    """Ensure the totals row is split off and projects without downloads keep their row."""
+
+    overview_df = pd.DataFrame(
+        {
+            "IS_PROGRAM_TOTAL": [True, False, False],
+            "PROJECT_ID": [None, 1, 2],
+            "NAME": [None, "Project A", "Project B"],
+            "ANNUAL_UNIQUE_USERS": pd.array([3, 3, pd.NA], dtype="Int32"),
+            "ANNUAL_DOWNLOADS_IN_TIB": [7.0, 7.0, 0.0],
+            "TOTAL_PROJECT_SIZE_IN_TIB": [None, 3.0, 4.0],
+        }
+    )
+
+    project_df, program_totals = utils.split_program_totals(overview_df)
+
+    assert project_df["PROJECT_ID"].tolist() == [1, 2]
+    assert project_df["PROJECT_ID"].dtype == "int64"
+    assert project_df["ANNUAL_DOWNLOADS_IN_TIB"].tolist() == [7.0, 0.0]
+    assert program_totals["ANNUAL_UNIQUE_USERS"] == 3
+    assert program_totals["ANNUAL_DOWNLOADS_IN_TIB"] == 7.0
+
+    # A year without downloads has no totals row, and its user count still renders as an int
+    _, program_totals = utils.split_program_totals(
+        overview_df[~overview_df["IS_PROGRAM_TOTAL"]]
+    )
+    assert f"{program_totals['ANNUAL_UNIQUE_USERS']}" == "0"
+
+
+def test_cache_warmer_runs_shared_queries_once(monkeypatch):
+    """Ensure one warm-up pass fetches each distinct query once and records its progress."""
+
+    fetched = []
+    monkeypatch.setattr(utils, "get_data_from_snowflake", fetched.append)
+
+    def build_queries(program_id, years):
+        return {
+            "shared": Query("SELECT 1"),
+            "per_program": Query("SELECT ?", (program_id,)),
+        }
+
+    warmer = utils.CacheWarmer(build_queries, [(1, (2024,)), (2, (2024,))])
+    warmer.warm()
+
+    assert len(fetched) == 3
+    assert warmer.progress()["completed"] == 3
+    assert warmer.progress()["last_refresh"] is not None
+
+
+@pytest.fixture
+def warehouse(tmp_path, monkeypatch):
+    """Fresh query caches in front of a fake warehouse that records the queries it runs."""
+
+    runs = []
+
+    def fake_run_query(query):
+        runs.append(query)
+        time.sleep(0.05)
+        return pd.DataFrame({"A": [1]})
+
+    query_cache, result_cache = MemoryResultCache(), ParquetResultCache(str(tmp_path))
+    monkeypatch.setattr(utils, "get_query_cache", lambda: query_cache)
+    monkeypatch.setattr(utils, "get_result_cache", lambda: result_cache)
+    monkeypatch.setattr(utils, "run_query", fake_run_query)
+    return runs
+
+
+def test_concurrent_misses_share_one_warehouse_run(warehouse):
+    """Ensure callers missing the cache for the same query at once wait for a single run."""
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(
+                utils.get_data_from_snowflake(Query("SELECT 1"))
+            )
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(warehouse) == 1
+    assert [df["A"].tolist() for df in results] == [[1]] * 4
+
+
+def test_query_cache_events_are_recorded_into_the_run_trace(warehouse):
+    """Ensure each fetch reports where its result came from to the current run's trace."""
+
+    trace = start_run_trace()
+
+    utils.get_data_from_snowflake(Query("SELECT 1", family="query_storage_volume"))
+    utils.get_data_from_snowflake(Query("SELECT 1", family="query_storage_volume"))
+
+    assert [(event["family"], event["source"]) for event in trace.cache_events] == [
+        ("query_storage_volume", "warehouse"),
+        ("query_storage_volume", "memory"),
+    ]
+
+
+def test_batch_returns_one_frame_per_query_in_order_in_one_round_trip(
+    warehouse, monkeypatch
+):
+    """Ensure a batch runs its queries concurrently and returns their frames under their keys, in order."""
+
+    def fake_run_query(query):
+        warehouse.append(query)
+        # The slowest query is submitted first, so results finish out of order
+        time.sleep(0.2 if query.params == (0,) else 0.05)
+        return pd.DataFrame({"A": list(query.params)})
+
+    monkeypatch.setattr(utils, "run_query", fake_run_query)
+    monkeypatch.setattr(utils, "get_backend", lambda: None)
+    queries = {f"query_{i}": Query("SELECT ?", (i,)) for i in range(4)}
+
+    start = time.perf_counter()
+    results = utils.get_batch_data_from_snowflake(queries)
+    elapsed = time.perf_counter() - start
+
+    assert list(results) == list(queries)
+    assert [df["A"].tolist() for df in results.values()] == [[0], [1], [2], [3]]
+    assert len(warehouse) == 4
+    # Roughly the cost of the slowest query rather than the sum of all of them
+    assert elapsed < 0.2 + 0.05 * 2
+
+
+def test_cache_warmer_schedules_each_query_from_its_own_expiry(warehouse, monkeypatch):
+    """Ensure short-lived results are refreshed on their own and long-lived ones aren't re-run with them."""
+
+    monkeypatch.setattr(utils, "QUERY_FAMILY_TTLS", {"short": 100, "long": 1000})
+    queries = {
+        "short": Query("SELECT 1", family="short"),
+        "long": Query("SELECT 2", family="long"),
+    }
+    warmer = utils.CacheWarmer(lambda: queries, [()])
+
+    start = time.time()
+    next_refresh = warmer.warm()
+    due = warmer.due(warmer.queries(), now=start + 100)
+    warmer.warm(due)
+
+    assert start + 80 <= next_refresh < start + 81
+    assert [query.family for query in due.values()] == ["short"]
+    assert sorted(query.family for query in warehouse) == ["long", "short", "short"]
+
+
+def test_arrow_to_pandas_compacts_mapped_columns():
+    """Ensure mapped columns are compacted and unmapped ones keep their Arrow types."""
+
+    table = pa.table(
+        {
+            "NAME": ["a", "b", "a"],
+            "DISTINCT_USER_COUNT": pa.array([1, None, 3], pa.int64()),
+            "TIB": [0.5, 1.5, 2.5],
+            "PROJECT_ID": pa.array([1, 2, 3], pa.int64()),
+        }
+    )
+
+    df = arrow_to_pandas(
+        table, {"NAME": "category", "DISTINCT_USER_COUNT": "Int32", "TIB": "float32"}
+    )
+
+    assert df.dtypes.to_dict() == {
+        "NAME": "category",
+        "DISTINCT_USER_COUNT": pd.Int32Dtype(),
+        "TIB": "float32",
+        "PROJECT_ID": "int64",
+    }
+    assert df["DISTINCT_USER_COUNT"].isna().tolist() == [False, True, False]
+
+
+def test_incremental_ranges_split_the_current_year_at_its_open_month():
+    """Ensure closed years are one range and the current year is split at the open month."""
+
+    assert incremental_ranges([2024, 2023, 2025], today=date(2024, 3, 15)) == [
+        (date(2023, 1, 1), date(2024, 1, 1), True),
+        (date(2024, 1, 1), date(2024, 3, 1), True),
+        (date(2024, 3, 1), date(2025, 1, 1), False),
+    ]
+    # Within the grace period the month before stays open for late downloads
+    assert incremental_ranges([2024], today=date(2024, 3, 1))[-1] == (
+        date(2024, 2, 1),
+        date(2025, 1, 1),
+        False,
+    )
+    assert incremental_ranges([2023], today=date(2024, 1, 1)) == [
+        (date(2023, 1, 1), date(2023, 12, 1), True),
+        (date(2023, 12, 1), date(2024, 1, 1), False),
+    ]
+    assert years_settled([2022, 2023], today=date(2024, 1, 3))
+    assert not years_settled([2022, 2023], today=date(2024, 1, 2))
+
+
+def test_incremental_queries_cache_closed_ranges_for_good_and_reject_top_n():
+    """Ensure only the open range keeps the usual TTL and ``top_n`` isn't merged across ranges."""
+
+    queries = incremental_queries(
+        query_monthly_download_trends_by_year,
+        (2023, 2024),
+        (1, 2),
+        today=date(2024, 3, 15),
+        approximate=True,
+    )
+
+    assert [query.ttl for query in queries] == [0, 0, None]
+    assert all("APPROX_COUNT_DISTINCT" in query.sql for query in queries)
+    with pytest.raises(ValueError):
+        incremental_queries(
+            query_monthly_download_trends_by_year, (2024,), (1, 2), top_n=10
+        )
+
+
+def test_memory_cache_keeps_results_of_queries_cached_for_good():
+    """Ensure a query with a TTL of 0 never expires from the memory cache."""
+
+    cache = MemoryResultCache()
+    cache.put(Query("SELECT 1", ttl=0), pd.DataFrame({"A": [1]}))
+
+    assert cache.expires_at(Query("SELECT 1")) == float("inf")
+
+
+class ExpiredSessionError(Exception):
+    errno = 390114
+
+
+class FakeCursor:
+    def __init__(self, session):
+        self.session = session
+        self.sfqid = None
+
+    def execute(self, sql, params=None):
+        if self.session.expired:
+            raise ExpiredSessionError("Authentication token has expired")
+        self.session.executed.append(sql)
+
+    def fetch_arrow_all(self, force_return_table=False):
+        return pa.table({"N": [len(self.session.executed)]})
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """Stands in for a Snowpark session: ``session.connection.cursor()`` and ``close()``."""
+
+    def __init__(self, expired=False):
+        self.expired = expired
+        self.executed = []
+        self.closed = False
+        self.connection = self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+def test_session_pool_bounds_sessions_and_records_waits():
+    """Ensure no more than ``size`` sessions are opened and blocked checkouts wait for a return."""
+
+    sessions = []
+    pool = SessionPool(lambda: sessions.append(FakeSession()) or sessions[-1], size=1)
+    checked_out = threading.Event()
+    release = threading.Event()
+
+    def hold_session():
+        with pool.checkout():
+            checked_out.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold_session)
+    holder.start()
+    checked_out.wait(5)
+    threading.Timer(0.05, release.set).start()
+    with pool.checkout() as session:
+        assert session is sessions[0]
+    holder.join()
+
+    stats = pool.stats()
+    assert len(sessions) == 1
+    assert stats["checkouts"] == 2 and stats["idle"] == 1
+    assert stats["max_wait_seconds"] > 0
+
+
+def test_session_pool_wakes_waiters_when_a_session_is_discarded():
+    """Ensure a checkout waiting on a full pool gets a fresh session once the busy one is discarded."""
+
+    sessions = []
+    pool = SessionPool(
+        lambda: sessions.append(FakeSession()) or sessions[-1],
+        size=1,
+        checkout_timeout=5,
+    )
+    checked_out = threading.Event()
+    waiter_sessions = []
+
+    def wait_for_session():
+        with pool.checkout() as session:
+            waiter_sessions.append(session)
+
+    def fail_with_expired_session():
+        with pool.checkout():
+            checked_out.set()
+            time.sleep(0.05)
+            raise ExpiredSessionError("Authentication token has expired")
+
+    holder = threading.Thread(
+        target=lambda: pytest.raises(ExpiredSessionError, fail_with_expired_session)
+    )
+    holder.start()
+    checked_out.wait(5)
+    waiter = threading.Thread(target=wait_for_session)
+    waiter.start()
+    holder.join()
+    waiter.join(2)
+
+    assert not waiter.is_alive()
+    assert waiter_sessions == [sessions[1]] and sessions[0].closed
+    assert pool.stats()["open"] == 1
+
+
+def test_session_pool_checkout_times_out():
+    """Ensure a checkout gives up with ``TimeoutError`` when no session frees up in time."""
+
+    pool = SessionPool(FakeSession, size=1, checkout_timeout=0.05)
+
+    with pool.checkout():
+        with pytest.raises(TimeoutError):
+            with pool.checkout():
+                pass
+
+
+def test_snowflake_backend_reconnects_when_the_session_expires():
+    """Ensure an expired session is discarded and the query retried on a fresh one."""
+
+    sessions = [FakeSession(expired=True), FakeSession()]
+    pool = SessionPool(lambda: sessions[pool.stats()["reconnects"]], size=1)
+    backend = SnowflakeBackend(pool)
+
+    table = backend.fetch_arrow(Query("SELECT 1", family="query_storage_volume"))
+
+    assert table.column("N").to_pylist() == [1]
+    assert sessions[0].closed and not sessions[1].closed
+    assert pool.stats()["reconnects"] == 1 and pool.stats()["open"] == 1
+
+
+def test_session_pool_replaces_unhealthy_idle_sessions():
+    """Ensure sessions idle past the health-check interval are pinged and replaced if dead."""
+
+    sessions = [FakeSession(), FakeSession()]
+    pool = SessionPool(lambda: sessions.pop(0), size=1, health_check_interval=0)
+    with pool.checkout() as first:
+        pass
+    first.expired = True
+
+    with pool.checkout() as second:
+        assert second is not first
+    assert first.closed
+
+
+def test_warehouse_backends_must_implement_fetch_arrow():
+    """Ensure a backend without ``fetch_arrow`` fails when it is created, not at query time."""
+
+    class IncompleteBackend(utils.WarehouseBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        IncompleteBackend()
+
+
+def run_on(backend, query):
+    return arrow_to_pandas(backend.fetch_arrow(query), RESULT_DTYPES.get(query.family))
+
+
+def test_duckdb_backend_resolves_program_scope(duckdb_backend):
+    """Ensure LATERAL FLATTEN over ``scope_ids`` is translated for DuckDB."""
+
+    project_ids = run_on(duckdb_backend, query_program_project_ids(100))
+
+    assert project_ids["PROJECT_ID"].tolist() == [1, 2]
+
+
+def test_program_project_ids_resolve_per_program_and_are_cached(
+    duckdb_backend, monkeypatch
+):
+    """Ensure each program resolves to its own scope, and each scope is only queried once."""
+
+    runs = []
+
+    def run_query(query):
+        runs.append(query.params)
+        return run_on(duckdb_backend, query)
+
+    monkeypatch.setattr(utils, "run_query", run_query)
+
+    # ``st.cache_data`` only caches inside a script run
+    def script():
+        import streamlit as st
+
+        from toolkit.utils import get_program_project_ids, get_program_project_pairs
+
+        get_program_project_ids.clear()
+        st.text(repr(get_program_project_ids(100)))
+        st.text(repr(get_program_project_ids(999)))
+        st.text(repr(get_program_project_ids(100)))
+        st.text(repr(get_program_project_pairs((100, 999))))
+
+    app = AppTest.from_function(script).run()
+
+    assert [text.value for text in app.text] == [
+        "(1, 2)",
+        "()",
+        "(1, 2)",
+        "((100, 1), (100, 2))",
+    ]
+    assert runs == [(100,), (999,)]
+
+
+def test_duckdb_backend_runs_the_overview_query(duckdb_backend):
+    """Ensure the GROUPING SETS overview query returns per-project rows and program totals."""
+
+    overview = run_on(
+        duckdb_backend, query_annual_overview_by_year((2023, 2024), (1, 2))
+    )
+    totals = overview[overview["IS_PROGRAM_TOTAL"]].set_index("YEAR")
+    projects = overview[~overview["IS_PROGRAM_TOTAL"] & (overview["YEAR"] == 2024)]
+
+    assert totals.loc[2024, "ANNUAL_UNIQUE_USERS"] == 3
+    assert totals.loc[2024, "ANNUAL_DOWNLOADS_IN_TIB"] == 7
+    assert totals.loc[2023, "ANNUAL_DOWNLOADS_IN_TIB"] == 1
+    assert dict(zip(projects["NAME"], projects["TOTAL_PROJECT_SIZE_IN_TIB"])) == {
+        "Project A": 3,
+        "Project B": 4,
+    }
+
+
+def test_duckdb_backend_runs_the_approximate_overview(duckdb_backend):
+    """Ensure the approximate overview runs and estimates small counts exactly."""
+
+    overview = run_on(
+        duckdb_backend, query_annual_overview_by_year((2024,), (1, 2), approximate=True)
+    )
+
+    assert overview.loc[
+        overview["IS_PROGRAM_TOTAL"], "ANNUAL_UNIQUE_USERS"
+    ].tolist() == [3]
+
+
+def test_duckdb_backend_ranks_the_top_projects_in_sql(duckdb_backend):
+    """Ensure ``top_n`` trends keep only the top projects plus the median over all of them."""
+
+    trends = run_on(
+        duckdb_backend, query_monthly_download_trends_by_year((2024,), (1, 2), top_n=1)
+    )
+    is_median = trends["IS_MEDIAN"].astype(bool)
+
+    assert trends.loc[~is_median, "NAME"].unique().tolist() == ["Project A"]
+    assert trends.loc[~is_median, "DISTINCT_USER_COUNT"].tolist() == [1, 2]
+    assert trends.loc[~is_median, "PROJECT_RANK"].unique().tolist() == [1]
+    assert trends.loc[is_median, "DISTINCT_USER_COUNT"].tolist() == [1, 2, 1]
+
+
+def test_incremental_downloads_merge_ranges_without_double_counting(
+    duckdb_backend, tmp_path, monkeypatch
+):
+    """Ensure closed ranges are cached for good and files are counted once per year."""
+
+    query_cache = MemoryResultCache()
+    monkeypatch.setattr(utils, "get_backend", lambda: duckdb_backend)
+    monkeypatch.setattr(utils, "get_query_cache", lambda: query_cache)
+    monkeypatch.setattr(
+        utils, "get_result_cache", lambda: ParquetResultCache(str(tmp_path))
+    )
+    monkeypatch.setattr(utils, "run_query", lambda query: run_on(duckdb_backend, query))
+
+    files = utils.get_incremental_data_from_snowflake(
+        query_downloaded_files_by_year, (2023, 2024), (1, 2), today=date(2024, 2, 20)
+    )
+    queries = incremental_queries(
+        query_downloaded_files_by_year, (2023, 2024), (1, 2), today=date(2024, 2, 20)
+    )
+
+    assert [query_cache.expires_at(query) == float("inf") for query in queries] == [
+        True,
+        True,
+        False,
+    ]
+    assert annual_downloads_in_tib(files).to_dict() == {2023: 1, 2024: 7}
+
+
+def test_yearly_overview_caches_closed_years_and_matches_the_single_query(
+    duckdb_backend, tmp_path, monkeypatch
+):
+    """Ensure the overview split by year caches closed years for good and adds up to the one-query result."""
+
+    query_cache = MemoryResultCache()
+    monkeypatch.setattr(utils, "get_backend", lambda: duckdb_backend)
+    monkeypatch.setattr(utils, "get_query_cache", lambda: query_cache)
+    monkeypatch.setattr(
+        utils, "get_result_cache", lambda: ParquetResultCache(str(tmp_path))
+    )
+    monkeypatch.setattr(utils, "run_query", lambda query: run_on(duckdb_backend, query))
+
+    queries = utils.yearly_queries(
+        query_annual_overview_by_year,
+        (2022, 2023, 2024),
+        (1, 2),
+        today=date(2024, 2, 20),
+    )
+    overview = utils.get_combined_data_from_snowflake({"overview": queries})["overview"]
+    single = run_on(
+        duckdb_backend, query_annual_overview_by_year((2022, 2023, 2024), (1, 2))
+    )
+
+    assert [
+        [param for param in query.params if isinstance(param, date)]
+        for query in queries
+    ] == [
+        [date(2022, 1, 1), date(2024, 1, 1), date(2024, 1, 1)],
+        [date(2024, 1, 1), date(2025, 1, 1), date(2025, 1, 1)],
+    ]
+    assert [query_cache.expires_at(query) == float("inf") for query in queries] == [
+        True,
+        False,
+    ]
+    assert overview["NAME"].dtype == "category"
+    pd.testing.assert_frame_equal(overview, single, check_categorical=False)
+
+
+def test_duckdb_backend_compares_programs_in_one_query(duckdb_backend):
+    """Ensure the multi-program queries key their rows by program, sharing projects between programs."""
+
+    program_projects = [(100, 1), (100, 2), (200, 2)]
+    overview = utils.split_by_program(
+        run_on(
+            duckdb_backend, query_programs_overview_by_year((2024,), program_projects)
+        )
+    )
+    trends = run_on(
+        duckdb_backend,
+        query_programs_monthly_download_trends_by_year((2024,), program_projects),
+    )
+
+    assert overview[100][
+        ["ANNUAL_UNIQUE_USERS", "ANNUAL_DOWNLOADS_IN_TIB", "TOTAL_PROGRAM_SIZE_IN_TIB"]
+    ].values.tolist() == [[3, 7, 7]]
+    assert overview[200][
+        ["ANNUAL_UNIQUE_USERS", "ANNUAL_DOWNLOADS_IN_TIB", "TOTAL_PROGRAM_SIZE_IN_TIB"]
+    ].values.tolist() == [[1, 4, 4]]
+    assert trends[trends["PROGRAM_ID"] == 100]["DISTINCT_USER_COUNT"].tolist() == [
+        1,
+        2,
+        1,
+    ]
+
+
+def test_duckdb_backend_aggregates_the_storage_volume(duckdb_backend):
+    """Ensure storage is aggregated by project, file handle type and creation month, in GiB."""
+
+    volume = run_on(duckdb_backend, query_storage_volume((1, 2)))
+
+    assert volume["NAME"].tolist() == ["Project A", "Project A", "Project B"]
+    assert volume["SIZE_IN_GIB"].tolist() == [1024, 2048, 4096]
+    assert pd.to_datetime(volume["CREATED_MONTH"]).dt.year.tolist() == [
+        2022,
+        2023,
+        2024,
+    ]
+
+
+def test_duckdb_backend_flattens_every_annotation_key_and_value(duckdb_backend):
+    """Ensure the annotation index has one row per node, key and value, multi-valued keys included."""
+
+    index = run_on(duckdb_backend, query_annotation_index((1, 2)))
+    rows = index.sort_values(["NODE_ID", "ANNOTATION_VALUE"])[
+        ["NODE_ID", "ANNOTATION_KEY", "ANNOTATION_VALUE"]
+    ]
+
+    assert rows.astype(str).values.tolist() == [
+        ["11", "Component", "Bulk"],
+        ["12", "Component", "Bulk"],
+        ["21", "assay", "RNA-seq"],
+        ["21", "assay", "WGS"],
+    ]
+
+
+def test_large_results_are_streamed_and_compacted_batch_by_batch(
+    duckdb_backend, monkeypatch
+):
+    """Ensure streamed families come back whole and compact from many batches, empty results included."""
+
+    monkeypatch.setattr(utils, "get_backend", lambda: duckdb_backend)
+    duckdb_backend.batch_rows = 1
+    streamed = []
+    iter_arrow_batches = duckdb_backend.iter_arrow_batches
+
+    def record_batches(query):
+        for table in iter_arrow_batches(query):
+            streamed.append(table)
+            yield table
+
+    monkeypatch.setattr(duckdb_backend, "iter_arrow_batches", record_batches)
+
+    index = utils.run_query(query_annotation_index((1, 2)))
+    downloaders = utils.run_query(query_file_downloaders_by_year((2024,), (1, 2)))
+    empty = utils.run_query(query_annotation_index((999,)))
+
+    assert len(streamed) == len(index) + len(downloaders) == 8
+    pd.testing.assert_frame_equal(
+        index,
+        run_on(duckdb_backend, query_annotation_index((1, 2))),
+        check_categorical=False,
+    )
+    assert index["ANNOTATION_VALUE"].dtype == "category"
+    assert sorted(index["ANNOTATION_VALUE"].astype(str)) == [
+        "Bulk",
+        "Bulk",
+        "RNA-seq",
+        "WGS",
+    ]
+    assert sorted(downloaders["USER_ID"]) == [7, 7, 8, 9]
+    assert empty.empty and "ANNOTATION_KEY" in empty.columns
+
+
+def test_failed_query_profile_lookups_are_kept_for_the_panel(monkeypatch):
+    """Ensure a failed statistics lookup is reported instead of only logged, and queries stay pending."""
+
+    profiles = QueryProfileStore()
+    profiles.add_pending("query_annual_overview_by_year", "a")
+
+    def fail(query):
+        raise RuntimeError("Object 'QUERY_HISTORY' does not exist or not authorized.")
+
+    monkeypatch.setattr(utils, "get_query_profiles", lambda: profiles)
+    monkeypatch.setattr(utils, "run_query", fail)
+
+    assert utils.collect_query_profiles().empty
+    assert "not authorized" in profiles.last_error
+    assert profiles.pending() == ("a",)
+
+
+def test_query_profile_lookups_are_throttled(monkeypatch):
+    """Ensure reruns in between lookups reuse the stored summary instead of reading the query history."""
+
+    profiles = QueryProfileStore(lookup_interval=60)
+    profiles.add_pending("query_annual_overview_by_year", "a")
+    lookups = []
+
+    def run_query(query):
+        lookups.append(query.params)
+        return pd.DataFrame(columns=["QUERY_ID"])
+
+    monkeypatch.setattr(utils, "get_query_profiles", lambda: profiles)
+    monkeypatch.setattr(utils, "run_query", run_query)
+
+    utils.collect_query_profiles()
+    utils.collect_query_profiles()
+    profiles.last_lookup -= 60
+    utils.collect_query_profiles()
+
+    assert len(lookups) == 2
+    assert profiles.pending() == ("a",)
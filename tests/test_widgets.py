@@ -0,0 +1,113 @@
+"""Unit tests for the charts in ``toolkit/widgets.py``."""
+
+import os
+import sys
+
+import pandas as pd
+import plotly.graph_objects as go
+
+# Ensure that the base directory is in PYTHONPATH so ``toolkit`` and other tools can be found
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from toolkit import widgets
+
+
+def _trends(n_projects, n_months=12):
+    months = pd.date_range("2024-01-01", periods=n_months, freq="MS").strftime(
+        "%Y-%m-%d"
+    )
+    return pd.DataFrame(
+        [
+            {
+                "PROJECT_ID": project,
+                "NAME": f"project {project}",
+                "ACCESS_MONTH": month,
+                "DISTINCT_USER_COUNT": project + i,
+            }
+            for project in range(n_projects)
+            for i, month in enumerate(months)
+        ]
+    )
+
+
+def test_unique_users_trend_plots_the_top_projects_and_the_median():
+    """Ensure one trace per top project, largest first, followed by the monthly median."""
+
+    fig = widgets.plot_unique_users_trend(_trends(5), top_n=3)
+
+    assert [trace.name for trace in fig.data] == ["4", "3", "2", "Median"]
+    assert list(fig.data[0].y) == [4 + i for i in range(12)]
+    assert list(fig.data[-1].y) == [2 + i for i in range(12)]
+    assert all(isinstance(trace, go.Scatter) for trace in fig.data)
+
+
+def test_unique_users_trend_switches_to_webgl_for_many_points(monkeypatch):
+    """Ensure large charts are drawn with ``Scattergl``."""
+
+    monkeypatch.setattr(widgets, "WEBGL_POINT_THRESHOLD", 100)
+
+    fig = widgets.plot_unique_users_trend(_trends(50), top_n=20)
+
+    assert len(fig.data) == 21
+    assert all(isinstance(trace, go.Scattergl) for trace in fig.data)
+
+
+def test_cached_figure_rebuilds_only_when_the_data_changes():
+    """Ensure figures are served from the cache until the input frame's content changes."""
+
+    calls = []
+
+    @widgets.cached_figure
+    def plot(df, title=""):
+        calls.append(title)
+        return go.Figure(go.Bar(x=df["NAME"], y=df["VALUE"]), layout={"title": title})
+
+    df = pd.DataFrame({"NAME": ["a", "b"], "VALUE": [1, 2]})
+    first = plot(df, title="t")
+    first.update_layout(title="changed by the caller")
+
+    assert plot(df.copy(), title="t").layout.title.text == "t"
+    assert len(calls) == 1
+    plot(df.assign(VALUE=[1, 3]), title="t")
+    plot(df, title="other")
+    assert len(calls) == 3
+
+
+def test_download_sizes_leaves_its_input_untouched():
+    """Ensure ``plot_download_sizes`` doesn't add columns to (possibly cached) input frames."""
+
+    df = pd.DataFrame(
+        {
+            "PROJECT_ID": [1, 2],
+            "NAME": ["a", "b"],
+            "TOTAL_PROJECT_SIZE_IN_TIB": [1.0, 2.0],
+            "ANNUAL_DOWNLOADS_IN_TIB": [0.5, 0.1],
+        }
+    )
+    before = df.copy()
+
+    widgets.plot_download_sizes(df)
+
+    pd.testing.assert_frame_equal(df, before)
+
+
+def test_unique_users_trend_uses_the_median_rows_of_ranked_results():
+    """Ensure ``IS_MEDIAN`` rows from a ``top_n`` query become the median trace as they are."""
+
+    trends = _trends(2, n_months=2).assign(IS_MEDIAN=False)
+    medians = pd.DataFrame(
+        {
+            "PROJECT_ID": [None, None],
+            "NAME": [None, None],
+            "ACCESS_MONTH": ["2024-01-01", "2024-02-01"],
+            "DISTINCT_USER_COUNT": [0.5, 7.5],
+            "IS_MEDIAN": [True, True],
+        }
+    )
+
+    fig = widgets.plot_unique_users_trend(
+        pd.concat([trends, medians], ignore_index=True)
+    )
+
+    assert [trace.name for trace in fig.data] == ["1", "0", "Median"]
+    assert list(fig.data[-1].y) == [0.5, 7.5]
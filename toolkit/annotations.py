@@ -0,0 +1,53 @@
+"""Popularity and unique downloads of any annotation key, ranked locally.
+
+``query_annotation_index`` flattens a program's annotations once into
+``(NODE_ID, FILE_HANDLE_ID, ANNOTATION_KEY, ANNOTATION_VALUE)`` rows, and
+``query_file_downloaders_by_year`` lists who downloaded which file in each year. Both are
+cached, so ranking the values of another key (assay, tissue, tumor type...) or another year
+is a filter, a join and a groupby in pandas rather than a new VARIANT-parsing query.
+"""
+
+import pandas as pd
+
+# The key the dashboard ranks first, as it did before any key could be picked
+DEFAULT_ANNOTATION_KEY = "Component"
+
+
+def annotation_keys(index_df):
+    """Return the annotation keys of the program, the most widely used (by nodes) first."""
+    keys = index_df.groupby("ANNOTATION_KEY", observed=True)["NODE_ID"].nunique()
+    return keys.sort_values(ascending=False, kind="stable").index.tolist()
+
+
+def top_annotations(index_df, downloaders_df, key):
+    """Return each value of annotation ``key`` with its occurrences and unique downloads, most downloaded first.
+
+    ``OCCURRENCES`` counts the program's nodes carrying the value, and
+    ``NUMBER_OF_UNIQUE_DOWNLOADS`` the distinct users who downloaded any file carrying it
+    in ``downloaders_df`` (e.g. one year of ``query_file_downloaders_by_year``). Only values
+    with downloads are returned.
+    """
+    key_df = index_df.loc[
+        index_df["ANNOTATION_KEY"] == key,
+        ["NODE_ID", "FILE_HANDLE_ID", "ANNOTATION_VALUE"],
+    ]
+    key_df = key_df.assign(ANNOTATION_VALUE=key_df["ANNOTATION_VALUE"].astype("object"))
+    occurrences = (
+        key_df.groupby("ANNOTATION_VALUE")["NODE_ID"].nunique().rename("OCCURRENCES")
+    )
+
+    downloads = (
+        key_df[["FILE_HANDLE_ID", "ANNOTATION_VALUE"]]
+        .drop_duplicates()
+        .merge(downloaders_df[["FILE_HANDLE_ID", "USER_ID"]], on="FILE_HANDLE_ID")
+        .groupby("ANNOTATION_VALUE")["USER_ID"]
+        .nunique()
+        .rename("NUMBER_OF_UNIQUE_DOWNLOADS")
+    )
+
+    top_df = pd.concat([occurrences, downloads], axis=1, join="inner").reset_index()
+    return top_df.astype({"ANNOTATION_VALUE": "category"}).sort_values(
+        ["NUMBER_OF_UNIQUE_DOWNLOADS", "OCCURRENCES"],
+        ascending=False,
+        ignore_index=True,
+    )
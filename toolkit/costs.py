@@ -0,0 +1,100 @@
+"""Storage cost of a program's files for any price table, computed locally.
+
+``query_storage_volume`` has Snowflake aggregate the GiB stored by each project, file handle
+type and creation month once per program. The cost for a choice of tier or prices is then a
+vectorized lookup and multiply over those rows, so what-if pricing never goes back to the
+warehouse.
+"""
+
+import pandas as pd
+
+# Storage provider of each file handle type; every other type (S3, external, proxy...) is
+# priced as Amazon S3
+STORAGE_PROVIDERS = {
+    "org.sagebionetworks.repo.model.file.GoogleCloudFileHandle": "Google Cloud"
+}
+DEFAULT_STORAGE_PROVIDER = "Amazon S3"
+
+# List prices (USD per GiB-month) of each storage tier, by provider
+STORAGE_PRICE_TIERS = {
+    "Standard": {"Amazon S3": 0.023, "Google Cloud": 0.026},
+    "Infrequent access": {"Amazon S3": 0.0125, "Google Cloud": 0.010},
+    "Archive": {"Amazon S3": 0.004, "Google Cloud": 0.0025},
+}
+DEFAULT_STORAGE_TIER = "Standard"
+
+
+def storage_providers(concrete_types):
+    """Return the storage provider of each file handle type in ``concrete_types``."""
+    return (
+        concrete_types.astype("object")
+        .map(STORAGE_PROVIDERS)
+        .fillna(DEFAULT_STORAGE_PROVIDER)
+    )
+
+
+def monthly_storage_cost(storage_df, prices, end):
+    """Return the GiB stored and their cost in every month up to ``end``, by project and provider.
+
+    ``storage_df`` is a ``query_storage_volume`` result and ``prices`` maps providers to USD
+    per GiB-month. Files count from the month they were created, and ``file_latest`` doesn't
+    record deletions, so they are assumed to stay stored. Returns one row per project,
+    provider and month (``MONTH`` is a monthly ``Period``).
+    """
+    storage_df = storage_df.assign(
+        PROVIDER=storage_providers(storage_df["CONCRETE_TYPE"]),
+        MONTH=pd.to_datetime(storage_df["CREATED_MONTH"]).dt.to_period("M"),
+    )
+    end = pd.Period(end, freq="M")
+    columns = ["PROJECT_ID", "NAME", "PROVIDER", "MONTH", "SIZE_IN_GIB", "COST"]
+    storage_df = storage_df[storage_df["MONTH"] <= end]
+    if storage_df.empty:
+        # Typed like a full result, so ``MONTH.dt`` and the cost sums still work downstream
+        return pd.DataFrame(
+            {
+                "PROJECT_ID": pd.Series(dtype="int64"),
+                "NAME": pd.Series(dtype="object"),
+                "PROVIDER": pd.Series(dtype="object"),
+                "MONTH": pd.Series(dtype="period[M]"),
+                "SIZE_IN_GIB": pd.Series(dtype="float64"),
+                "COST": pd.Series(dtype="float64"),
+            }
+        )
+
+    # GiB created each month, one column per project and provider, accumulated into GiB stored
+    created = storage_df.pivot_table(
+        index="MONTH",
+        columns=["PROJECT_ID", "PROVIDER"],
+        values="SIZE_IN_GIB",
+        aggfunc="sum",
+        observed=True,
+    )
+    months = pd.period_range(created.index.min(), end, freq="M", name="MONTH")
+    stored = created.reindex(months, fill_value=0).fillna(0).cumsum()
+
+    cost_df = (
+        stored.stack(["PROJECT_ID", "PROVIDER"], future_stack=True)
+        .rename("SIZE_IN_GIB")
+        .reset_index()
+    )
+    cost_df["COST"] = cost_df["SIZE_IN_GIB"] * cost_df["PROVIDER"].map(prices).fillna(0)
+    names = storage_df.drop_duplicates("PROJECT_ID").set_index("PROJECT_ID")["NAME"]
+    cost_df["NAME"] = cost_df["PROJECT_ID"].map(names)
+    return cost_df[columns]
+
+
+def storage_cost_by_project(cost_df, year):
+    """Return each project's storage cost over ``year`` and the GiB it stored at the end of it, costliest first."""
+    year_df = cost_df[cost_df["MONTH"].dt.year == year]
+    last_month = year_df["MONTH"] == year_df["MONTH"].max()
+    # Grouped by id alone, as projects without a name would be dropped from a group on NAME
+    by_project = year_df.groupby("PROJECT_ID").agg(COST=("COST", "sum"))
+    by_project["SIZE_IN_GIB"] = (
+        year_df[last_month].groupby("PROJECT_ID")["SIZE_IN_GIB"].sum()
+    )
+    by_project.insert(
+        0, "NAME", year_df.drop_duplicates("PROJECT_ID").set_index("PROJECT_ID")["NAME"]
+    )
+    return by_project.reset_index().sort_values(
+        "COST", ascending=False, ignore_index=True
+    )
@@ -0,0 +1,368 @@
+"""Lightweight tracing of where the time goes in each run of the dashboard.
+
+Each run of ``app.py`` starts a ``RunTrace``, and so does each rerun of a single fragment
+(see ``traced_fragment``). Sections of ``main()`` time their phases
+(data retrieval, transformation, visualization) with ``trace_phase``, and the query caches
+report hits and misses with ``record_cache_event``. Every event is also logged as a line
+of JSON, and ``render_trace_panel`` shows the current run's events in the sidebar.
+
+Queries that reach Snowflake also report their query ID with ``record_query_id``. Their
+execution statistics are looked up from ``SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY`` later
+(it lags by up to 45 minutes, so IDs stay queued until they show up) and kept in a rolling
+window per query family (``get_query_profiles``), which shows which builders in
+``toolkit/queries.py`` cost the most warehouse time and whether partition pruning works.
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Handlers and levels are set up by ``app.py`` (or whatever hosts the toolkit)
+logger = logging.getLogger(__name__)
+
+# Number of profiled queries kept per query family for the rolling summary
+QUERY_PROFILE_WINDOW = 200
+
+# Minimum time (in seconds) between two lookups of the query history, which lags by up to
+# 45 minutes and costs warehouse time on every lookup
+QUERY_PROFILE_LOOKUP_INTERVAL = 60 * 5
+
+# Milestones of the first run of the app in this process (see ``record_startup``)
+_startup_report = {}
+
+# The trace of the script run executing in the current context (and in the worker threads
+# it hands a copy of its context to)
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class RunTrace:
+    """The phase timings and cache events recorded during one run of the dashboard.
+
+    ``fragment`` names the fragment when the run only reran that fragment.
+    """
+
+    def __init__(self, fragment=None):
+        self.run_id = uuid.uuid4().hex[:8]
+        self.fragment = fragment
+        self.started_at = time.time()
+        self.phases = []
+        self.cache_events = []
+        self._lock = threading.Lock()
+
+    def add_phase(self, record):
+        with self._lock:
+            self.phases.append(record)
+
+    def add_cache_event(self, record):
+        with self._lock:
+            self.cache_events.append(record)
+
+
+def start_run_trace(fragment=None):
+    """Start a new ``RunTrace`` for the current script run (or rerun of ``fragment``) and return it."""
+    trace = RunTrace(fragment)
+    _current_trace.set(trace)
+    return trace
+
+
+def start_fragment_trace(fragment):
+    """Start a ``RunTrace`` for ``fragment`` if this script run only reruns fragments.
+
+    In a full run the fragment records into the run's own trace, which is returned as is.
+    """
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None and ctx.fragment_ids_this_run:
+        return start_run_trace(fragment)
+    return current_trace()
+
+
+def traced_fragment(func):
+    """Turn ``func`` into a Streamlit fragment whose reruns each record into a trace of their own.
+
+    Without this, the phases of a fragment rerun would land in the trace of the last full run.
+    """
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        start_fragment_trace(func.__name__)
+        return func(*args, **kwargs)
+
+    return st.experimental_fragment(run)
+
+
+def current_trace():
+    """Return the ``RunTrace`` of the current script run, if one was started."""
+    return _current_trace.get()
+
+
+def log_event(event, **fields):
+    """Emit a structured (JSON) log line for a tracing event."""
+    trace = current_trace()
+    run_id = trace.run_id if trace is not None else None
+    fragment = trace.fragment if trace is not None else None
+    logger.info(
+        json.dumps(
+            {"event": event, "run_id": run_id, "fragment": fragment, **fields},
+            default=str,
+        )
+    )
+
+
+def dataframe_size(df):
+    """Return the number of rows and the deep memory footprint (in bytes) of ``df``."""
+    return {"rows": len(df), "bytes": int(df.memory_usage(deep=True).sum())}
+
+
+def record_startup(milestone, seconds):
+    """Record how long after the script started a cold-start milestone was reached.
+
+    Milestones are ``imports``, ``first paint`` and ``first data``. Only the first run of
+    the app in the process (the cold start) is recorded.
+    """
+    if milestone in _startup_report:
+        return
+    _startup_report[milestone] = round(seconds, 4)
+    log_event("startup", milestone=milestone, seconds=round(seconds, 4))
+
+
+def startup_report():
+    """Return the cold-start milestones recorded so far, in seconds since the script started."""
+    return dict(_startup_report)
+
+
+@contextmanager
+def trace_phase(section, phase):
+    """Time a phase of a dashboard section, e.g. ``trace_phase("Overview", "data retrieval")``.
+
+    The yielded dict is the record that gets stored, so the block can attach extra fields
+    to it (such as ``dataframe_size`` of the frame it produced).
+    """
+    record = {"section": section, "phase": phase}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 4)
+        trace = current_trace()
+        if trace is not None:
+            trace.add_phase(record)
+        log_event("phase", **record)
+
+
+def record_cache_event(query, source, seconds, df=None):
+    """Record where the result of ``query`` came from (``memory``, ``disk`` or ``warehouse``)."""
+    record = {
+        "family": query.family,
+        "source": source,
+        "hit": source != "warehouse",
+        "seconds": round(seconds, 4),
+        **(dataframe_size(df) if df is not None else {}),
+    }
+    trace = current_trace()
+    if trace is not None:
+        trace.add_cache_event(record)
+    log_event("query", **record)
+
+
+def render_trace_panel(trace):
+    """Show the timings and cache events of ``trace`` (the current run) in the sidebar."""
+    with st.sidebar.expander("**Performance (debug)**", expanded=True):
+        run = f"Run `{trace.run_id}`" + (
+            f" (fragment `{trace.fragment}`)" if trace.fragment else ""
+        )
+        st.caption(f"{run}: {time.time() - trace.started_at:.2f}s so far")
+        if _startup_report:
+            st.caption(
+                "Cold start: "
+                + ", ".join(
+                    f"{milestone} {seconds:.2f}s"
+                    for milestone, seconds in _startup_report.items()
+                )
+            )
+        if trace.phases:
+            st.dataframe(pd.DataFrame(trace.phases), hide_index=True)
+        if trace.cache_events:
+            cache_events_df = pd.DataFrame(trace.cache_events)
+            hits = int(cache_events_df["hit"].sum())
+            st.caption(
+                f"Query cache: {hits} hits, {len(cache_events_df) - hits} misses"
+            )
+            st.dataframe(cache_events_df, hide_index=True)
+
+
+class QueryProfileStore:
+    """The execution statistics of the most recent warehouse queries, per query family.
+
+    Query IDs are queued with ``add_pending`` as queries run, and their statistics are
+    attached with ``add_profiles`` once looked up from the query history. Only the last
+    ``window`` profiles of each family are kept. ``last_error`` holds why the latest lookup
+    failed, if it did, so the debug panel can show it. Lookups are throttled to one per
+    ``lookup_interval`` seconds (see ``claim_lookup``).
+    """
+
+    def __init__(
+        self, window=QUERY_PROFILE_WINDOW, lookup_interval=QUERY_PROFILE_LOOKUP_INTERVAL
+    ):
+        self.window = window
+        self.lookup_interval = lookup_interval
+        self.last_error = None
+        self.last_lookup = None
+        self._pending = {}
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def add_pending(self, family, query_id):
+        with self._lock:
+            self._pending[query_id] = (family, time.time())
+            # Drop the oldest IDs if their statistics can't be looked up
+            while len(self._pending) > self.window * 5:
+                self._pending.pop(next(iter(self._pending)))
+
+    def pending(self):
+        """Return the query IDs still waiting for their statistics."""
+        with self._lock:
+            return tuple(self._pending)
+
+    def pending_since(self):
+        """Return when the oldest query still waiting for its statistics ran, or ``None``."""
+        with self._lock:
+            return min(
+                (queued_at for _, queued_at in self._pending.values()), default=None
+            )
+
+    def claim_lookup(self, now=None):
+        """Return whether a query history lookup is due, and if so record it as started.
+
+        A lookup is due when queries are waiting for their statistics and no other lookup
+        (from any session) started within the last ``lookup_interval`` seconds.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if not self._pending:
+                return False
+            if (
+                self.last_lookup is not None
+                and now - self.last_lookup < self.lookup_interval
+            ):
+                return False
+            self.last_lookup = now
+            return True
+
+    def add_profiles(self, profiles_df):
+        """Attach the rows of a ``query_execution_stats`` result to their query families."""
+        with self._lock:
+            for profile in profiles_df.to_dict("records"):
+                pending = self._pending.pop(profile["QUERY_ID"], None)
+                if pending is None:
+                    continue
+                family = pending[0]
+                window = self._profiles.setdefault(family, deque(maxlen=self.window))
+                window.append(profile)
+                log_event("query_profile", family=family, **profile)
+
+    def summary(self):
+        """Return one row per query family summarising its recent profiles, slowest first."""
+        with self._lock:
+            rows = [
+                {"FAMILY": family, **profile}
+                for family, window in self._profiles.items()
+                for profile in window
+            ]
+        if not rows:
+            return pd.DataFrame()
+
+        profiles_df = pd.DataFrame(rows)
+        summary_df = profiles_df.groupby("FAMILY").agg(
+            QUERIES=("QUERY_ID", "count"),
+            MEAN_ELAPSED_S=("TOTAL_ELAPSED_TIME", "mean"),
+            P95_ELAPSED_S=(
+                "TOTAL_ELAPSED_TIME",
+                lambda elapsed: elapsed.quantile(0.95),
+            ),
+            TOTAL_ELAPSED_S=("TOTAL_ELAPSED_TIME", "sum"),
+            MEAN_COMPILE_S=("COMPILATION_TIME", "mean"),
+            MEAN_QUEUED_S=("QUEUED_TIME", "mean"),
+            MEAN_GIB_SCANNED=("BYTES_SCANNED", "mean"),
+            PARTITIONS_SCANNED=("PARTITIONS_SCANNED", "sum"),
+            PARTITIONS_TOTAL=("PARTITIONS_TOTAL", "sum"),
+        )
+        # The query history reports milliseconds and bytes
+        seconds = [
+            "MEAN_ELAPSED_S",
+            "P95_ELAPSED_S",
+            "TOTAL_ELAPSED_S",
+            "MEAN_COMPILE_S",
+            "MEAN_QUEUED_S",
+        ]
+        summary_df[seconds] = summary_df[seconds] / 1000
+        summary_df["MEAN_GIB_SCANNED"] = summary_df["MEAN_GIB_SCANNED"] / 1024**3
+        summary_df["FRACTION_SCANNED"] = summary_df["PARTITIONS_SCANNED"] / summary_df[
+            "PARTITIONS_TOTAL"
+        ].where(summary_df["PARTITIONS_TOTAL"] > 0)
+        return summary_df.sort_values("TOTAL_ELAPSED_S", ascending=False).reset_index()
+
+
+# Process-wide, so the summary covers every session and the background cache warmer
+_query_profiles = QueryProfileStore()
+
+
+def get_query_profiles():
+    """Return the process-wide ``QueryProfileStore``."""
+    return _query_profiles
+
+
+def record_query_id(query, query_id):
+    """Queue the warehouse query ID of ``query`` so its execution statistics can be looked up."""
+    # The statistics lookups themselves aren't profiled
+    if query_id and query.family != "query_execution_stats":
+        _query_profiles.add_pending(query.family, query_id)
+
+
+def render_query_profile_panel(summary_df, pending=0, error=None):
+    """Show the rolling per-family summary of warehouse query statistics in the sidebar.
+
+    ``pending`` is the number of queries still waiting for their statistics and ``error``
+    why the latest lookup failed, if it did.
+    """
+    with st.sidebar.expander("**Warehouse query profiles (debug)**", expanded=False):
+        if error:
+            st.warning(f"Could not look up query statistics: {error}")
+        if pending:
+            st.caption(
+                f"{pending} queries waiting for their statistics (the query history lags by up to 45 minutes "
+                f"and is looked up at most every {QUERY_PROFILE_LOOKUP_INTERVAL // 60} minutes)."
+            )
+        if summary_df.empty:
+            st.caption("No warehouse queries profiled yet.")
+            return
+        st.dataframe(
+            summary_df,
+            hide_index=True,
+            column_config={
+                "FRACTION_SCANNED": st.column_config.NumberColumn(format="%.2f")
+            },
+        )
+
+
+def render_backend_panel(name, stats):
+    """Show the warehouse backend's metrics (e.g. session pool queue waits) in the sidebar."""
+    if not stats:
+        return
+    with st.sidebar.expander(f"**Warehouse backend: {name} (debug)**", expanded=False):
+        st.dataframe(pd.Series(stats, name="value").to_frame(), width=None)
+
+
+def render_cache_panel(stats_by_cache):
+    """Show the hit/miss counters and current size of each query cache (e.g. ``disk``) in the sidebar."""
+    with st.sidebar.expander("**Query caches (debug)**", expanded=False):
+        st.dataframe(pd.DataFrame(stats_by_cache), width=None)
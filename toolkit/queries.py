@@ -1,132 +1,310 @@
+import functools
+import re
+from datetime import date
+from typing import NamedTuple, Optional
+
 # Package imports are needed to generate the dummy dataframes
 import numpy as np
 import pandas as pd
 
-def query_annual_unique_users(year, program_id):
-    """Return the number of unique users for a given year."""
+# ``:name`` placeholders; the lookbehind skips VARIANT paths (``annotations:Component``) and ``::`` casts
+_PLACEHOLDER = re.compile(r"(?<![\w:]):(\w+)")
 
-    return f"""
-    WITH
-    htan_project_ids AS (
 
-        SELECT
-            DISTINCT cast(scopes.value as integer) as project_id
-        FROM
-            synapse_data_warehouse.synapse.node_latest,
-            LATERAL flatten(input => node_latest.scope_ids) scopes
-        WHERE
-            id = '{program_id}'
+# Compact pandas dtypes for the result columns of each query family; names become
+# categoricals, counts nullable 32-bit integers and TiB values 32-bit floats
+_OVERVIEW_DTYPES = {
+    "NAME": "category",
+    "ANNUAL_UNIQUE_USERS": "Int32",
+    "ANNUAL_DOWNLOADS_IN_TIB": "float32",
+    "TOTAL_PROJECT_SIZE_IN_TIB": "float32",
+}
+_DOWNLOAD_TRENDS_DTYPES = {
+    "NAME": "category",
+    # Fractional when it holds the per-month median (``top_n`` results)
+    "DISTINCT_USER_COUNT": "float32",
+    "PROJECT_RANK": "Int32",
+}
+RESULT_DTYPES = {
+    "query_annual_overview_by_year": _OVERVIEW_DTYPES,
+    "query_monthly_download_trends_by_year": _DOWNLOAD_TRENDS_DTYPES,
+    "query_programs_overview_by_year": {
+        "ANNUAL_UNIQUE_USERS": "Int32",
+        "ANNUAL_DOWNLOADS_IN_TIB": "float32",
+        "TOTAL_PROGRAM_SIZE_IN_TIB": "float32",
+    },
+    "query_programs_monthly_download_trends_by_year": {"DISTINCT_USER_COUNT": "Int32"},
+    "query_entity_distribution": {"NODE_TYPE": "category", "NUMBER_OF_FILES": "Int32"},
+    "query_annotation_index": {
+        "ANNOTATION_KEY": "category",
+        "ANNOTATION_VALUE": "category",
+    },
+    "query_file_downloaders_by_year": {"YEAR": "Int32"},
+    "query_storage_volume": {
+        "NAME": "category",
+        "CONCRETE_TYPE": "category",
+        "NUMBER_OF_FILES": "Int32",
+    },
+}
+
+
+class Query(NamedTuple):
+    """SQL text with qmark (``?``) placeholders and the values bound to them, in order.
+
+    ``family`` names the builder that produced the query (e.g.
+    ``query_annual_overview_by_year``) so caching and monitoring can be configured and
+    reported per builder. ``ttl`` overrides how long (in seconds) its result stays cached,
+    0 meaning for good (e.g. for years that have ended).
+    """
+
+    sql: str
+    params: tuple = ()
+    family: str = ""
+    ttl: Optional[int] = None
+
+
+def query_builder(builder):
+    """Tag the ``Query`` returned by ``builder`` with the builder's name as its family."""
+
+    @functools.wraps(builder)
+    def wrapper(*args, **kwargs):
+        return builder(*args, **kwargs)._replace(family=builder.__name__)
+
+    return wrapper
+
+
+def bind(sql, **params):
+    """Compile the ``:name`` placeholders in ``sql`` into a ``Query`` with bound values.
+
+    The SQL text stays fixed across selections so Snowflake can reuse compiled plans and
+    cached results, and user-controlled values never end up in the text. A list or tuple
+    expands to one placeholder per item (for ``IN`` lists); an empty one binds a single
+    ``NULL`` so the list still parses and matches nothing. A list of tuples expands to one
+    parenthesized row per tuple, for ``VALUES`` lists; since a row's width isn't known from
+    an empty one, an empty ``VALUES`` list raises ``ValueError``.
+    """
+    values = []
 
+    def substitute(match):
+        name = match.group(1)
+        if name not in params:
+            raise KeyError(f"No value bound for placeholder ':{name}'")
+        value = params[name]
+        if isinstance(value, (list, tuple)):
+            if not value and sql[: match.start()].rstrip().upper().endswith("VALUES"):
+                raise ValueError(f"No rows bound for VALUES placeholder ':{name}'")
+            items = list(value) or [None]
+            if all(isinstance(item, tuple) for item in items):
+                for item in items:
+                    values.extend(item)
+                return ", ".join(
+                    "(" + ", ".join("?" * len(item)) + ")" for item in items
+                )
+            values.extend(items)
+            return ", ".join("?" * len(items))
+        values.append(value)
+        return "?"
+
+    return Query(_PLACEHOLDER.sub(substitute, sql), tuple(values))
+
+
+def year_range(year):
+    """Return the half-open ``[start, end)`` date range covering a calendar year.
+
+    Comparing the raw date column against these bounds (instead of ``YEAR(column) = year``)
+    keeps the predicate sargable, so Snowflake can prune micro-partitions on it.
+    """
+    return {"start": date(int(year), 1, 1), "end": date(int(year) + 1, 1, 1)}
+
+
+def years_range(years, since=None, until=None):
+    """Return the half-open ``[start, end)`` date range covering every year in ``years``.
+
+    ``since`` and ``until`` narrow the range, e.g. to the part of a year whose data can
+    still change (see ``get_incremental_data_from_snowflake``).
+    """
+    start, end = year_range(min(years))["start"], year_range(max(years))["end"]
+    return {"start": max(start, since or start), "end": min(end, until or end)}
+
+
+def count_distinct(column, approximate=False):
+    """Return the SQL counting the distinct values of ``column``.
+
+    With ``approximate``, the count is estimated with ``APPROX_COUNT_DISTINCT`` (HyperLogLog,
+    within about 2% of the exact count), which is much cheaper over ``filedownload``.
+    """
+    return (
+        f"APPROX_COUNT_DISTINCT({column})"
+        if approximate
+        else f"COUNT(DISTINCT {column})"
     )
+
+
+@query_builder
+def query_program_project_ids(program_id):
+    """Return the ids of the projects in the scope of a given program."""
+
+    sql = """
     SELECT
-        count(DISTINCT user_id) as annual_unique_users
+        DISTINCT cast(scopes.value as integer) as project_id
     FROM
-        synapse_data_warehouse.synapse.filedownload
+        synapse_data_warehouse.synapse.node_latest,
+        LATERAL flatten(input => node_latest.scope_ids) scopes
     WHERE
-        project_id in (SELECT project_id FROM htan_project_ids)
-    AND
-        YEAR(record_date) = {year};
+        id = :program_id
+    ORDER BY
+        project_id;
     """
 
+    return bind(sql, program_id=program_id)
 
-def query_annual_downloads(year, program_id):
-    """Return the annual downloads (in TiB) for a given year."""
 
-    return f"""
-    WITH
-    htan_project_ids AS (
+@query_builder
+def query_downloaded_files_by_year(years, project_ids, since=None, until=None):
+    """Return the distinct files downloaded in each year of ``years``, with their size in bytes.
 
-        SELECT
-            DISTINCT cast(scopes.value as integer) as project_id
-        FROM
-            synapse_data_warehouse.synapse.node_latest,
-            LATERAL flatten(input => node_latest.scope_ids) scopes
-        WHERE
-            id = '{program_id}'
+    Unlike the program totals of ``query_annual_overview_by_year``, the rows of two date
+    ranges can be merged (and de-duplicated) locally, which lets the annual downloads of
+    the current year be refreshed incrementally. ``since`` and ``until`` narrow the date range.
+    """
 
-    ),
+    sql = """
+    WITH
     file_handle_ids AS (
 
         SELECT
-            DISTINCT file_handle_id
+            DISTINCT
+            YEAR(record_date) AS year,
+            file_handle_id
         FROM
             synapse_data_warehouse.synapse.filedownload
         WHERE
-            project_id in (SELECT project_id FROM htan_project_ids)
+            project_id in (:project_ids)
         AND
-            YEAR(record_date) = {year}
+            record_date >= :start
+        AND
+            record_date < :end
     )
     SELECT
-        SUM(content_size) / POWER(1024, 4) as annual_downloads_in_tib
+        fh.year,
+        fh.file_handle_id,
+        fl.content_size
     FROM
-        synapse_data_warehouse.synapse.file_latest
-    WHERE
-        id in (SELECT file_handle_id FROM file_handle_ids);
+        file_handle_ids fh
+    JOIN
+        synapse_data_warehouse.synapse.file_latest fl
+    ON
+        fl.id = fh.file_handle_id;
     """
 
+    return bind(sql, project_ids=project_ids, **years_range(years, since, until))
+
+
+@query_builder
+def query_daily_user_sketches(years, project_ids):
+    """Return a HyperLogLog sketch of the users who downloaded from each project on each day.
 
-def query_annual_cost(program_id):
-    """Return the annual cost for a given year."""
+    The exported sketches (``USERS_SKETCH``) can be merged locally for any range of days and
+    set of projects (see ``toolkit/sketches.py``), so custom date ranges don't need another scan.
+    """
 
-    return f"""
-    WITH htan_projects AS (
+    sql = """
     SELECT
-        cast(scopes.value as integer) as project_id
+        project_id,
+        record_date AS day,
+        HLL_EXPORT(HLL_ACCUMULATE(user_id)) AS users_sketch
     FROM
-        synapse_data_warehouse.synapse.node_latest,
-        LATERAL flatten(input => node_latest.scope_ids) scopes
+        synapse_data_warehouse.synapse.filedownload
     WHERE
-        id = {program_id}
-    ), price_per_year AS (
+        project_id in (:project_ids)
+    AND
+        record_date >= :start
+    AND
+        record_date < :end
+    GROUP BY
+        project_id,
+        record_date;
+    """
+
+    return bind(sql, project_ids=project_ids, **years_range(years))
+
+
+@query_builder
+def query_storage_volume(project_ids):
+    """Return the GiB stored by each project, by file handle type and month the files were created.
+
+    The result doesn't depend on the selected years, so it is fetched once per program; the
+    storage cost is computed from it locally for any price table (see ``toolkit/costs.py``).
+    """
+
+    sql = """
+    WITH project_names AS (
         SELECT
-            CASE
-                WHEN FILE_LATEST.CONCRETE_TYPE = 'org.sagebionetworks.repo.model.file.GoogleCloudFileHandle'
-                THEN FILE_LATEST.CONTENT_SIZE / power(2, 30) * 0.026 * 12
-                ELSE FILE_LATEST.CONTENT_SIZE / power(2, 30) * 0.023 * 12
-            END AS price_per_file_annually
+            name,
+            project_id
         FROM
-            htan_projects
-        LEFT JOIN
             synapse_data_warehouse.synapse.node_latest
-        ON
-            htan_projects.project_id = node_latest.project_id
-        LEFT JOIN
-            synapse_data_warehouse.synapse.file_latest FILE_LATEST
-        ON
-            node_latest.FILE_HANDLE_ID = FILE_LATEST.ID
         WHERE
-            node_latest.node_type != 'folder'
+            project_id in (:project_ids)
+        AND
+            node_type = 'project'
     )
     SELECT
-        SUM(price_per_file_annually) AS annual_cost
+        nl.project_id,
+        pn.name,
+        fl.concrete_type,
+        DATE_TRUNC('month', fl.created_on) AS created_month,
+        COUNT(*) AS number_of_files,
+        SUM(fl.content_size) / POWER(1024, 3) AS size_in_gib
     FROM
-        price_per_year;
+        synapse_data_warehouse.synapse.node_latest nl
+    JOIN
+        synapse_data_warehouse.synapse.file_latest fl
+    ON
+        nl.file_handle_id = fl.id
+    LEFT JOIN
+        project_names pn
+    ON
+        nl.project_id = pn.project_id
+    WHERE
+        nl.project_id in (:project_ids)
+    AND
+        nl.node_type != 'folder'
+    GROUP BY
+        nl.project_id,
+        pn.name,
+        fl.concrete_type,
+        created_month
+    ORDER BY
+        nl.project_id,
+        created_month;
     """
 
+    return bind(sql, project_ids=project_ids)
 
-def query_monthly_download_trends(year, program_id):
-    """Return the monthly download trends for a given year."""
 
-    return f"""
-    WITH htan_projects AS (
-        SELECT
-            CAST(scopes.value AS INTEGER) AS project_id
-        FROM
-            synapse_data_warehouse.synapse.node_latest,
-            LATERAL FLATTEN(input => node_latest.scope_ids) scopes
-        WHERE
-            id = {program_id}
-    ),
-    project_files AS (
+@query_builder
+def query_monthly_download_trends_by_year(
+    years, project_ids, top_n=None, since=None, until=None, approximate=False
+):
+    """Return the monthly download trends for every year in ``years``, tagged with their year.
+
+    With ``top_n``, only the ``top_n`` projects with the most unique users in each year are
+    returned (ranked by ``PROJECT_RANK``), followed by one ``IS_MEDIAN`` row per month holding
+    the median over all of the program's projects, so the result size doesn't grow with the
+    size of the program. ``since`` and ``until`` (month starts) narrow the date range, and
+    ``approximate`` estimates the unique users (see ``count_distinct``).
+    """
+
+    ctes = """
+    WITH project_files AS (
         SELECT
             nl.id AS node_id,
-            hp.project_id
+            nl.project_id
         FROM
             synapse_data_warehouse.synapse.node_latest nl
-        JOIN
-            htan_projects hp
-        ON
-            nl.project_id = hp.project_id
+        WHERE
+            nl.project_id in (:project_ids)
     ),
     file_access AS (
         SELECT
@@ -140,7 +318,9 @@ def query_monthly_download_trends(year, program_id):
         ON
             pf.node_id = filedownload.file_handle_id
         WHERE
-            YEAR(filedownload.TIMESTAMP) = {year}
+            filedownload.TIMESTAMP >= :start
+        AND
+            filedownload.TIMESTAMP < :end
     ),
     project_names AS (
         SELECT
@@ -149,15 +329,19 @@ def query_monthly_download_trends(year, program_id):
         FROM
             synapse_data_warehouse.synapse.node_latest
         WHERE
-            project_id in (SELECT project_id FROM htan_projects)
+            project_id in (:project_ids)
         AND
             node_type = 'project'
     )
+    """
+
+    monthly_counts = f"""
     SELECT
+        YEAR(access_month) AS year,
         file_access.project_id,
         name,
         access_month,
-        COUNT(DISTINCT user_id) AS distinct_user_count
+        {count_distinct("user_id", approximate)} AS distinct_user_count
     FROM
         file_access
     JOIN
@@ -168,54 +352,151 @@ def query_monthly_download_trends(year, program_id):
         file_access.project_id,
         name,
         access_month
+    """
+
+    if top_n is None:
+        sql = (
+            ctes
+            + monthly_counts
+            + """
     ORDER BY
         file_access.project_id,
         access_month;
     """
+        )
+        return bind(sql, project_ids=project_ids, **years_range(years, since, until))
+
+    sql = (
+        ctes
+        + """,
+    monthly_counts AS ("""
+        + monthly_counts
+        + """),
+    project_ranks AS (
+        SELECT
+            year,
+            project_id,
+            ROW_NUMBER() OVER (
+                PARTITION BY year ORDER BY SUM(distinct_user_count) DESC, project_id
+            ) AS project_rank
+        FROM
+            monthly_counts
+        GROUP BY
+            year,
+            project_id
+    )
+    SELECT
+        mc.year,
+        mc.project_id,
+        mc.name,
+        mc.access_month,
+        mc.distinct_user_count,
+        pr.project_rank,
+        FALSE AS is_median
+    FROM
+        monthly_counts mc
+    JOIN
+        project_ranks pr
+    ON
+        mc.year = pr.year
+    AND
+        mc.project_id = pr.project_id
+    WHERE
+        pr.project_rank <= :top_n
+    UNION ALL
+    SELECT
+        year,
+        NULL AS project_id,
+        NULL AS name,
+        access_month,
+        MEDIAN(distinct_user_count) AS distinct_user_count,
+        NULL AS project_rank,
+        TRUE AS is_median
+    FROM
+        monthly_counts
+    GROUP BY
+        year,
+        access_month
+    ORDER BY
+        is_median,
+        project_rank,
+        access_month;
+    """
+    )
 
+    return bind(
+        sql, project_ids=project_ids, top_n=top_n, **years_range(years, since, until)
+    )
 
-def query_annual_project_downloads(year, program_id):
-    """Return the annual project downloads for a given year."""
 
-    return f"""
+@query_builder
+def query_annual_overview_by_year(years, project_ids, approximate=False):
+    """Return the per-project and program-level download totals for every year in ``years``.
+
+    ``filedownload`` is scanned once and aggregated with ``GROUPING SETS``: for each year,
+    rows with ``is_program_total`` set carry the program's unique users and TiB downloaded,
+    the rest carry the same metrics (plus name and total size to date) for each project.
+    ``approximate`` estimates the unique users (see ``count_distinct``).
+    """
+
+    sql = f"""
     WITH
-    htan_project_ids AS (
+    downloads AS (
         SELECT
-            DISTINCT cast(scopes.value as integer) as project_id
-        FROM
-            synapse_data_warehouse.synapse.node_latest,
-            LATERAL flatten(input => node_latest.scope_ids) scopes
-        WHERE
-            id = '{program_id}'
-    ),
-    file_handle_ids AS (
-        SELECT
-            DISTINCT file_handle_id,
-            project_id
+            DISTINCT YEAR(record_date) AS year,
+            project_id,
+            file_handle_id,
+            user_id
         FROM
             synapse_data_warehouse.synapse.filedownload
         WHERE
-            project_id in (SELECT project_id FROM htan_project_ids)
+            project_id in (:project_ids)
+        AND
+            record_date >= :start
         AND
-            YEAR(record_date) = {year}
+            record_date < :end
     ),
-    total_download_size AS (
+    ranked_downloads AS (
+        // Flag one row per file and year so sizes are only summed once at each grouping level
         SELECT
-            fh.project_id,
-            SUM(fl.content_size) / POWER(1024, 4) as annual_downloads_in_tib
+            d.year,
+            d.project_id,
+            d.user_id,
+            fl.content_size,
+            ROW_NUMBER() OVER (
+                PARTITION BY d.year, d.project_id, d.file_handle_id ORDER BY d.user_id
+            ) = 1 AS first_in_project,
+            ROW_NUMBER() OVER (
+                PARTITION BY d.year, d.file_handle_id ORDER BY d.project_id, d.user_id
+            ) = 1 AS first_in_program
         FROM
-            file_handle_ids fh
-        JOIN
+            downloads d
+        LEFT JOIN
             synapse_data_warehouse.synapse.file_latest fl
         ON
-            fh.file_handle_id = fl.id
+            d.file_handle_id = fl.id
+    ),
+    download_totals AS (
+        SELECT
+            year,
+            GROUPING(project_id) = 1 AS is_program_total,
+            project_id,
+            {count_distinct("user_id", approximate)} AS annual_unique_users,
+            CASE
+                WHEN GROUPING(project_id) = 1
+                THEN SUM(IFF(first_in_program, content_size, 0))
+                ELSE SUM(IFF(first_in_project, content_size, 0))
+            END / POWER(1024, 4) AS annual_downloads_in_tib
+        FROM
+            ranked_downloads
         GROUP BY
-            fh.project_id
+            GROUPING SETS ((year, project_id), (year))
     ),
-    total_project_size AS (
+    project_size_by_created_year AS (
         SELECT
             nl.project_id,
-            SUM(fl.content_size) / POWER(1024, 4) as total_project_size_in_tib
+            YEAR(fl.created_on) AS created_year,
+            SUM(fl.content_size) AS content_size
         FROM
             synapse_data_warehouse.synapse.node_latest nl
         JOIN
@@ -223,11 +504,28 @@ def query_annual_project_downloads(year, program_id):
         ON
             nl.file_handle_id = fl.id
         WHERE
-            nl.project_id in (SELECT project_id FROM htan_project_ids)
+            nl.project_id in (:project_ids)
         AND
-            YEAR(fl.created_on) <= {year}
+            fl.created_on < :end
         GROUP BY
-            nl.project_id
+            nl.project_id,
+            created_year
+    ),
+    total_project_size AS (
+        // Everything created up to the end of each year counts towards that year's size
+        SELECT
+            y.year,
+            ps.project_id,
+            SUM(ps.content_size) / POWER(1024, 4) as total_project_size_in_tib
+        FROM
+            (SELECT DISTINCT year FROM download_totals) y
+        JOIN
+            project_size_by_created_year ps
+        ON
+            ps.created_year <= y.year
+        GROUP BY
+            y.year,
+            ps.project_id
     ),
     project_names AS (
         SELECT
@@ -236,121 +534,351 @@ def query_annual_project_downloads(year, program_id):
         FROM
             synapse_data_warehouse.synapse.node_latest
         WHERE
-            project_id in (SELECT project_id FROM htan_project_ids)
+            project_id in (:project_ids)
         AND
             node_type = 'project'
     )
     SELECT
-        tps.project_id,
+        dt.year,
+        dt.is_program_total,
+        dt.project_id,
         pn.name,
-        tds.annual_downloads_in_tib,
+        dt.annual_unique_users,
+        dt.annual_downloads_in_tib,
         tps.total_project_size_in_tib
     FROM
-        total_download_size tds
-    JOIN
+        download_totals dt
+    LEFT JOIN
         total_project_size tps
     ON
-        tds.project_id = tps.project_id
-    JOIN
+        dt.year = tps.year
+    AND
+        dt.project_id = tps.project_id
+    LEFT JOIN
         project_names pn
     ON
-        tds.project_id = pn.project_id
+        dt.project_id = pn.project_id
+    WHERE
+        dt.is_program_total
+    OR
+        (tps.project_id IS NOT NULL AND pn.project_id IS NOT NULL)
     ORDER BY
-        tds.annual_downloads_in_tib DESC;
+        dt.year,
+        dt.is_program_total DESC,
+        dt.annual_downloads_in_tib DESC;
     """
 
+    return bind(sql, project_ids=project_ids, **years_range(years))
 
-def query_top_annotations(year, program_id):
-    """Return the top annotations for HTAN for a given year."""
 
-    return f"""
-    WITH htan_projects AS (
-    SELECT
-        cast(scopes.value as integer) as project_id
-    FROM
-        synapse_data_warehouse.synapse.node_latest,
-        LATERAL flatten(input => node_latest.scope_ids) scopes
-    WHERE
-        id = {program_id}
-    ), dedup_downloads AS (
+def _program_projects_params(program_projects):
+    # The (program, project) pairs become a VALUES list; the distinct project ids are also
+    # bound as a literal IN list so ``filedownload`` can still be pruned on them
+    program_projects = sorted(set(program_projects))
+    return {
+        "program_projects": program_projects,
+        "project_ids": sorted({project_id for _, project_id in program_projects}),
+    }
+
+
+@query_builder
+def query_programs_overview_by_year(years, program_projects, approximate=False):
+    """Return the program-level download totals of several programs for every year in ``years``.
+
+    ``program_projects`` holds ``(program_id, project_id)`` pairs (see ``get_program_project_ids``),
+    so every program is covered by a single scan of ``filedownload``; rows are keyed by
+    ``PROGRAM_ID``. A project in the scope of two programs counts towards both.
+    """
+
+    sql = f"""
+    WITH
+    program_projects AS (
         SELECT
-            DISTINCT filedownload.user_id, 
-            filedownload.file_handle_id, 
-            filedownload.RECORD_DATE, 
-            node_latest.annotations:annotations:Component:value[0] AS component
+            program_id,
+            project_id
         FROM
-            htan_projects
-        INNER JOIN
-            synapse_data_warehouse.synapse.filedownload
-            ON htan_projects.project_id = filedownload.project_id
-        INNER JOIN
-            synapse_data_warehouse.synapse.node_latest
-            ON filedownload.file_handle_id = node_latest.file_handle_id
+            (VALUES :program_projects) AS pp (program_id, project_id)
+    ),
+    downloads AS (
+        SELECT
+            DISTINCT pp.program_id,
+            YEAR(fd.record_date) AS year,
+            fd.file_handle_id,
+            fd.user_id
+        FROM
+            synapse_data_warehouse.synapse.filedownload fd
+        JOIN
+            program_projects pp
+        ON
+            fd.project_id = pp.project_id
         WHERE
-            node_latest.annotations:annotations:Component:value[0] IS NOT NULL
+            fd.project_id in (:project_ids)
+        AND
+            fd.record_date >= :start
         AND
-            YEAR(filedownload.RECORD_DATE) = {year}
-    ), component_popularity AS (
+            fd.record_date < :end
+    ),
+    unique_users AS (
         SELECT
-            node_latest.annotations:annotations:Component:value[0] as component,
-            COUNT(DISTINCT node_latest.id) AS occurrences
+            program_id,
+            year,
+            {count_distinct("user_id", approximate)} AS annual_unique_users
         FROM
-            synapse_data_warehouse.synapse.node_latest node_latest
+            downloads
+        GROUP BY
+            program_id,
+            year
+    ),
+    download_sizes AS (
+        // Each file downloaded in a year counts once per program
+        SELECT
+            df.program_id,
+            df.year,
+            SUM(fl.content_size) / POWER(1024, 4) AS annual_downloads_in_tib
+        FROM
+            (SELECT DISTINCT program_id, year, file_handle_id FROM downloads) df
+        LEFT JOIN
+            synapse_data_warehouse.synapse.file_latest fl
+        ON
+            df.file_handle_id = fl.id
+        GROUP BY
+            df.program_id,
+            df.year
+    ),
+    program_size_by_created_year AS (
+        SELECT
+            pp.program_id,
+            YEAR(fl.created_on) AS created_year,
+            SUM(fl.content_size) AS content_size
+        FROM
+            synapse_data_warehouse.synapse.node_latest nl
+        JOIN
+            program_projects pp
+        ON
+            nl.project_id = pp.project_id
         JOIN
-            htan_projects
+            synapse_data_warehouse.synapse.file_latest fl
         ON
-            node_latest.project_id = htan_projects.project_id
+            nl.file_handle_id = fl.id
         WHERE
-            node_latest.annotations:annotations:Component:value[0] IS NOT NULL
+            nl.project_id in (:project_ids)
+        AND
+            fl.created_on < :end
         GROUP BY
-            component
+            pp.program_id,
+            created_year
+    ),
+    total_program_size AS (
+        // Everything created up to the end of each year counts towards that year's size
+        SELECT
+            uu.program_id,
+            uu.year,
+            SUM(ps.content_size) / POWER(1024, 4) AS total_program_size_in_tib
+        FROM
+            unique_users uu
+        JOIN
+            program_size_by_created_year ps
+        ON
+            ps.program_id = uu.program_id
+        AND
+            ps.created_year <= uu.year
+        GROUP BY
+            uu.program_id,
+            uu.year
     )
     SELECT
-        dd.component AS component_name,
-        cp.occurrences,
-        COUNT(DISTINCT dd.user_id) AS number_of_unique_downloads
+        uu.program_id,
+        uu.year,
+        uu.annual_unique_users,
+        ds.annual_downloads_in_tib,
+        tps.total_program_size_in_tib
     FROM
-        dedup_downloads dd
+        unique_users uu
     JOIN
-        component_popularity cp
+        download_sizes ds
+    ON
+        uu.program_id = ds.program_id
+    AND
+        uu.year = ds.year
+    LEFT JOIN
+        total_program_size tps
     ON
-        dd.component = cp.component
+        uu.program_id = tps.program_id
+    AND
+        uu.year = tps.year
+    ORDER BY
+        uu.program_id,
+        uu.year;
+    """
+
+    return bind(sql, **_program_projects_params(program_projects), **years_range(years))
+
+
+@query_builder
+def query_programs_monthly_download_trends_by_year(
+    years, program_projects, approximate=False
+):
+    """Return the monthly unique users of several programs for every year in ``years``.
+
+    Like ``query_programs_overview_by_year``, all programs share one scan and rows are keyed
+    by ``PROGRAM_ID``.
+    """
+
+    sql = f"""
+    WITH program_projects AS (
+        SELECT
+            program_id,
+            project_id
+        FROM
+            (VALUES :program_projects) AS pp (program_id, project_id)
+    ),
+    file_access AS (
+        SELECT
+            pp.program_id,
+            fd.user_id,
+            DATE_TRUNC('month', fd.TIMESTAMP) AS access_month
+        FROM
+            synapse_data_warehouse.synapse.filedownload fd
+        JOIN
+            program_projects pp
+        ON
+            fd.project_id = pp.project_id
+        WHERE
+            fd.project_id in (:project_ids)
+        AND
+            fd.TIMESTAMP >= :start
+        AND
+            fd.TIMESTAMP < :end
+    )
+    SELECT
+        program_id,
+        YEAR(access_month) AS year,
+        access_month,
+        {count_distinct("user_id", approximate)} AS distinct_user_count
+    FROM
+        file_access
     GROUP BY
-        dd.component, cp.occurrences
+        program_id,
+        access_month
     ORDER BY
-        number_of_unique_downloads DESC;
+        program_id,
+        access_month;
+    """
+
+    return bind(sql, **_program_projects_params(program_projects), **years_range(years))
+
+
+@query_builder
+def query_annotation_index(project_ids):
+    """Return one row per annotation value of every node in the program.
+
+    ``node_latest.annotations`` is flattened once into ``(node_id, file_handle_id,
+    annotation_key, annotation_value)`` rows, covering every key and every value of
+    multi-valued annotations. Rankings for any key are then computed locally (see
+    ``toolkit/annotations.py``) instead of parsing the VARIANT column again per key.
+    """
+
+    sql = """
+    SELECT
+        nl.id AS node_id,
+        nl.file_handle_id,
+        annotation.key AS annotation_key,
+        annotation_value.value::STRING AS annotation_value
+    FROM
+        synapse_data_warehouse.synapse.node_latest nl,
+        LATERAL FLATTEN(input => nl.annotations:annotations) annotation,
+        LATERAL FLATTEN(input => annotation.value:value) annotation_value
+    WHERE
+        nl.project_id in (:project_ids)
+    AND
+        nl.annotations IS NOT NULL;
     """
 
+    return bind(sql, project_ids=project_ids)
 
-def query_entity_distribution(program_id):
+
+@query_builder
+def query_file_downloaders_by_year(years, project_ids):
+    """Return the distinct (file, user) pairs downloaded from the program in each year of ``years``.
+
+    Joined with ``query_annotation_index`` locally, these give the unique downloads of the
+    files carrying any annotation value.
+    """
+
+    sql = """
+    SELECT
+        DISTINCT
+        YEAR(record_date) AS year,
+        file_handle_id,
+        user_id
+    FROM
+        synapse_data_warehouse.synapse.filedownload
+    WHERE
+        project_id in (:project_ids)
+    AND
+        record_date >= :start
+    AND
+        record_date < :end;
+    """
+
+    return bind(sql, project_ids=project_ids, **years_range(years))
+
+
+@query_builder
+def query_entity_distribution(project_ids):
     """Returns the number of files for a given project (synapse_id)."""
 
-    return f"""
-    with htan_projects as (
-        // select distinct cast(replace(NF.projectid, 'syn', '') as INTEGER) as project_id from sage.portal_raw.HTAN
-        select
-            cast(scopes.value as integer) as project_id
-        from
-            synapse_data_warehouse.synapse.node_latest,
-            lateral flatten(input => node_latest.scope_ids) scopes
-        where
-            id = {program_id}
-    )
+    sql = """
     SELECT
         node_type,
         count(*) as number_of_files,
         count(*) * 100.0 / SUM(COUNT(*)) OVER () AS percentage_of_total
     FROM
         SYNAPSE_DATA_WAREHOUSE.SYNAPSE.NODE_LATEST
-    JOIN
-        htan_projects
-        on NODE_LATEST.project_id = htan_projects.project_id
+    WHERE
+        NODE_LATEST.project_id in (:project_ids)
     group by
         node_type
     order by
         number_of_files DESC;
     """
 
+    return bind(sql, project_ids=project_ids)
+
+
+@query_builder
+def query_execution_stats(query_ids, lookback_seconds):
+    """Look up the execution statistics of recent queries by their query IDs.
+
+    Reads ``SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY``, the query history that reports
+    partitions; it lags by up to 45 minutes, so recent queries only show up in later
+    lookups. ``lookback_seconds`` bounds the scan to the queries' start times. Times are in
+    milliseconds. ``PARTITIONS_SCANNED`` against ``PARTITIONS_TOTAL`` shows how well the
+    date and project filters prune micro-partitions.
+    """
+    sql = """
+    SELECT
+        query_id,
+        total_elapsed_time,
+        compilation_time,
+        execution_time,
+        queued_provisioning_time + queued_repair_time + queued_overload_time AS queued_time,
+        bytes_scanned,
+        partitions_scanned,
+        partitions_total
+    FROM
+        snowflake.account_usage.query_history
+    WHERE
+        query_id IN (:query_ids)
+    AND
+        start_time >= DATEADD('second', -:lookback_seconds, CURRENT_TIMESTAMP())
+    AND
+        execution_status = 'SUCCESS';
+    """
+
+    return bind(sql, query_ids=query_ids, lookback_seconds=int(lookback_seconds))
+
+
 def dummy_get_download_access(program_ids, program_names):
     # def truncate_name(name, max_length=20):
     #     return name if len(name) <= max_length else name[:max_length] + "..."
@@ -358,13 +886,14 @@ def dummy_get_download_access(program_ids, program_names):
 
     # Generate arbitrary random download access counts for each program id
     download_access_count = np.random.randint(1, 1000, size=len(program_ids))
-    
+
     # Create a new dataframe with the original program_ids and the new column
-    new_df = pd.DataFrame({
-        'PROJECT_ID': program_ids,
-        'NAME': program_names,
-        'DOWNLOAD_ACCESS_COUNT': download_access_count
-    })
-    
-    return new_df
+    new_df = pd.DataFrame(
+        {
+            "PROJECT_ID": program_ids,
+            "NAME": program_names,
+            "DOWNLOAD_ACCESS_COUNT": download_access_count,
+        }
+    )
 
+    return new_df
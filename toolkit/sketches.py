@@ -0,0 +1,135 @@
+"""Unique-user counts for any date range and set of projects from mergeable HyperLogLog sketches.
+
+``query_daily_user_sketches`` has Snowflake build one HyperLogLog sketch of the users who
+downloaded from each project on each day (``HLL_EXPORT(HLL_ACCUMULATE(user_id))``). The
+exported sketches are loaded into a ``UserSketchStore`` once, and any union of days and
+projects is then answered locally by merging their registers (the register-wise maximum)
+and estimating the number of distinct users, without going back to the warehouse.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def sketch_registers(sketch):
+    """Return the precision and the ``(indices, values)`` of the non-empty registers of a sketch.
+
+    ``sketch`` is the JSON exported by ``HLL_EXPORT``, either sparse
+    (``{"precision": 12, "sparse": {"indices": [...], "maxLzCounts": [...]}}``) or dense
+    (``{"precision": 12, "dense": [...]}``, one value per register). Register values are
+    the usual HyperLogLog ranks, with 0 for an empty register.
+    """
+    if isinstance(sketch, str):
+        sketch = json.loads(sketch)
+    precision = int(sketch["precision"])
+    if "dense" in sketch:
+        values = np.asarray(sketch["dense"], dtype=np.uint8)
+        indices = np.flatnonzero(values).astype(np.uint16)
+        return precision, indices, values[indices]
+    sparse = sketch["sparse"]
+    return (
+        precision,
+        np.asarray(sparse["indices"], dtype=np.uint16),
+        np.asarray(sparse["maxLzCounts"], dtype=np.uint8),
+    )
+
+
+def estimate_cardinality(harmonic_sum, empty_registers, precision):
+    """Return the HyperLogLog estimate from the registers' ``sum(2 ** -value)`` and empty count.
+
+    Works element-wise on arrays, so many merged sketches can be estimated at once. Small
+    cardinalities use linear counting, as in the original HyperLogLog paper.
+    """
+    m = 2**precision
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw_estimate = alpha * m**2 / np.asarray(harmonic_sum, dtype="float64")
+    empty_registers = np.asarray(empty_registers, dtype="float64")
+    with np.errstate(divide="ignore"):
+        linear_counting = m * np.log(m / empty_registers)
+    use_linear_counting = (raw_estimate <= 2.5 * m) & (empty_registers > 0)
+    return np.where(use_linear_counting, linear_counting, raw_estimate)
+
+
+class UserSketchStore:
+    """The daily per-project user sketches of a program, merged locally on demand.
+
+    The registers are kept in long format (one row per project, day and non-empty register),
+    so a date range and project subset is a filter followed by a group-wise maximum.
+    """
+
+    def __init__(self, sketches_df):
+        precisions = set()
+        frames = []
+        for project_id, day, sketch in sketches_df[
+            ["PROJECT_ID", "DAY", "USERS_SKETCH"]
+        ].itertuples(index=False):
+            precision, indices, values = sketch_registers(sketch)
+            precisions.add(precision)
+            frames.append(
+                (
+                    np.full(len(indices), project_id, dtype="int64"),
+                    np.full(len(indices), day),
+                    indices,
+                    values,
+                )
+            )
+
+        if len(precisions) > 1:
+            raise ValueError(
+                f"Sketches of different precisions can't be merged: {sorted(precisions)}"
+            )
+        self.precision = precisions.pop() if precisions else 12
+
+        columns = ("PROJECT_ID", "DAY", "REGISTER", "VALUE")
+        self.registers = pd.DataFrame(
+            {
+                column: np.concatenate([frame[i] for frame in frames]) if frames else []
+                for i, column in enumerate(columns)
+            }
+        )
+        self.registers["DAY"] = pd.to_datetime(self.registers["DAY"])
+
+    def _select(self, start, end, project_ids=None):
+        # ``[start, end]`` is inclusive, like the date pickers
+        days = self.registers["DAY"]
+        selected = (days >= pd.Timestamp(start)) & (days <= pd.Timestamp(end))
+        if project_ids is not None:
+            selected &= self.registers["PROJECT_ID"].isin(project_ids)
+        return self.registers[selected]
+
+    def _estimate(self, merged):
+        """Estimate the cardinality of merged registers (a ``VALUE`` series per register)."""
+        m = 2**self.precision
+        harmonic_sum = np.exp2(-merged.astype("float64")).sum() + (m - len(merged))
+        return estimate_cardinality(harmonic_sum, m - len(merged), self.precision)
+
+    def unique_users(self, start, end, project_ids=None):
+        """Estimate the unique users who downloaded from ``project_ids`` (all by default) between ``start`` and ``end``."""
+        selected = self._select(start, end, project_ids)
+        if selected.empty:
+            return 0
+        merged = selected.groupby("REGISTER")["VALUE"].max()
+        return int(round(float(self._estimate(merged))))
+
+    def unique_users_by_project(self, start, end):
+        """Estimate the unique users of every project with downloads between ``start`` and ``end``."""
+        selected = self._select(start, end)
+        merged = selected.groupby(["PROJECT_ID", "REGISTER"])["VALUE"].max()
+        if merged.empty:
+            return pd.Series(dtype="int64", name="UNIQUE_USERS")
+
+        # Every project is estimated at once from its non-empty registers
+        m = 2**self.precision
+        per_project = pd.DataFrame(
+            {"INVERSE": np.exp2(-merged.astype("float64"))}
+        ).groupby(level="PROJECT_ID")["INVERSE"]
+        non_empty = per_project.count()
+        harmonic_sum = per_project.sum() + (m - non_empty)
+        estimates = estimate_cardinality(harmonic_sum, m - non_empty, self.precision)
+        return pd.Series(
+            np.round(estimates).astype("int64"),
+            index=non_empty.index,
+            name="UNIQUE_USERS",
+        )
@@ -1,65 +1,150 @@
+import functools
+import hashlib
 import random
+import threading
+from collections import OrderedDict
 
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 
+# Number of built figures kept (as JSON) by ``cached_figure``, least recently used first out
+FIGURE_CACHE_MAX_ENTRIES = 64
 
-def plot_unique_users_trend(unique_users_data, width=2000, height=400):
 
-    # Group by PROJECT_ID and sum the DISTINCT_USER_COUNT
-    grouped_df = (
-        unique_users_data.groupby("PROJECT_ID")["DISTINCT_USER_COUNT"]
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+
+
+def _fingerprint(value):
+    """Return a cheap content hash of a plot argument (frames are hashed row by row)."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest = hashlib.sha1(
+            pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes()
+        )
+        shape = (
+            (tuple(value.columns), tuple(map(str, value.dtypes)))
+            if isinstance(value, pd.DataFrame)
+            else value.name
+        )
+        digest.update(repr(shape).encode())
+        return digest.hexdigest()
+    return repr(value)
+
+
+def cached_figure(plot):
+    """Memoize a figure builder on the content of its arguments.
+
+    Figures are stored as JSON and a fresh ``go.Figure`` is returned on every call, so the
+    caller can update it without touching the cached copy. Builders must not modify their
+    input frames.
+    """
+
+    @functools.wraps(plot)
+    def wrapper(*args, **kwargs):
+        key = (
+            plot.__name__,
+            tuple(_fingerprint(arg) for arg in args),
+            tuple(sorted((name, _fingerprint(arg)) for name, arg in kwargs.items())),
+        )
+        with _figure_cache_lock:
+            figure_json = _figure_cache.get(key)
+            if figure_json is not None:
+                _figure_cache.move_to_end(key)
+        if figure_json is None:
+            figure_json = plot(*args, **kwargs).to_json()
+            with _figure_cache_lock:
+                _figure_cache[key] = figure_json
+                while len(_figure_cache) > FIGURE_CACHE_MAX_ENTRIES:
+                    _figure_cache.popitem(last=False)
+        return pio.from_json(figure_json)
+
+    return wrapper
+
+
+# Above this many points the trend lines are drawn with WebGL (``go.Scattergl``)
+WEBGL_POINT_THRESHOLD = 1000
+
+
+@cached_figure
+def plot_unique_users_trend(
+    unique_users_data, width=2000, height=400, top_n=10, approximate=False
+):
+    """Plot the monthly unique users of the ``top_n`` projects with the most, plus the monthly median.
+
+    The months are converted once and the top projects are split out in a single groupby,
+    so the cost grows with the number of rows rather than with rows times projects. Results
+    of ``query_monthly_download_trends_by_year(..., top_n=...)`` are already ranked in the
+    warehouse and carry the median as ``IS_MEDIAN`` rows, which are used as they are.
+    ``approximate`` labels the counts as estimates.
+    """
+    # Convert the months once and sort them so each project's line is drawn in order
+    trends_df = unique_users_data.assign(
+        ACCESS_MONTH=pd.to_datetime(unique_users_data["ACCESS_MONTH"]),
+        DISTINCT_USER_COUNT=unique_users_data["DISTINCT_USER_COUNT"].astype("float64"),
+    ).sort_values("ACCESS_MONTH", kind="stable")
+
+    if "IS_MEDIAN" in trends_df.columns:
+        is_median = trends_df["IS_MEDIAN"].astype(bool)
+        median_monthly_counts = trends_df[is_median].set_index("ACCESS_MONTH")[
+            "DISTINCT_USER_COUNT"
+        ]
+        trends_df = trends_df[~is_median].astype({"PROJECT_ID": "int64"})
+    else:
+        # Calculate the median DISTINCT_USER_COUNT for each month
+        median_monthly_counts = trends_df.groupby("ACCESS_MONTH")[
+            "DISTINCT_USER_COUNT"
+        ].median()
+
+    # The top projects by their total DISTINCT_USER_COUNT, largest first
+    top_projects = (
+        trends_df.groupby("PROJECT_ID")["DISTINCT_USER_COUNT"]
         .sum()
-        .reset_index()
+        .nlargest(top_n)
+        .index
     )
+    top_projects_df = trends_df[trends_df["PROJECT_ID"].isin(top_projects)]
+    projects = dict(iter(top_projects_df.groupby("PROJECT_ID", sort=False)))
 
-    # Sort by DISTINCT_USER_COUNT in descending order and get the top 10
-    top_projects = grouped_df.sort_values(
-        by="DISTINCT_USER_COUNT", ascending=False
-    ).head(10)
-    
-    fig = go.Figure()
-    for i, project in zip(top_projects.index, top_projects["PROJECT_ID"]):
+    # Large programs are drawn with WebGL so the chart stays interactive
+    n_points = len(top_projects_df) + len(median_monthly_counts)
+    scatter = go.Scattergl if n_points > WEBGL_POINT_THRESHOLD else go.Scatter
 
-        # Extract the data for the current project
-        filtered_df = unique_users_data[unique_users_data["PROJECT_ID"].isin([project])]
-        months = pd.to_datetime(filtered_df["ACCESS_MONTH"])
-        counts = filtered_df["DISTINCT_USER_COUNT"]
-        project_name = filtered_df["NAME"].iloc[0]  # Assuming NAME is the same for each project
+    fig = go.Figure()
+    for project in top_projects:
+        project_df = projects[project]
+        project_name = str(
+            project_df["NAME"].iloc[0]
+        )  # Assuming NAME is the same for each project
 
         # Scatter plot for the current project
         fig.add_trace(
-            go.Scatter(
-                x=months,
-                y=list(counts),
+            scatter(
+                x=project_df["ACCESS_MONTH"],
+                y=project_df["DISTINCT_USER_COUNT"],
                 mode="lines+markers",
                 name=project,
                 line=dict(width=2),
                 opacity=0.6,
                 hoverinfo="x+y+name",
-                hovertemplate="<b>Project Name</b>: " + project_name + "<br>"
-                + "<b>Project ID</b>: " + str(project) + "<br>"
+                hovertemplate="<b>Project Name</b>: "
+                + project_name
+                + "<br>"
+                + "<b>Project ID</b>: "
+                + str(project)
+                + "<br>"
                 + "<b>Date</b>: %{x}<br>"
                 + "<b>Unique User Downloads</b>: %{y}<extra></extra>",
                 showlegend=True,
                 visible=True,
             )
         )
-    # Calculate the median DISTINCT_USER_COUNT for each month
-    median_monthly_counts = (
-        unique_users_data.groupby("ACCESS_MONTH")["DISTINCT_USER_COUNT"]
-        .median()
-        .reset_index()
-    )
-    median_monthly_counts["ACCESS_MONTH"] = pd.to_datetime(
-        median_monthly_counts["ACCESS_MONTH"]
-    )
 
     fig.add_trace(
-        go.Scatter(
-            x=median_monthly_counts["ACCESS_MONTH"],
-            y=median_monthly_counts["DISTINCT_USER_COUNT"],
+        scatter(
+            x=median_monthly_counts.index,
+            y=median_monthly_counts.to_numpy(),
             mode="lines+markers",
             name="Median",
             line=dict(color="black", width=4),
@@ -68,23 +153,65 @@ def plot_unique_users_trend(unique_users_data, width=2000, height=400):
             visible=True,
         )
     )
+    approx = " (approx.)" if approximate else ""
     fig.update_layout(
         xaxis_title="Month",
-        yaxis_title="Unique User Downloads",
-        title="Top 10 Projects by Unique User Downloads",
+        yaxis_title=f"Unique User Downloads{approx}",
+        title=f"Top {top_n} Projects by Unique User Downloads{approx}",
         width=width,
         height=height,
     )
     return fig
 
 
-def plot_download_sizes(df, width=2000):
-    # Convert project size from TiB to GiB for better comparison
-    df["PROJECT_SIZE_IN_GIB"] = df["TOTAL_PROJECT_SIZE_IN_TIB"] 
-    df["TOTAL_DOWNLOADS_GIB"] = df["ANNUAL_DOWNLOADS_IN_TIB"] 
+@cached_figure
+def plot_program_trends(
+    program_trends_data, program_names, width=2000, height=400, approximate=False
+):
+    """Plot the monthly unique users of several programs side by side.
 
-    # Sort the DataFrame by total downloads for ordered display
-    df = df.sort_values(by="TOTAL_DOWNLOADS_GIB")
+    ``program_trends_data`` is a ``query_programs_monthly_download_trends_by_year`` result
+    and ``program_names`` maps its ``PROGRAM_ID`` values to display names.
+    """
+    trends_df = program_trends_data.assign(
+        ACCESS_MONTH=pd.to_datetime(program_trends_data["ACCESS_MONTH"])
+    ).sort_values("ACCESS_MONTH", kind="stable")
+    approx = " (approx.)" if approximate else ""
+
+    fig = go.Figure()
+    for program_id, program_df in trends_df.groupby("PROGRAM_ID", sort=False):
+        program_name = program_names.get(int(program_id), str(program_id))
+        fig.add_trace(
+            go.Scatter(
+                x=program_df["ACCESS_MONTH"],
+                y=program_df["DISTINCT_USER_COUNT"].astype("float64"),
+                mode="lines+markers",
+                name=program_name,
+                line=dict(width=3),
+                hovertemplate="<b>Program</b>: "
+                + program_name
+                + "<br>"
+                + "<b>Date</b>: %{x}<br>"
+                + "<b>Unique Users</b>: %{y}<extra></extra>",
+            )
+        )
+    fig.update_layout(
+        xaxis_title="Month",
+        yaxis_title=f"Unique Users{approx}",
+        title=f"Monthly Unique Users by Program{approx}",
+        width=width,
+        height=height,
+    )
+    return fig
+
+
+@cached_figure
+def plot_download_sizes(df, width=2000):
+    # Sort by total downloads for ordered display (``df`` itself is left untouched, it may be cached)
+    df = df.assign(
+        PROJECT_SIZE_IN_GIB=df["TOTAL_PROJECT_SIZE_IN_TIB"],
+        TOTAL_DOWNLOADS_GIB=df["ANNUAL_DOWNLOADS_IN_TIB"],
+    ).sort_values(by="TOTAL_DOWNLOADS_GIB")
 
     def truncate_name(name, max_length=20):
         return name if len(name) <= max_length else name[:max_length] + "..."
@@ -116,7 +243,30 @@ def plot_download_sizes(df, width=2000):
         title="Project Size vs. Download Volumes (in TiB)",
         width=width,
     )
-    
+
+    return fig
+
+
+@cached_figure
+def plot_storage_cost(cost_df, width=2000, height=400):
+    """Stacked monthly storage cost of a program by provider, from ``monthly_storage_cost``."""
+    monthly_df = (
+        cost_df.groupby(["MONTH", "PROVIDER"], observed=True)["COST"]
+        .sum()
+        .reset_index()
+        .assign(MONTH=lambda df: df["MONTH"].dt.to_timestamp())
+    )
+
+    fig = px.area(monthly_df, x="MONTH", y="COST", color="PROVIDER")
+    fig.update_traces(hovertemplate="<b>%{x|%b %Y}</b><br>$%{y:,.2f}<extra></extra>")
+    fig.update_layout(
+        xaxis_title="Month",
+        yaxis_title="Storage Cost (USD)",
+        legend_title_text="Provider",
+        title="Monthly Storage Cost",
+        width=width,
+        height=height,
+    )
     return fig
 
 
@@ -186,71 +336,79 @@ def plot_user_downloads_map(locations, width=10000):
     )
     return fig
 
+
+@cached_figure
 def plot_citation_stats():
 
     data = {
-    "Year": ["2022", "2023", "2024"],
-    "Citations": [300, 360, 420]  # Adjusted citation numbers
+        "Year": ["2022", "2023", "2024"],
+        "Citations": [300, 360, 420],  # Adjusted citation numbers
     }
 
     # Create a DataFrame
     df = pd.DataFrame(data)
 
     # Convert Year column to string to avoid commas in axis labels
-    df['Year'] = df['Year'].astype(str)
+    df["Year"] = df["Year"].astype(str)
 
     # Plot the bar chart using Plotly
-    fig = px.bar(df, x="Year", y="Citations", 
-                labels={"Citations": "Number of Citations", "Year": "Year"},
-                title=" ",
-                color_discrete_sequence=["#0f5a5e"])
+    fig = px.bar(
+        df,
+        x="Year",
+        y="Citations",
+        labels={"Citations": "Number of Citations", "Year": "Year"},
+        title=" ",
+        color_discrete_sequence=["#0f5a5e"],
+    )
 
     # Update x-axis to remove commas
-    fig.update_xaxes(tickformat='d')
+    fig.update_xaxes(tickformat="d")
 
     # Customize the chart (optional)
     fig.update_layout(
         xaxis_title="Year",
         yaxis_title="Number of Citations",
-        title_x=0.5  # Center the title
+        title_x=0.5,  # Center the title
     )
 
-
     return fig
 
+
+@cached_figure
 def plot_human_records():
     # Create a dummy dataset
-    data = {
-        'Year': [2022, 2023, 2024],
-        'Number of Records': [500, 750, 900]
-    }
+    data = {"Year": [2022, 2023, 2024], "Number of Records": [500, 750, 900]}
 
     df = pd.DataFrame(data)
 
     # Convert Year column to string to avoid commas in axis labels
-    df['Year'] = df['Year'].astype(str)
+    df["Year"] = df["Year"].astype(str)
 
     # Create a bar chart
-    fig = px.bar(df,
-                 x="Year",
-                 y="Number of Records",
-                 title=" ",
-                 color_discrete_sequence=["#0f5a5e"])
-    
+    fig = px.bar(
+        df,
+        x="Year",
+        y="Number of Records",
+        title=" ",
+        color_discrete_sequence=["#0f5a5e"],
+    )
+
     # Update x-axis to remove commas
-    fig.update_xaxes(tickformat='d')
+    fig.update_xaxes(tickformat="d")
 
     return fig
 
+
+@cached_figure
 def plot_map():
     # Dummy data: Replace with your actual download data
     # Load a list of all countries using Plotly's built-in data
-    country_list = px.data.gapminder()['country'].unique()
+    country_list = px.data.gapminder()["country"].unique()
 
     # Generate random download numbers for each country
     data = {
-        'Country': country_list,
-        'Downloads': [random.randint(100, 5000) for _ in country_list]
+        "Country": country_list,
+        "Downloads": [random.randint(100, 5000) for _ in country_list],
     }
 
     df = pd.DataFrame(data)
@@ -263,19 +421,18 @@ def plot_map():
         color="Downloads",
         hover_name="Country",
         color_continuous_scale="emrld",
-        title=" "
+        title=" ",
     )
     # Update layout to reduce the space between title and chart
     fig.update_layout(
         title_x=0.5,
-        title_y=1.,  # Bring the title closer to the chart
-        margin={"r":0,"t":100,"l":0,"b":0},  # Adjust margins to tighten layout
+        title_y=1.0,  # Bring the title closer to the chart
+        margin={"r": 0, "t": 100, "l": 0, "b": 0},  # Adjust margins to tighten layout
         coloraxis_colorbar={
-            'title': 'Downloads',
-            'lenmode': 'fraction',
-            'len': 1.,  # Make the color bar 80% of the map's height
-        }
+            "title": "Downloads",
+            "lenmode": "fraction",
+            "len": 1.0,  # Make the color bar 80% of the map's height
+        },
     )
 
     return fig
-